@@ -0,0 +1,201 @@
+"""Time every GET /api route at several data sizes.
+
+For each size a fresh database is seeded with bench.seed_fleet, then each
+route is called through the Flask test client: median/p95 latency over
+--repeat calls, Mongo commands per request (from src.query_budget) and
+Python peak memory (tracemalloc, measured on a separate call so it does not
+skew the timings).  Results are written as JSON; pass --compare to diff a run
+against a saved baseline.
+
+    python -m bench.bench_api --sizes 1000,10000,100000 --output bench/baselines/local.json
+    python -m bench.bench_api --sizes 1000 --mongomock --compare bench/baselines/local.json
+
+Write routes are left out so every size measures the same data.  With
+--mongomock no command events are published, so queries are reported as null.
+A route answering 4xx/5xx is reported as FAILED and makes the run exit 1, so a
+broken route cannot pass for a fast one.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from bench.seed_fleet import FleetConfig, connect, seed
+from src.main import create_app
+from src.query_budget import QueryBudgetListener, track_queries
+
+SKIPPED_PREFIXES = ('/api/users',)  # SQLAlchemy leftovers, not backed by Mongo
+TODAY = datetime.utcnow().date()
+# Routes that answer 400 without these: the query string replaces the bare URL
+REQUIRED_QUERIES = {
+    '/api/availability': f'from={TODAY}T00:00:00&to={TODAY + timedelta(days=3)}T00:00:00',
+    '/api/export/changes': 'entity=trips',
+    '/api/lanes/detail': 'origin=Chennai&destination=Bengaluru',
+}
+EXTRA_QUERIES = {
+    '/api/dashboard/analytics': ['days=365'],
+    '/api/reports/trip_summary': ['format=csv'],
+    '/api/reports/expense_summary': ['format=csv'],
+    '/api/reports/truck_performance': ['format=csv'],
+    '/api/reports/employee_performance': ['format=csv'],
+    '/api/reports/financial_summary': ['format=csv'],
+    '/api/search': ['q=Client'],
+    '/api/lanes/detail': [f'origin=Chennai&destination=Bengaluru&start_date={TODAY - timedelta(days=90)}&end_date={TODAY}'],
+}
+REGRESSION_RATIO = 1.25
+
+def sample_ids(db):
+    """A real id for each URL parameter name used by the routes."""
+    def first_id(collection, filter_dict=None):
+        doc = db[collection].find_one(filter_dict or {}, {'_id': 1})
+        return str(doc['_id']) if doc else None
+    return {
+        'truck_id': first_id('trucks'),
+        'employee_id': first_id('employees'),
+        'trip_id': first_id('trips'),
+        'expense_id': first_id('expenses'),
+        'payment_id': first_id('clientpayments'),
+    }
+
+def benchmark_urls(app, ids):
+    """(label, url) for every GET /api route, with parameters filled from ids."""
+    urls = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or not rule.rule.startswith('/api') or rule.rule.startswith(SKIPPED_PREFIXES):
+            continue
+        if any(ids.get(arg) is None for arg in rule.arguments):
+            print(f'skipping {rule.rule}: no sample id', file=sys.stderr)
+            continue
+        url = rule.rule
+        for arg in rule.arguments:
+            url = url.replace(f'<{arg}>', ids[arg])
+        if rule.rule in REQUIRED_QUERIES:
+            url = f'{url}?{REQUIRED_QUERIES[rule.rule]}'
+        urls.append((rule.rule, url))
+        for query in EXTRA_QUERIES.get(rule.rule, []):
+            urls.append((f'{rule.rule}?{query}', f"{url.split('?')[0]}?{query}"))
+    return urls
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def measure(client, url, repeat, count_queries):
+    client.get(url)  # warm-up: connection pool, index cache
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append(time.perf_counter() - started)
+
+    with track_queries() as log:
+        client.get(url)
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': response.status_code,
+        'bytes': len(response.get_data()),
+        'median_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'queries': len(log) if count_queries else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+def run_size(size, args):
+    client, db = connect(bench_uri(args.uri, size), args.mongomock)
+    if not args.reuse:
+        started = time.perf_counter()
+        counts = seed(db, FleetConfig(size, seed=args.seed), drop=True)
+        print(f'[{size}] seeded {counts} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    app = create_app(connect=False)
+    app.config['COMPRESS_ENABLED'] = False
+    if args.mongomock:
+        app.mongo_client, app.db = client, db
+    else:
+        from pymongo import MongoClient
+        app.mongo_client = MongoClient(bench_uri(args.uri, size), event_listeners=[QueryBudgetListener()])
+        app.db = app.mongo_client.get_default_database()
+
+    results = {}
+    test_client = app.test_client()
+    for label, url in benchmark_urls(app, sample_ids(db)):
+        results[label] = measure(test_client, url, args.repeat, not args.mongomock)
+        r = results[label]
+        print(f'[{size}] {label:45} {r["status"]} {r["median_ms"]:9.1f} ms  '
+              f'{r["queries"]} queries  {r["peak_memory_kb"]:9.1f} KB' + ('  FAILED' if failed(r) else ''), file=sys.stderr)
+    if not args.keep:
+        client.drop_database(db.name)
+    return results
+
+def failed(result):
+    return result['status'] >= 400
+
+def bench_uri(uri, size):
+    """Each size gets its own database: fleet_bench_<size>."""
+    base, _, query = uri.partition('?')
+    scheme, _, rest = base.partition('://')
+    host = rest.split('/', 1)[0]
+    return f'{scheme}://{host}/fleet_bench_{size}' + (f'?{query}' if query else '')
+
+def compare(results, baseline_path):
+    """Print routes whose median latency or query count grew against the baseline."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['sizes']
+    regressions = 0
+    for size, routes in results.items():
+        for label, current in routes.items():
+            previous = baseline.get(size, {}).get(label)
+            if not previous or failed(current):
+                continue  # failures are reported by main
+            slower = current['median_ms'] > previous['median_ms'] * REGRESSION_RATIO
+            more_queries = (current['queries'] or 0) > (previous['queries'] or 0) and previous['queries'] is not None
+            if slower or more_queries:
+                regressions += 1
+                print(f'REGRESSION [{size}] {label}: {previous["median_ms"]} -> {current["median_ms"]} ms, '
+                      f'{previous["queries"]} -> {current["queries"]} queries')
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fleet_bench'))
+    parser.add_argument('--mongomock', action='store_true', help='benchmark against in-process mongomock')
+    parser.add_argument('--sizes', default='1000,10000', help='comma-separated trip counts')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reuse', action='store_true', help='use already seeded fleet_bench_<size> databases')
+    parser.add_argument('--keep', action='store_true', help='keep the seeded databases afterwards')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help='exit 1 if any route regressed against this file')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        results[str(size)] = run_size(size, args)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'backend': 'mongomock' if args.mongomock else 'mongod',
+            'repeat': args.repeat,
+            'sizes': results,
+        }, f, indent=2, sort_keys=True)
+    print(f'wrote {args.output}', file=sys.stderr)
+
+    failures = [(size, label, r['status']) for size, routes in results.items() for label, r in routes.items() if failed(r)]
+    for size, label, status in failures:
+        print(f'FAILED [{size}] {label}: HTTP {status}')
+    regressions = compare(results, args.compare) if args.compare else 0
+    if failures or regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
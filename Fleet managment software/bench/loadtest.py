@@ -0,0 +1,246 @@
+"""Replay the UI's page traffic against a running server.
+
+Each virtual user is one dispatcher with a browser-like keep-alive connection.
+They pick a page scenario by weight and issue that page's calls in order, with
+think time in between:
+
+* dashboard - index.html, filters, alerts, analytics (30 and 90 days)
+* manage    - manage.html, the truck/employee/trip/expense grids, then opening
+              a trip, a truck (view count + reload), an employee and an
+              expense, and the client-payment modal
+* reports   - reports.html, truck and employee pickers, one report and its
+              CSV export
+
+    gunicorn -c gunicorn.conf.py &
+    python -m bench.loadtest --users 10,25,50 --duration 60
+
+With several --users values the stages run back to back. Each stage prints
+throughput, p50/p95/p99 per route and the error rate, which shows where a
+worker configuration stops keeping up.  Only the standard library is used.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+REPORT_TYPES = ['trip_summary', 'expense_summary', 'truck_performance', 'employee_performance', 'financial_summary']
+DEFAULT_MIX = 'dashboard=5,manage=4,reports=1'
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.pages = defaultdict(int)
+
+    def record(self, label, seconds, ok):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+    def page_done(self, scenario):
+        with self._lock:
+            self.pages[scenario] += 1
+
+class Session:
+    """One virtual user: a keep-alive connection and the ids it has seen in list responses."""
+
+    def __init__(self, base_url, stats, timeout):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+        self.stats = stats
+        self.ids = {}
+
+    def request(self, method, path, label=None):
+        """Issue one call, record it under `label` (the route template) and return the parsed JSON or None."""
+        label = label or path
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, headers={'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+            response = self.connection.getresponse()
+            body = response.read()
+            ok = response.status < 400
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # reconnects on the next request
+            self.stats.record(label, time.perf_counter() - started, False)
+            return None
+        self.stats.record(label, time.perf_counter() - started, ok)
+        if not ok or not (response.getheader('Content-Type') or '').startswith('application/json'):
+            return None
+        if response.getheader('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    def remember(self, key, items):
+        if items:
+            self.ids[key] = [item['id'] for item in items if item.get('id')]
+
+    def pick(self, key):
+        ids = self.ids.get(key)
+        return random.choice(ids) if ids else None
+
+def dashboard(session, think):
+    session.request('GET', '/index.html')
+    session.request('GET', '/api/dashboard/filters')
+    session.request('GET', '/api/dashboard/alerts')
+    session.request('GET', '/api/dashboard/analytics?days=30', '/api/dashboard/analytics')
+    think()
+    # Dispatchers usually widen the range once
+    session.request('GET', '/api/dashboard/analytics?days=90', '/api/dashboard/analytics')
+
+def manage(session, think):
+    session.request('GET', '/manage.html')
+    for key in ('trucks', 'employees', 'trips', 'expenses'):
+        data = session.request('GET', f'/api/{key}')
+        session.remember(key, (data or {}).get(key))
+    session.request('GET', '/api/employees?position=driver', '/api/employees?position=')
+    think()
+
+    trip_id = session.pick('trips')
+    if trip_id:
+        session.request('GET', f'/api/trips/{trip_id}', '/api/trips/<id>')
+        session.request('GET', f'/api/trips/{trip_id}/subtrips', '/api/trips/<id>/subtrips')
+        think()
+    truck_id = session.pick('trucks')
+    if truck_id:
+        session.request('POST', f'/api/trucks/{truck_id}/view', '/api/trucks/<id>/view')
+        session.request('GET', f'/api/trucks/{truck_id}', '/api/trucks/<id>')
+        think()
+    employee_id = session.pick('employees')
+    if employee_id:
+        session.request('GET', f'/api/employees/{employee_id}', '/api/employees/<id>')
+        think()
+    expense_id = session.pick('expenses')
+    if expense_id:
+        session.request('GET', f'/api/expenses/{expense_id}', '/api/expenses/<id>')
+        think()
+
+    names = session.request('GET', '/api/client-names')
+    clients = names if isinstance(names, list) else (names or {}).get('client_names', [])
+    if clients:
+        session.request('GET', f'/api/clients/receivables?client_name={quote(random.choice(clients))}', '/api/clients/receivables?client_name=')
+    session.request('GET', '/api/client-payments')
+
+def reports(session, think):
+    session.request('GET', '/reports.html')
+    session.request('GET', '/api/trucks')
+    session.request('GET', '/api/employees')
+    think()
+    report = random.choice(REPORT_TYPES)
+    session.request('GET', f'/api/reports/{report}', f'/api/reports/{report}')
+    think()
+    session.request('GET', f'/api/reports/{report}?format=csv', f'/api/reports/{report}?format=csv')
+
+SCENARIOS = {'dashboard': dashboard, 'manage': manage, 'reports': reports}
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        mix[name] = float(weight or 1)
+    return mix
+
+def virtual_user(args, stats, stop):
+    session = Session(args.base_url, stats, args.timeout)
+    names, weights = zip(*args.mix.items())
+
+    def think():
+        if args.think > 0:
+            stop.wait(random.expovariate(1000 / args.think))
+
+    while not stop.is_set():
+        scenario = random.choices(names, weights)[0]
+        SCENARIOS[scenario](session, think)
+        stats.page_done(scenario)
+        think()
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(users, stats, elapsed):
+    routes = {}
+    for label, latencies in sorted(stats.latencies.items()):
+        ordered = sorted(latencies)
+        routes[label] = {
+            'requests': len(ordered),
+            'errors': stats.errors.get(label, 0),
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 1),
+        }
+    total = sum(route['requests'] for route in routes.values())
+    errors = sum(route['errors'] for route in routes.values())
+    return {
+        'users': users,
+        'seconds': round(elapsed, 1),
+        'requests': total,
+        'requests_per_second': round(total / elapsed, 1) if elapsed else 0,
+        'pages_per_second': round(sum(stats.pages.values()) / elapsed, 2) if elapsed else 0,
+        'error_rate': round(errors / total, 4) if total else 0,
+        'pages': dict(stats.pages),
+        'routes': routes,
+    }
+
+def print_summary(summary):
+    print(f"\n== {summary['users']} users, {summary['seconds']}s: {summary['requests_per_second']} req/s, "
+          f"{summary['pages_per_second']} pages/s, error rate {summary['error_rate']:.2%}")
+    print(f"{'route':48} {'reqs':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, route in summary['routes'].items():
+        print(f"{label:48} {route['requests']:7} {route['errors']:7} "
+              f"{route['p50_ms']:9.1f} {route['p95_ms']:9.1f} {route['p99_ms']:9.1f}")
+
+def run_stage(args, users):
+    stats = Stats()
+    stop = threading.Event()
+    threads = []
+    for i in range(users):
+        thread = threading.Thread(target=virtual_user, args=(args, stats, stop), daemon=True)
+        thread.start()
+        threads.append(thread)
+        # Spread the arrivals over the ramp-up instead of starting everyone at once
+        if args.ramp_up:
+            time.sleep(args.ramp_up / users)
+    started = time.perf_counter()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(args.timeout)
+    return summarize(users, stats, time.perf_counter() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:5001')
+    parser.add_argument('--users', default='10', help='concurrent dispatchers; comma-separate to run several stages')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per stage, after ramp-up')
+    parser.add_argument('--ramp-up', type=float, default=5, help='seconds over which users are started')
+    parser.add_argument('--think', type=float, default=500, help='mean think time between steps in ms (0 = none)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'scenario weights, default {DEFAULT_MIX}')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--output', help='also write the stage summaries as JSON')
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    summaries = []
+    for users in (int(u) for u in args.users.split(',')):
+        print(f'running {users} users for {args.duration}s ...', file=sys.stderr)
+        summary = run_stage(args, users)
+        print_summary(summary)
+        summaries.append(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'base_url': args.base_url, 'mix': args.mix, 'stages': summaries}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
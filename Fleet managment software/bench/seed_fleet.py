@@ -0,0 +1,349 @@
+"""Generate a synthetic fleet for benchmarking.
+
+Writes trucks, employees (drivers and office staff), trips with sub-trips and
+expenses, client payments and recent telemetry in the same shape the API
+creates them, then fills the derived collections (search index, lane rollups,
+fuel stats) with the app's own rebuild helpers, so every /api route has
+realistic data to work on.  Run from the project directory:
+
+    python -m bench.seed_fleet --trips 100000 --uri mongodb://localhost/fleet_bench --drop
+    python -m bench.seed_fleet --trips 10000 --mongomock   # in-process, needs mongomock
+
+Documents are generated and inserted in batches, so memory stays flat up to
+~1M trips.  The same --seed always produces the same fleet.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+from src.main import create_app
+from src.models.mongo_models import TruckTelemetry, ensure_indexes
+from src.routes.fuel import rebuild_fuel_stats
+from src.routes.lanes import rebuild_lane_rollups
+from src.routes.search import rebuild_search_index
+
+REGIONS = ['North', 'South', 'East', 'West']
+MAKES = [('Tata', 'Prima'), ('Ashok Leyland', 'Captain'), ('Eicher', 'Pro 6049'), ('BharatBenz', '3528C'), ('Volvo', 'FM 420')]
+POSITIONS = ['manager', 'mechanic', 'dispatcher']
+TRIP_STATUSES = ['completed'] * 7 + ['inprocess', 'planned', 'cancelled']
+EXPENSE_CATEGORIES = ['maintenance', 'insurance', 'repairs', 'parking', 'fines', 'fitness', 'other']
+EXPENSE_STATUSES = ['approved'] * 3 + ['pending', 'rejected']
+PAYMENT_METHODS = ['cash', 'card', 'upi', 'bank_transfer']
+CITIES = ['Chennai', 'Bengaluru', 'Hyderabad', 'Mumbai', 'Pune', 'Delhi', 'Kolkata', 'Ahmedabad',
+          'Coimbatore', 'Madurai', 'Vijayawada', 'Nagpur', 'Indore', 'Jaipur', 'Lucknow', 'Kochi']
+FIRST_NAMES = ['Arun', 'Bala', 'Chandra', 'Deepak', 'Ganesh', 'Hari', 'Imran', 'Karthik', 'Mani', 'Naveen',
+               'Prakash', 'Rajesh', 'Senthil', 'Suresh', 'Vijay', 'Yusuf']
+LAST_NAMES = ['Kumar', 'Raj', 'Singh', 'Reddy', 'Nair', 'Iyer', 'Das', 'Khan', 'Patel', 'Rao']
+
+BATCH_SIZE = 5000
+TELEMETRY_INTERVAL = timedelta(minutes=1)
+SOURCE_COLLECTIONS = ('trucks', 'employees', 'trips', 'subtrips', 'expenses', 'clientpayments', 'alerts')
+DERIVED_COLLECTIONS = ('search_index', 'lane_rollups', 'truck_fuel_stats', 'fuel_samples', 'truck_telemetry')
+
+class FleetConfig:
+    def __init__(self, trips, trucks=None, drivers=None, staff=None, clients=None,
+                 subtrips_per_trip=2, expenses_per_trip=1, days=730, telemetry_hours=24, seed=42):
+        self.trips = trips
+        self.trucks = trucks or max(10, trips // 250)
+        self.drivers = drivers or max(10, int(self.trucks * 1.2))
+        self.staff = staff if staff is not None else max(5, self.drivers // 10)
+        self.clients = clients or max(10, min(2000, trips // 500))
+        self.subtrips_per_trip = subtrips_per_trip
+        self.expenses_per_trip = expenses_per_trip
+        self.days = days
+        self.telemetry_hours = telemetry_hours
+        self.seed = seed
+
+def day_string(value):
+    return value.strftime('%Y-%m-%d')
+
+def make_trucks(rng, config, now):
+    for i in range(config.trucks):
+        make, model = rng.choice(MAKES)
+        yield {
+            '_id': ObjectId(),
+            'truck_number': f'TRK-{i + 1:05d}',
+            'make': make,
+            'model': model,
+            'year': rng.randint(2012, 2025),
+            'license_plate': f'TN{rng.randint(1, 99):02d}AB{i + 1:05d}',
+            # Stored as entered in the UI form; a few are already expired or due soon
+            'insurance_expiry': day_string(now + timedelta(days=rng.randint(-30, 400))),
+            'insurance_number': f'INS-{i + 1:07d}',
+            'fc_number': f'FC-{i + 1:07d}',
+            'fc_expiry': day_string(now + timedelta(days=rng.randint(-30, 700))),
+            'vin': f'VIN{i + 1:014d}',
+            'fuel_capacity': rng.choice([200, 300, 400]),
+            'status': 'active' if rng.random() < 0.95 else 'inactive',
+            'region': rng.choice(REGIONS),
+            'view_count': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+def make_employees(rng, config, now):
+    for i in range(config.drivers + config.staff):
+        is_driver = i < config.drivers
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            '_id': ObjectId(),
+            'employee_number': f'EMP-{i + 1:06d}',
+            'first_name': first,
+            'last_name': last,
+            'position': 'driver' if is_driver else rng.choice(POSITIONS),
+            'email': f'{first.lower()}.{last.lower()}.{i + 1}@example.com',
+            'phone': f'9{rng.randint(100000000, 999999999)}',
+            'hire_date': now - timedelta(days=rng.randint(30, 3000)),
+            'license_number': f'DL-{i + 1:08d}' if is_driver else '',
+            'license_expiry': now + timedelta(days=rng.randint(-30, 1500)) if is_driver else None,
+            'emergency_contact_name': rng.choice(FIRST_NAMES),
+            'emergency_contact_phone': f'8{rng.randint(100000000, 999999999)}',
+            'salary': rng.randint(18000, 60000),
+            'status': 'active' if rng.random() < 0.95 else 'inactive',
+            'region': rng.choice(REGIONS),
+            'notes': '',
+            'created_at': now,
+            'updated_at': now,
+        }
+
+def make_trip_batch(rng, config, now, start, count, truck_ids, driver_ids, clients):
+    """(trips, subtrips, expenses) for trips number start..start+count-1."""
+    trips, subtrips, expenses = [], [], []
+    for n in range(start, start + count):
+        trip_id = ObjectId()
+        truck_id = rng.choice(truck_ids)
+        start_date = now - timedelta(days=rng.uniform(0, config.days))
+        duration = timedelta(hours=rng.randint(6, 96))
+        status = rng.choice(TRIP_STATUSES)
+        distance = rng.randint(80, 2500)
+        fuel = round(distance / rng.uniform(3.0, 5.5), 1)
+        revenue = 0.0
+        leg_start = start_date
+        for _ in range(max(1, round(rng.gauss(config.subtrips_per_trip, 0.8)))):
+            leg_end = leg_start + timedelta(hours=rng.randint(3, 30))
+            cost = float(rng.randint(5, 80) * 1000)
+            revenue += cost
+            origin, destination = rng.sample(CITIES, 2)
+            subtrips.append({
+                'trip_id': str(trip_id),
+                'date': leg_start.isoformat(timespec='seconds'),
+                'end_date': leg_end.isoformat(timespec='seconds'),
+                'origin': origin,
+                'destination': destination,
+                'client_name': rng.choice(clients),
+                'cargo_weight': float(rng.randint(2, 30)),
+                'cost': cost,
+                'created_at': now,
+                'updated_at': now,
+            })
+            leg_start = leg_end
+        costs = {
+            'fuel_cost': round(fuel * rng.uniform(88, 98), 2),
+            'toll': float(rng.randint(0, 40) * 100),
+            'rto': float(rng.choice([0, 0, 500, 1000])),
+            'adblue': float(rng.randint(0, 8) * 100),
+            'driver_salary': float(rng.randint(10, 60) * 100),
+            'labour_charges': float(rng.randint(0, 20) * 100),
+            'extra_expense': float(rng.choice([0, 0, 0, 500])),
+            'other_expenses': 0.0,
+        }
+        trips.append({
+            '_id': trip_id,
+            'trip_number': f'TRIP-{n + 1:08d}',
+            'truck_id': str(truck_id),
+            'driver_id': str(rng.choice(driver_ids)),
+            'start_date': start_date,
+            'end_date': start_date + duration if status != 'planned' else None,
+            'distance_km': float(distance),
+            'mileage': round(distance / fuel, 2),
+            'revenue': revenue,
+            'fuel_consumed': fuel,
+            **costs,
+            'profit': round(revenue - sum(costs.values()), 2),
+            'status': status,
+            'notes': '',
+            'created_at': now,
+            'updated_at': now,
+        })
+        expense_count = int(config.expenses_per_trip) + (rng.random() < config.expenses_per_trip % 1)
+        for e in range(expense_count):
+            expenses.append({
+                'expense_number': f'EXP-{n + 1:08d}-{e + 1}',
+                'truck_id': str(truck_id),
+                'trip_id': str(trip_id),
+                'category': rng.choice(EXPENSE_CATEGORIES),
+                'amount': float(rng.randint(2, 300) * 50),
+                'expense_date': start_date + timedelta(hours=rng.randint(0, 48)),
+                'vendor_name': f'Vendor {rng.randint(1, 200)}',
+                'receipt_number': f'R{n + 1:08d}{e}',
+                'payment_method': rng.choice(PAYMENT_METHODS),
+                'location': rng.choice(CITIES),
+                'description': '',
+                'status': rng.choice(EXPENSE_STATUSES),
+                'created_at': now,
+                'updated_at': now,
+            })
+    return trips, subtrips, expenses
+
+def make_client_payments(rng, clients, now):
+    for client in clients:
+        cost = float(rng.randint(50, 5000) * 1000)
+        advance = round(cost * rng.uniform(0, 0.6), 2)
+        yield {
+            'client_name': client,
+            'cost': cost,
+            'advance_payment': advance,
+            'balance': round(cost - advance, 2),
+            'status': rng.choice(['Pending', 'Received']),
+            'created_at': now,
+            'updated_at': now,
+        }
+
+def make_telemetry(rng, config, now, truck_id):
+    """Hourly buckets of one ping a minute over the last telemetry_hours, as TruckTelemetry.bucket_updates writes them."""
+    lat, lon = rng.uniform(8.5, 28.5), rng.uniform(72.5, 88.0)
+    odometer = float(rng.randint(20000, 400000))
+    fuel_level = rng.uniform(30, 100)
+    t = now - timedelta(hours=config.telemetry_hours)
+    buckets = {}
+    while t < now:
+        speed = max(0.0, rng.gauss(45, 20))
+        distance = speed * TELEMETRY_INTERVAL.total_seconds() / 3600
+        lat, lon = lat + rng.uniform(-0.005, 0.005), lon + rng.uniform(-0.005, 0.005)
+        odometer += distance
+        fuel_level = fuel_level - distance / 4 if fuel_level > 10 else 100.0
+        hour = TruckTelemetry.bucket_hour(t)
+        buckets.setdefault(hour, []).append({'t': t, 'lat': round(lat, 5), 'lon': round(lon, 5), 'odometer': round(odometer, 1),
+                                             'fuel_level': round(fuel_level, 1), 'speed': round(speed, 1)})
+        t += TELEMETRY_INTERVAL
+    for hour, points in buckets.items():
+        yield {
+            '_id': f"{truck_id}:{hour.strftime('%Y%m%d%H')}",
+            'truck_id': truck_id,
+            'hour': hour,
+            'points': points,
+            'count': len(points),
+            'first_at': points[0]['t'],
+            'last_at': points[-1]['t'],
+        }
+
+def rebuild_derived(db):
+    """Fill the collections the write endpoints maintain, using the app's rebuild helpers; returns their sizes."""
+    app = create_app(connect=False)
+    app.db = db
+    counts = {}
+    with app.app_context():
+        for name, rebuild in (('search_index', rebuild_search_index), ('lane_rollups', rebuild_lane_rollups),
+                              ('truck_fuel_stats', rebuild_fuel_stats)):
+            try:
+                rebuild()
+            except Exception as e:
+                # mongomock lacks some aggregation operators ($unionWith, $stdDevPop) and
+                # rejects the bulk operations of recent pymongo versions
+                if not type(db).__module__.startswith('mongomock'):
+                    raise
+                print(f'{name} left empty under mongomock: {e}', file=sys.stderr)
+            counts[name] = db[name].count_documents({})
+    return counts
+
+def insert_all(collection, documents):
+    """Insert in batches of BATCH_SIZE; returns the number of documents."""
+    batch = []
+    count = 0
+    for doc in documents:
+        batch.append(doc)
+        count += 1
+        if len(batch) >= BATCH_SIZE:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+    return count
+
+def seed(db, config, drop=False, progress=None):
+    """Populate db with a synthetic fleet; returns {collection: documents inserted}."""
+    rng = random.Random(config.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    if drop:
+        for name in SOURCE_COLLECTIONS + DERIVED_COLLECTIONS:
+            db.drop_collection(name)
+
+    trucks = list(make_trucks(rng, config, now))
+    employees = list(make_employees(rng, config, now))
+    insert_all(db.trucks, trucks)
+    insert_all(db.employees, employees)
+    truck_ids = [truck['_id'] for truck in trucks]
+    driver_ids = [emp['_id'] for emp in employees if emp['position'] == 'driver']
+    clients = [f'Client {i + 1:04d}' for i in range(config.clients)]
+
+    counts = {'trucks': len(trucks), 'employees': len(employees), 'trips': 0, 'subtrips': 0, 'expenses': 0}
+    for start in range(0, config.trips, BATCH_SIZE):
+        count = min(BATCH_SIZE, config.trips - start)
+        trips, subtrips, expenses = make_trip_batch(rng, config, now, start, count, truck_ids, driver_ids, clients)
+        db.trips.insert_many(trips, ordered=False)
+        db.subtrips.insert_many(subtrips, ordered=False)
+        if expenses:
+            db.expenses.insert_many(expenses, ordered=False)
+        counts['trips'] += len(trips)
+        counts['subtrips'] += len(subtrips)
+        counts['expenses'] += len(expenses)
+        if progress:
+            progress(counts['trips'], config.trips)
+
+    insert_all(db.clientpayments, make_client_payments(rng, clients, now))
+    counts['clientpayments'] = len(clients)
+
+    counts['truck_telemetry'] = insert_all(
+        db.truck_telemetry, (bucket for truck_id in truck_ids for bucket in make_telemetry(rng, config, now, str(truck_id)))
+    )
+    ensure_indexes(db)
+    counts.update(rebuild_derived(db))
+    return counts
+
+def connect(uri=None, use_mongomock=False):
+    """(client, db) for a mongod URI, or an in-process mongomock database."""
+    if use_mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+        return client, client['fleet_bench']
+    client = MongoClient(uri)
+    return client, client.get_default_database('fleet_bench')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fleet_bench'))
+    parser.add_argument('--mongomock', action='store_true', help='seed an in-process mongomock database')
+    parser.add_argument('--trips', type=int, default=10000)
+    parser.add_argument('--trucks', type=int, help='default: trips / 250')
+    parser.add_argument('--drivers', type=int, help='default: 1.2 per truck')
+    parser.add_argument('--clients', type=int, help='default: trips / 500, at most 2000')
+    parser.add_argument('--subtrips-per-trip', type=float, default=2)
+    parser.add_argument('--expenses-per-trip', type=float, default=1)
+    parser.add_argument('--days', type=int, default=730, help='spread trip dates over this many past days')
+    parser.add_argument('--telemetry-hours', type=int, default=24, help='hours of per-minute telemetry per truck')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--drop', action='store_true', help='drop the fleet collections first')
+    args = parser.parse_args(argv)
+
+    config = FleetConfig(
+        args.trips, trucks=args.trucks, drivers=args.drivers, clients=args.clients,
+        subtrips_per_trip=args.subtrips_per_trip, expenses_per_trip=args.expenses_per_trip,
+        days=args.days, telemetry_hours=args.telemetry_hours, seed=args.seed
+    )
+    _, db = connect(args.uri, args.mongomock)
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f'\r{done}/{total} trips', end='', file=sys.stderr, flush=True)
+
+    counts = seed(db, config, drop=args.drop, progress=progress)
+    print(file=sys.stderr)
+    print(', '.join(f'{count} {name}' for name, count in counts.items()),
+          f'in {time.perf_counter() - started:.1f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# Production serving profile: run from this directory with `gunicorn -c gunicorn.conf.py`.
+#
+# Environment overrides:
+#   GUNICORN_BIND                 address to listen on (default 0.0.0.0:5001)
+#   WEB_CONCURRENCY               number of worker processes
+#   GUNICORN_WORKER_CLASS         gthread (default) or gevent (requires the gevent package)
+#   GUNICORN_THREADS              threads per gthread worker
+#   GUNICORN_WORKER_CONNECTIONS   concurrent greenlets per gevent worker
+#   GUNICORN_PRELOAD              1 (default) to import the app once in the master before forking
+#   GUNICORN_TIMEOUT              worker timeout in seconds
+#   ADMISSION_HEAVY_LIMIT/QUEUE   heavy requests running/waiting per worker (default: a quarter of the threads each)
+import multiprocessing
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gevent':
+    # Patch before the app (and pymongo) are imported in the master
+    from gevent import monkey
+    monkey.patch_all()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+wsgi_app = 'src.wsgi:app'
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+cpu_count = multiprocessing.cpu_count()
+if worker_class == 'gevent':
+    # Cooperative workers: one per core, concurrency comes from greenlets
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 256))
+    mongo_pool_size = worker_connections
+    # Reports are CPU-bound and block the whole event loop while they run: admit few, queue cheaply
+    os.environ.setdefault('ADMISSION_HEAVY_LIMIT', '2')
+    os.environ.setdefault('ADMISSION_HEAVY_QUEUE', str(worker_connections // 8))
+else:
+    # Requests mostly wait on Mongo, so run more workers than cores plus a few threads each
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpu_count * 2 + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    mongo_pool_size = threads
+    # Heavy routes may hold at most half the threads (running + queued); the rest stay free for CRUD
+    os.environ.setdefault('ADMISSION_HEAVY_LIMIT', str(max(1, threads // 4)))
+    os.environ.setdefault('ADMISSION_HEAVY_QUEUE', str(max(1, threads // 4)))
+
+def post_fork(server, worker):
+    # MongoClient must never cross a fork: give every worker its own client and pool,
+    # sized to the number of requests the worker can have in flight.
+    from src.main import init_mongo
+    from src.wsgi import app
+    init_mongo(app, max_pool_size=mongo_pool_size)
+    server.log.info('Worker %s created its MongoDB client (maxPoolSize=%s)', worker.pid, mongo_pool_size)
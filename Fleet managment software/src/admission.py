@@ -0,0 +1,130 @@
+# Admission control for expensive routes.
+#
+# Reports, dashboard analytics and bulk imports can each hold a worker thread
+# for seconds.  Views marked with @heavy_route go through a per-process gate:
+# at most ADMISSION_HEAVY_LIMIT of them run at once and ADMISSION_HEAVY_QUEUE
+# more may wait up to ADMISSION_QUEUE_TIMEOUT seconds for a slot.  Anything
+# beyond that is turned away straight away with 429, and a request that waits
+# too long gets 503; both carry Retry-After.  Because waiting requests also
+# hold a thread, limit + queue is kept below the worker's thread count so that
+# light CRUD routes always find a free thread.
+#
+# The ASGI build (src/asgi.py) admits its own @heavy_route handlers through
+# an AsyncAdmissionGate with the same limits and responses; there a waiting
+# request holds no thread, but the gate still bounds the concurrent reports
+# each worker puts on Mongo.
+import asyncio
+import threading
+import time
+from flask import current_app, g, jsonify, request
+
+class AdmissionGate:
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """Take a slot; returns None on success, 'queue_full' or 'timeout' otherwise."""
+        with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return None
+            if self.waiting >= self.queue:
+                return 'queue_full'
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.timeout
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return 'timeout'
+                    self._condition.wait(remaining)
+                self.in_flight += 1
+                return None
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+class AsyncAdmissionGate:
+    """AdmissionGate for coroutines: waiting requests await a slot instead of blocking a thread."""
+    def __init__(self, limit, queue, timeout):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Take a slot; returns None on success, 'queue_full' or 'timeout' otherwise."""
+        async with self._condition:
+            if self.in_flight < self.limit:
+                self.in_flight += 1
+                return None
+            if self.waiting >= self.queue:
+                return 'queue_full'
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < self.limit), self.timeout
+                )
+            except asyncio.TimeoutError:
+                return 'timeout'
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            return None
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+def heavy_route(view):
+    """Mark a view as expensive so it is admitted through the heavy gate."""
+    view.heavy_route = True
+    return view
+
+def admit_request():
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, 'heavy_route', False):
+        return None
+    gate = current_app.extensions['admission']
+    rejection = gate.acquire()
+    if rejection is None:
+        g.admission_gate = gate
+        return None
+    response = jsonify({'error': rejection_message(rejection)})
+    response.status_code = rejection_status(rejection)
+    response.headers['Retry-After'] = str(current_app.config['ADMISSION_RETRY_AFTER'])
+    return response
+
+def rejection_status(rejection):
+    return 429 if rejection == 'queue_full' else 503
+
+def rejection_message(rejection):
+    if rejection == 'queue_full':
+        return 'Too many report requests in progress, please retry shortly'
+    return 'Timed out waiting for capacity, please retry shortly'
+
+def release_request(exc=None):
+    gate = g.pop('admission_gate', None)
+    if gate is not None:
+        gate.release()
+
+def init_admission(app):
+    app.extensions['admission'] = AdmissionGate(
+        app.config['ADMISSION_HEAVY_LIMIT'],
+        app.config['ADMISSION_HEAVY_QUEUE'],
+        app.config['ADMISSION_QUEUE_TIMEOUT'],
+    )
+    app.before_request(admit_request)
+    app.teardown_request(release_request)
@@ -0,0 +1,495 @@
+# ASGI build of the read-heavy API (trips, expenses, dashboard, reports) on
+# PyMongo's async driver, so a slow report waits on Mongo without holding a
+# thread.  Run with:
+#
+#     uvicorn src.asgi:app --workers 4
+#
+# Every other route (writes, client payments, static pages, ...) falls through
+# to the regular Flask app, served from uvicorn's WSGI thread pool.  Response
+# bodies are identical to the Flask endpoints: both use the same filter and
+# report-builder functions.  They also answer the same conditional GETs
+# (ETag / If-None-Match, 304; see src/conditional.py), and the reports and
+# dashboard analytics go through the same per-process admission limits
+# (src/admission.py), on an asyncio gate.
+import asyncio
+import json
+import os
+import re
+import time
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+from bson import ObjectId
+from pymongo import AsyncMongoClient
+from uvicorn.middleware.wsgi import WSGIMiddleware
+from werkzeug.http import parse_etags
+from src.main import create_app, init_mongo
+from src.compression import COMPRESSIBLE_MIMETYPES, choose_encoding_from_header, compress_bytes
+from src.metrics import RequestStats, current_request, event_listeners, registry
+from src.query_budget import QueryBudgetListener
+from src.admission import AsyncAdmissionGate, heavy_route, rejection_message, rejection_status
+from src.conditional import document_version, documents_version, fresh_for, validator_headers
+from src.deadline import deadline_message, is_deadline_error, request_deadline
+from src.models.mongo_models import Truck, Employee, Trip, Expense, SubTrip, ArchiveState, TripArchive, SubTripArchive
+from src.routes.archive import merge_tiers, needs_archive, range_start
+from src.multiget import in_request_order, query_ids
+from src.routes.trips import embedded_versions, trip_list_filter
+from src.routes.expenses import expense_list_filter
+from src.routes.dashboard import analytics_query, build_analytics, build_filters
+from src.routes.reports import (
+    csv_text, revenue_batches, trip_summary_filter, expense_summary_filter, truck_performance_filters,
+    employee_performance_filters, financial_summary_filters, build_trip_summary,
+    build_expense_summary, build_truck_performance, build_employee_performance,
+    build_financial_summary, financial_summary_csv_rows, TRIP_SUMMARY_COLUMNS,
+    EXPENSE_SUMMARY_COLUMNS, TRUCK_PERFORMANCE_COLUMNS, EMPLOYEE_PERFORMANCE_COLUMNS,
+    FINANCIAL_SUMMARY_COLUMNS
+)
+
+MONGO_POOL_SIZE = int(os.environ.get('ASGI_MONGO_POOL_SIZE', 200))
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+flask_app = create_app(connect=False)
+wsgi_fallback = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+admission_gate = AsyncAdmissionGate(
+    flask_app.config['ADMISSION_HEAVY_LIMIT'],
+    flask_app.config['ADMISSION_HEAVY_QUEUE'],
+    flask_app.config['ADMISSION_QUEUE_TIMEOUT'],
+)
+request_headers = ContextVar('request_headers', default={})
+
+class State:
+    client = None
+    db = None
+
+state = State()
+routes = []
+
+class Response:
+    def __init__(self, body, status=200, content_type='application/json', headers=None):
+        self.body = body
+        self.status = status
+        self.content_type = content_type
+        self.headers = headers or {}
+
+def json_response(data, status=200):
+    # Sorted keys, like Flask's jsonify
+    body = json.dumps(data, default=str, sort_keys=True, separators=(',', ':')).encode()
+    return Response(body + b'\n', status)
+
+def csv_response(rows, filename, columns):
+    return Response(
+        csv_text(rows, columns).encode(),
+        content_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+def header(name):
+    return request_headers.get().get(name, b'').decode('latin-1')
+
+def is_conditional():
+    return bool(header(b'if-none-match'))
+
+def is_fresh(*versions):
+    return fresh_for(parse_etags(header(b'if-none-match')), *versions)
+
+def with_validators(response, *versions):
+    response.headers.update(validator_headers(*versions))
+    return response
+
+def not_modified(*versions):
+    return Response(b'', 304, headers=validator_headers(*versions))
+
+def route(pattern):
+    """Register a GET handler; '<name>' segments become keyword arguments."""
+    regex = re.compile('^' + re.sub(r'<(\w+)>', r'(?P<\1>[^/]+)', pattern) + '$')
+
+    def decorator(handler):
+        handler.route = pattern  # metrics label, same form as the Flask url_rule
+        routes.append((regex, handler))
+        return handler
+    return decorator
+
+# ---- Async data access ----
+
+def collection(model):
+    return state.db[model.collection_name]
+
+async def find_all(model, filter_dict=None):
+    return await collection(model).find(filter_dict or {}).to_list(None)
+
+async def find_by_id(model, doc_id):
+    if not ObjectId.is_valid(doc_id):
+        return None
+    return await collection(model).find_one({'_id': ObjectId(doc_id)})
+
+async def find_by_ids(model, doc_ids):
+    object_ids = [ObjectId(doc_id) for doc_id in set(doc_ids) if doc_id and ObjectId.is_valid(doc_id)]
+    if not object_ids:
+        return {}
+    docs = await collection(model).find({'_id': {'$in': object_ids}}).to_list(None)
+    return {str(doc['_id']): doc for doc in docs}
+
+async def find_version(model, doc_id):
+    if not ObjectId.is_valid(doc_id):
+        return None
+    doc = await collection(model).find_one({'_id': ObjectId(doc_id)}, {'_id': 0, 'updated_at': 1})
+    return (doc.get('updated_at'), 1) if doc is not None else None
+
+async def collection_version(model, filter_dict=None):
+    """BaseModel.collection_version on the async client."""
+    latest, count = await asyncio.gather(
+        collection(model).find_one(filter_dict or {}, {'_id': 0, 'updated_at': 1}, sort=[('updated_at', -1)]),
+        collection(model).count_documents(filter_dict) if filter_dict else collection(model).estimated_document_count(),
+    )
+    return (latest.get('updated_at') if latest else None, count)
+
+async def subtrip_revenues(trips):
+    revenues = {}
+    for model, trip_ids in revenue_batches(trips):
+        cursor = await collection(model).aggregate(SubTrip.revenue_pipeline(trip_ids))
+        revenues.update({row['_id']: float(row['revenue'] or 0) async for row in cursor})
+    return revenues
+
+async def find_trips(filter_dict):
+    """Hot trips plus archived ones when the start_date range reaches back before the cutoff (see src/routes/archive.py)."""
+    trips, archive_state = await asyncio.gather(
+        find_all(Trip, filter_dict),
+        collection(ArchiveState).find_one({'_id': 'trips'}),
+    )
+    if needs_archive((archive_state or {}).get('cutoff'), range_start(filter_dict)):
+        trips = merge_tiers(trips, await find_all(TripArchive, filter_dict))
+    return trips
+
+# ---- Trips and expenses ----
+
+async def reference_versions():
+    # Trip payloads embed truck numbers and driver names (see src/routes/trips.py)
+    return list(await asyncio.gather(collection_version(Truck), collection_version(Employee)))
+
+@route('/api/trips')
+async def get_trips(args):
+    if 'ids' in args:
+        return await get_trips_by_ids(args['ids'])
+    filter_dict = trip_list_filter(args)
+    include_archived = args.get('include_archived') == '1'
+    references = await reference_versions()
+    if include_archived:
+        references.append(await collection_version(TripArchive, filter_dict))
+    if is_conditional():
+        version = await collection_version(Trip, filter_dict)
+        if is_fresh(version, *references):
+            return not_modified(version, *references)
+    trips = await find_trips(filter_dict) if include_archived else await find_all(Trip, filter_dict)
+    trucks, drivers = await asyncio.gather(
+        find_by_ids(Truck, (trip.get('truck_id') for trip in trips)),
+        find_by_ids(Employee, (trip.get('driver_id') for trip in trips)),
+    )
+    hot_trips = [trip for trip in trips if not trip.get('archived_at')]
+    return with_validators(
+        json_response({'trips': [Trip.to_dict_populated(trip, trucks, drivers) for trip in trips]}),
+        documents_version(hot_trips), *references
+    )
+
+async def get_trips_by_ids(value):
+    ids, error = query_ids(value)
+    if error:
+        return json_response({'error': error}, 400)
+    found = await find_by_ids(Trip, ids)
+    if len(found) < len(ids):
+        found.update(await find_by_ids(TripArchive, [doc_id for doc_id in ids if doc_id not in found]))
+    trips, missing = in_request_order(ids, found)
+    versions = (documents_version(trips), *await reference_versions())
+    if is_fresh(*versions):
+        return not_modified(*versions)
+    trucks, drivers = await asyncio.gather(
+        find_by_ids(Truck, (trip.get('truck_id') for trip in trips)),
+        find_by_ids(Employee, (trip.get('driver_id') for trip in trips)),
+    )
+    return with_validators(json_response({
+        'trips': [Trip.to_dict_populated(trip, trucks, drivers) for trip in trips], 'missing': missing
+    }), *versions)
+
+@route('/api/trips/<trip_id>')
+async def get_trip(args, trip_id):
+    trip = await find_by_id(Trip, trip_id)
+    subtrip_model = SubTrip
+    if not trip:
+        trip = await find_by_id(TripArchive, trip_id)
+        subtrip_model = SubTripArchive
+    if not trip:
+        return json_response({'error': 'Trip not found'}, 404)
+    trucks, drivers = await asyncio.gather(
+        find_by_ids(Truck, [trip.get('truck_id')]),
+        find_by_ids(Employee, [trip.get('driver_id')]),
+    )
+    references = embedded_versions(trip, trucks, drivers)
+    if is_conditional():
+        versions = (document_version(trip), await collection_version(subtrip_model, {'trip_id': trip_id}), *references)
+        if is_fresh(*versions):
+            return not_modified(*versions)
+    subtrips = await find_all(subtrip_model, {'trip_id': trip_id})
+    trip_dict = Trip.to_dict_populated(trip, trucks, drivers)
+    trip_dict['subtrips'] = [SubTrip.to_dict(sub) for sub in subtrips]
+    return with_validators(
+        json_response({'trip': trip_dict}), document_version(trip), documents_version(subtrips), *references
+    )
+
+@route('/api/trips/<trip_id>/subtrips')
+async def get_subtrips(args, trip_id):
+    subtrips = await find_all(SubTrip, {'trip_id': trip_id})
+    if not subtrips and await find_by_id(TripArchive, trip_id):
+        subtrips = await find_all(SubTripArchive, {'trip_id': trip_id})
+    return json_response({'subtrips': [SubTrip.to_dict(sub) for sub in subtrips]})
+
+@route('/api/expenses')
+async def get_expenses(args):
+    if 'ids' in args:
+        return await get_expenses_by_ids(args['ids'])
+    filter_dict = expense_list_filter(args)
+    # Expense payloads embed truck numbers
+    truck_version = await collection_version(Truck)
+    if is_conditional():
+        version = await collection_version(Expense, filter_dict)
+        if is_fresh(version, truck_version):
+            return not_modified(version, truck_version)
+    expenses = await find_all(Expense, filter_dict)
+    trucks = await find_by_ids(Truck, (expense.get('truck_id') for expense in expenses))
+    return with_validators(
+        json_response({'expenses': [Expense.to_dict_populated(expense, trucks) for expense in expenses]}),
+        documents_version(expenses), truck_version
+    )
+
+async def get_expenses_by_ids(value):
+    ids, error = query_ids(value)
+    if error:
+        return json_response({'error': error}, 400)
+    expenses, missing = in_request_order(ids, await find_by_ids(Expense, ids))
+    versions = (documents_version(expenses), await collection_version(Truck))
+    if is_fresh(*versions):
+        return not_modified(*versions)
+    trucks = await find_by_ids(Truck, (expense.get('truck_id') for expense in expenses))
+    return with_validators(json_response({
+        'expenses': [Expense.to_dict_populated(expense, trucks) for expense in expenses], 'missing': missing
+    }), *versions)
+
+@route('/api/expenses/<expense_id>')
+async def get_expense(args, expense_id):
+    truck_version = await collection_version(Truck)
+    if is_conditional():
+        version = await find_version(Expense, expense_id)
+        if version and is_fresh(version, truck_version):
+            return not_modified(version, truck_version)
+    expense = await find_by_id(Expense, expense_id)
+    if not expense:
+        return json_response({'error': 'Expense not found'}, 404)
+    trucks = await find_by_ids(Truck, [expense.get('truck_id')])
+    return with_validators(
+        json_response({'expense': Expense.to_dict_populated(expense, trucks)}), document_version(expense), truck_version
+    )
+
+# ---- Dashboard ----
+
+@route('/api/dashboard/filters')
+async def get_filters(args):
+    trucks, drivers, regions = await asyncio.gather(
+        find_all(Truck, {'status': 'active'}),
+        find_all(Employee, {'position': 'driver', 'status': 'active'}),
+        collection(Truck).distinct('region', {'region': {'$ne': None, '$exists': True}}),
+    )
+    return json_response(build_filters(trucks, drivers, regions))
+
+@route('/api/dashboard/analytics')
+@heavy_route
+async def get_analytics(args):
+    trip_filter, days, start_date = analytics_query(args)
+    trips, trucks = await asyncio.gather(
+        find_trips(trip_filter),
+        find_all(Truck, {'status': 'active'}),
+    )
+    return json_response(build_analytics(trips, trucks, days, start_date))
+
+# ---- Reports ----
+
+@route('/api/reports/trip_summary')
+@heavy_route
+async def trip_summary_report(args):
+    trips = await find_trips(trip_summary_filter(args))
+    trucks, drivers, revenues = await asyncio.gather(
+        find_by_ids(Truck, (trip.get('truck_id') for trip in trips)),
+        find_by_ids(Employee, (trip.get('driver_id') for trip in trips)),
+        subtrip_revenues(trips),
+    )
+    report_data = build_trip_summary(trips, trucks, drivers, revenues)
+    if args.get('format') == 'csv':
+        return csv_response(report_data['trips'], 'trip_summary_report.csv', TRIP_SUMMARY_COLUMNS)
+    return json_response(report_data)
+
+@route('/api/reports/expense_summary')
+@heavy_route
+async def expense_summary_report(args):
+    expenses = await find_all(Expense, expense_summary_filter(args))
+    trucks = await find_by_ids(Truck, (expense.get('truck_id') for expense in expenses))
+    report_data = build_expense_summary(expenses, trucks)
+    if args.get('format') == 'csv':
+        return csv_response(report_data['expenses'], 'expense_summary_report.csv', EXPENSE_SUMMARY_COLUMNS)
+    return json_response(report_data)
+
+@route('/api/reports/truck_performance')
+@heavy_route
+async def truck_performance_report(args):
+    truck_filter, trip_filter = truck_performance_filters(args)
+    trucks = await find_all(Truck, truck_filter)
+    trip_filter['truck_id'] = {'$in': [str(truck['_id']) for truck in trucks]}
+    trips = await find_trips(trip_filter)
+    report_data = build_truck_performance(trucks, trips, await subtrip_revenues(trips))
+    if args.get('format') == 'csv':
+        return csv_response(report_data['trucks'], 'truck_performance_report.csv', TRUCK_PERFORMANCE_COLUMNS)
+    return json_response(report_data)
+
+@route('/api/reports/employee_performance')
+@heavy_route
+async def employee_performance_report(args):
+    employee_filter, trip_filter = employee_performance_filters(args)
+    employees = await find_all(Employee, employee_filter)
+    trip_filter['driver_id'] = {'$in': [str(employee['_id']) for employee in employees]}
+    trips = await find_trips(trip_filter)
+    report_data = build_employee_performance(employees, trips, await subtrip_revenues(trips))
+    if args.get('format') == 'csv':
+        return csv_response(report_data['employees'], 'employee_performance_report.csv', EMPLOYEE_PERFORMANCE_COLUMNS)
+    return json_response(report_data)
+
+@route('/api/reports/financial_summary')
+@heavy_route
+async def financial_summary_report(args):
+    trip_filter, expense_filter = financial_summary_filters(args)
+    # Trips and expenses are independent: fetch them concurrently
+    trips, expenses = await asyncio.gather(
+        find_trips(trip_filter),
+        find_all(Expense, expense_filter),
+    )
+    report_data = build_financial_summary(trips, expenses, await subtrip_revenues(trips))
+    if args.get('format') == 'csv':
+        return csv_response(financial_summary_csv_rows(report_data), 'financial_summary_report.csv', FINANCIAL_SUMMARY_COLUMNS)
+    return json_response(report_data)
+
+# ---- ASGI plumbing ----
+
+def match_route(method, path):
+    if method not in ('GET', 'HEAD'):
+        return None, None
+    for regex, handler in routes:
+        match = regex.match(path)
+        if match:
+            return handler, match.groupdict()
+    return None, None
+
+def compress(response, accept_encoding):
+    """Apply the same compression policy as the Flask after_request hook."""
+    config = flask_app.config
+    if not config['COMPRESS_ENABLED'] or response.content_type.split(';')[0] not in COMPRESSIBLE_MIMETYPES:
+        return
+    response.headers['Vary'] = 'Accept-Encoding'
+    encoding = choose_encoding_from_header(accept_encoding)
+    if encoding is None or len(response.body) < config['COMPRESS_MIN_SIZE']:
+        return
+    level = config['COMPRESS_ZSTD_LEVEL'] if encoding == 'zstd' else config['COMPRESS_LEVEL']
+    response.body = compress_bytes(response.body, encoding, level)
+    response.headers['Content-Encoding'] = encoding
+
+async def send_response(send, response, head=False):
+    headers = [
+        (b'content-type', response.content_type.encode()),
+        (b'content-length', str(len(response.body)).encode()),
+    ]
+    headers.extend((name.lower().encode(), value.encode()) for name, value in response.headers.items())
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if head else response.body})
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Clients are created per worker process, after uvicorn has forked
+            listeners = [QueryBudgetListener()]
+            if flask_app.config['METRICS_ENABLED']:
+                listeners.extend(event_listeners())
+            state.client = AsyncMongoClient(
+                flask_app.config['MONGO_URI'], maxPoolSize=MONGO_POOL_SIZE, event_listeners=listeners
+            )
+            state.db = state.client.get_default_database()
+            init_mongo(flask_app, max_pool_size=WSGI_THREADS)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await state.client.close()
+            flask_app.mongo_client.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+def admission_rejection(rejection):
+    response = json_response({'error': rejection_message(rejection)}, rejection_status(rejection))
+    response.headers['Retry-After'] = str(flask_app.config['ADMISSION_RETRY_AFTER'])
+    return response
+
+class ClientDisconnected(Exception):
+    pass
+
+async def run_handler(handler, args, params):
+    if not flask_app.config['REQUEST_DEADLINE']:
+        return await handler(args, **params)
+    with request_deadline(flask_app.config['REQUEST_DEADLINE']):
+        return await handler(args, **params)
+
+async def until_disconnect(receive, coro):
+    """Run a handler, cancelling it (and its pending Mongo operations) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    if task.done():
+        watcher.cancel()
+        return task.result()
+    task.cancel()
+    raise ClientDisconnected()
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    handler, params = match_route(scope.get('method'), scope.get('path', ''))
+    if scope['type'] != 'http' or handler is None:
+        return await wsgi_fallback(scope, receive, send)
+
+    query = parse_qs(scope.get('query_string', b'').decode(), keep_blank_values=True)
+    args = {key: values[0] for key, values in query.items()}
+    headers = dict(scope.get('headers', []))
+    start = time.perf_counter()
+    stats = RequestStats()
+    token = current_request.set(stats)
+    headers_token = request_headers.set(headers)
+    gate = admission_gate if getattr(handler, 'heavy_route', False) else None
+    try:
+        rejection = await gate.acquire() if gate else None
+        if rejection:
+            gate = None
+            response = admission_rejection(rejection)
+        else:
+            response = await until_disconnect(receive, run_handler(handler, args, params))
+    except ClientDisconnected:
+        return
+    except Exception as e:
+        if is_deadline_error(e):
+            response = json_response({'error': deadline_message()}, 504)
+        else:
+            response = json_response({'error': str(e)}, 500)
+    finally:
+        if gate:
+            await gate.release()
+        request_headers.reset(headers_token)
+        current_request.reset(token)
+    compress(response, headers.get(b'accept-encoding', b'').decode('latin-1'))
+    if flask_app.config['METRICS_ENABLED']:
+        registry.record_request(handler.route, scope['method'], response.status, time.perf_counter() - start, stats)
+    await send_response(send, response, head=scope['method'] == 'HEAD')
@@ -0,0 +1,98 @@
+import zlib
+from flask import current_app, request
+from werkzeug.http import parse_accept_header
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip is always available
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'application/x-ndjson')
+
+def supported_encodings():
+    return ('zstd', 'gzip') if zstandard is not None else ('gzip',)
+
+def choose_encoding(accept_encodings):
+    """Pick the preferred encoding the client accepts (zstd wins ties), or None."""
+    return accept_encodings.best_match(supported_encodings())
+
+def choose_encoding_from_header(header_value):
+    return choose_encoding(parse_accept_header(header_value or ''))
+
+def compressor(encoding, level):
+    """Incremental compressor with compress(chunk)/flush() for the given encoding."""
+    if encoding == 'zstd':
+        return ZstdStream(level)
+    return GzipStream(level)
+
+class GzipStream:
+    def __init__(self, level):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, chunk):
+        # Sync flush so each streamed chunk reaches the client without waiting for the next
+        return self._obj.compress(chunk) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+class ZstdStream:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk):
+        return self._obj.compress(chunk) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+def compress_bytes(data, encoding, level):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return zlib.compress(data, level, wbits=31)
+
+def compress_iter(chunks, stream):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+def compression_level(encoding):
+    config = current_app.config
+    return config['COMPRESS_ZSTD_LEVEL'] if encoding == 'zstd' else config['COMPRESS_LEVEL']
+
+def compress_response(response):
+    """after_request hook: compress JSON/CSV/NDJSON API bodies the client can decode."""
+    if (
+        not current_app.config['COMPRESS_ENABLED']
+        or response.status_code < 200 or response.status_code in (204, 206, 304)
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or response.direct_passthrough
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    level = compression_level(encoding)
+    if response.is_streamed:
+        # Size is unknown up front: compress chunk by chunk as the body is produced
+        response.response = compress_iter(response.response, compressor(encoding, level))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        # Below the threshold the CPU spent outweighs the bytes saved
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress_bytes(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{encoding}')
+    return response
@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+from flask import Response, request
+from werkzeug.http import quote_etag
+
+# Helpers for conditional GET on entity endpoints.
+#
+# A "version" is an (updated_at, count) pair: for a single document the count
+# is 1, for a list it is the number of matching documents, so hard deletes and
+# inserts change the version even when max(updated_at) does not move.  A
+# response can depend on several versions (a trip list also shows truck
+# numbers and driver names), which are combined into one weak ETag.
+#
+# Only the ETag is a validator: no Last-Modified is sent and If-Modified-Since
+# is ignored.  A date cannot carry the count, so after a hard delete or an
+# archive move (same newest updated_at, fewer documents) an If-Modified-Since
+# check would wrongly answer 304.
+#
+# is_fresh/with_validators work on the Flask request and response; the ASGI
+# build (src/asgi.py) calls fresh_for and validator_headers with the headers
+# it parsed itself, so both answer the same ETags and 304s.
+
+def document_version(doc):
+    return (doc.get('updated_at'), 1) if doc else None
+
+def documents_version(docs):
+    stamps = [doc.get('updated_at') for doc in docs if isinstance(doc.get('updated_at'), datetime)]
+    return (max(stamps) if stamps else None, len(docs))
+
+def _stamp(value):
+    return str(int(value.replace(tzinfo=timezone.utc).timestamp() * 1000)) if isinstance(value, datetime) else '0'
+
+def etag_for(*versions):
+    return '.'.join(f'{_stamp(updated_at)}-{count}' for updated_at, count in versions)
+
+def is_conditional():
+    return bool(request.if_none_match)
+
+def is_fresh(*versions):
+    """True when the client's cached copy (If-None-Match) is still current."""
+    return fresh_for(request.if_none_match, *versions)
+
+def fresh_for(if_none_match, *versions):
+    """is_fresh for a parsed If-None-Match (werkzeug ETags)."""
+    return bool(if_none_match) and if_none_match.contains_weak(etag_for(*versions))
+
+def validator_headers(*versions):
+    return {
+        'ETag': quote_etag(etag_for(*versions), weak=True),
+        # Let browsers keep the body but revalidate before reusing it
+        'Cache-Control': 'no-cache',
+    }
+
+def with_validators(response, *versions):
+    response.headers.update(validator_headers(*versions))
+    return response
+
+def not_modified(*versions):
+    return with_validators(Response(status=304), *versions)
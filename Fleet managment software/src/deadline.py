@@ -0,0 +1,75 @@
+# Per-request deadlines.
+#
+# Every request runs inside request_deadline(REQUEST_DEADLINE): pymongo.timeout
+# gives each Mongo command the remaining budget as maxTimeMS, so the server
+# abandons the query when the request would, and long Python stages (report
+# builders, analytics loops) call check_deadline() to stop burning CPU once
+# the budget is spent.  Handlers turn either failure into a 504 with
+# deadline_response().  Views that stream open-ended bodies (the change
+# export) opt out with @no_deadline and bound their work by page size instead;
+# bulk imports opt out too and give each batch its own batch_deadline(), so a
+# large upload is never cut off between two committed batches.
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import pymongo
+from flask import current_app, g, jsonify, request
+from pymongo.errors import PyMongoError
+
+current_deadline = ContextVar('current_deadline', default=None)
+
+class DeadlineExceeded(Exception):
+    pass
+
+@contextmanager
+def request_deadline(seconds):
+    token = current_deadline.set(time.monotonic() + seconds)
+    try:
+        with pymongo.timeout(seconds):
+            yield
+    finally:
+        current_deadline.reset(token)
+
+def check_deadline():
+    """Raise DeadlineExceeded once the current request's budget is spent (no-op outside a deadline)."""
+    expires = current_deadline.get()
+    if expires is not None and time.monotonic() > expires:
+        raise DeadlineExceeded('Request deadline exceeded')
+
+def is_deadline_error(e):
+    # PyMongoError.timeout is True for CSOT expiry (maxTimeMS, socket or server selection timeouts)
+    return isinstance(e, DeadlineExceeded) or (isinstance(e, PyMongoError) and e.timeout)
+
+def deadline_message():
+    return 'The request took too long and was cancelled; try a shorter date range or fewer filters'
+
+def deadline_response():
+    return jsonify({'error': deadline_message()}), 504
+
+# ---- Flask integration ----
+
+def no_deadline(view):
+    """Exempt a view from REQUEST_DEADLINE."""
+    view.no_deadline = True
+    return view
+
+def batch_deadline():
+    """A fresh REQUEST_DEADLINE budget for one batch of a @no_deadline view (no-op when deadlines are off)."""
+    seconds = current_app.config.get('REQUEST_DEADLINE')
+    return request_deadline(seconds) if seconds else nullcontext()
+
+def start_deadline():
+    view = current_app.view_functions.get(request.endpoint)
+    if getattr(view, 'no_deadline', False):
+        return
+    g.deadline_cm = request_deadline(current_app.config['REQUEST_DEADLINE'])
+    g.deadline_cm.__enter__()
+
+def stop_deadline(exc=None):
+    cm = g.pop('deadline_cm', None)
+    if cm is not None:
+        cm.__exit__(None, None, None)
+
+def init_deadline(app):
+    app.before_request(start_deadline)
+    app.teardown_request(stop_deadline)
@@ -4,9 +4,10 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import os
-from flask import Flask, send_from_directory, render_template
+from flask import Flask, send_from_directory, render_template, current_app
 from flask_cors import CORS
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 from src.routes.user import user_bp
 from src.routes.dashboard import dashboard_bp
 from src.routes.trucks import trucks_bp
@@ -15,34 +16,142 @@ from src.routes.trips import trips_bp
 from src.routes.expenses import expenses_bp
 from src.routes.reports import reports_bp
 from src.routes.clientpayment import clientpayment_bp
+from src.routes.imports import imports_bp
+from src.routes.health import health_bp
+from src.routes.search import search_bp
+from src.routes.telemetry import telemetry_bp
+from src.routes.lanes import lanes_bp
+from src.routes.availability import availability_bp
+from src.routes.archive import archive_bp
+from src.routes.export import export_bp
+from src.routes.fuel import fuel_bp
+from src.models.mongo_models import ensure_indexes
+from src.static_assets import StaticAssetCache, asset_response
+from src.compression import compress_response
+from src.metrics import event_listeners, init_metrics, metrics_bp
+from src.query_budget import QueryBudgetListener, init_query_budget
+from src.admission import init_admission
+from src.deadline import init_deadline
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+def init_mongo(app, max_pool_size=None):
+    """Create this process's MongoClient and attach the database to the app.
 
-# Enable CORS for all routes
-CORS(app)
+    MongoClient is not fork-safe, so under gunicorn this runs in each worker's
+    post_fork hook (see gunicorn.conf.py) rather than at import time.
+    """
+    listeners = [QueryBudgetListener()]
+    if app.config.get('METRICS_ENABLED'):
+        listeners.extend(event_listeners())
+    options = {'event_listeners': listeners}
+    if max_pool_size:
+        options['maxPoolSize'] = max_pool_size
+    mongo_client = MongoClient(app.config['MONGO_URI'], **options)
+    app.mongo_client = mongo_client
+    app.db = mongo_client.get_default_database()  # Or specify db if not in URL
 
-# MongoDB configuration
-MONGO_URI = os.environ.get('MONGO_URI')  # Get from env var
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client.get_default_database()  # Or specify db if not in URL
+    try:
+        ensure_indexes(app.db)
+    except PyMongoError as e:
+        app.logger.warning('Could not create indexes: %s', e)
+    return mongo_client
 
-# Make db available to the app
-app.db = db
+def create_app(connect=True):
+    """Build the Flask app; pass connect=False to defer init_mongo until after a fork."""
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    # MongoDB configuration
+    app.config['MONGO_URI'] = os.environ.get('MONGO_URI')  # Get from env var
+    # Seconds between write-behind flushes of truck view counts (0 = write every view straight through)
+    app.config['TRUCK_VIEW_FLUSH_INTERVAL'] = float(os.environ.get('TRUCK_VIEW_FLUSH_INTERVAL', 0))
+    # Telemetry pings are group-committed: every TELEMETRY_FLUSH_INTERVAL seconds or once
+    # TELEMETRY_FLUSH_SIZE points wait (0 = write each batch in its request). Batches that would
+    # push more than TELEMETRY_MAX_PENDING points into the buffer get 503 + Retry-After.
+    app.config['TELEMETRY_FLUSH_INTERVAL'] = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', 1))
+    app.config['TELEMETRY_FLUSH_SIZE'] = int(os.environ.get('TELEMETRY_FLUSH_SIZE', 5000))
+    app.config['TELEMETRY_MAX_PENDING'] = int(os.environ.get('TELEMETRY_MAX_PENDING', 200000))
+    # A completed trip whose km/l is more than FUEL_ANOMALY_SIGMA standard deviations from its
+    # truck's running mean raises a fuel_anomaly alert, once the truck has FUEL_ANOMALY_MIN_TRIPS trips
+    app.config['FUEL_ANOMALY_SIGMA'] = float(os.environ.get('FUEL_ANOMALY_SIGMA', 3))
+    app.config['FUEL_ANOMALY_MIN_TRIPS'] = int(os.environ.get('FUEL_ANOMALY_MIN_TRIPS', 10))
 
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(dashboard_bp, url_prefix='/api')
-app.register_blueprint(trucks_bp, url_prefix='/api')
-app.register_blueprint(employees_bp, url_prefix='/api')
-app.register_blueprint(trips_bp, url_prefix='/api')
-app.register_blueprint(expenses_bp, url_prefix='/api')
-app.register_blueprint(reports_bp, url_prefix='/api')
-app.register_blueprint(clientpayment_bp, url_prefix='/api')
+    # Load, fingerprint and pre-compress static pages once (set STATIC_ASSET_CACHE=0 to read from disk, e.g. while editing them)
+    app.config['STATIC_ASSET_CACHE'] = os.environ.get('STATIC_ASSET_CACHE', '1') == '1'
+    if app.config['STATIC_ASSET_CACHE']:
+        app.extensions['static_assets'] = StaticAssetCache(app.static_folder)
+
+    # Per-route latency and Mongo command/pool metrics at /api/_metrics (registered first so its
+    # after_request hook runs last and the timing includes compression)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    if app.config['METRICS_ENABLED']:
+        init_metrics(app)
+
+    # Dev/test: warn (with the repeated query shapes and call sites) when a request issues more
+    # Mongo commands than this; 0 disables the check. See src/query_budget.py.
+    app.config['QUERY_BUDGET'] = int(os.environ.get('QUERY_BUDGET', 0))
+    if app.config['QUERY_BUDGET']:
+        init_query_budget(app)
+
+    # Time budget per request in seconds: passed to Mongo as maxTimeMS and checked between
+    # processing stages (src/deadline.py); expiry answers 504. 0 disables it.
+    app.config['REQUEST_DEADLINE'] = float(os.environ.get('REQUEST_DEADLINE', 30))
+    if app.config['REQUEST_DEADLINE']:
+        init_deadline(app)
+
+    # Heavy routes (@heavy_route: reports, analytics, imports) share a per-process gate so they
+    # cannot take every worker thread; see src/admission.py. gunicorn.conf.py sizes these per worker.
+    app.config['ADMISSION_HEAVY_LIMIT'] = int(os.environ.get('ADMISSION_HEAVY_LIMIT', 2))
+    app.config['ADMISSION_HEAVY_QUEUE'] = int(os.environ.get('ADMISSION_HEAVY_QUEUE', 2))
+    app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+    app.config['ADMISSION_RETRY_AFTER'] = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))
+    init_admission(app)
+
+    # Compress JSON/CSV API responses (gzip, or zstd when the zstandard package is installed)
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_ZSTD_LEVEL'] = int(os.environ.get('COMPRESS_ZSTD_LEVEL', 3))
+    app.after_request(compress_response)
+
+    # Enable CORS for all routes
+    CORS(app)
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(dashboard_bp, url_prefix='/api')
+    app.register_blueprint(trucks_bp, url_prefix='/api')
+    app.register_blueprint(employees_bp, url_prefix='/api')
+    app.register_blueprint(trips_bp, url_prefix='/api')
+    app.register_blueprint(expenses_bp, url_prefix='/api')
+    app.register_blueprint(reports_bp, url_prefix='/api')
+    app.register_blueprint(clientpayment_bp, url_prefix='/api')
+    app.register_blueprint(imports_bp, url_prefix='/api')
+    app.register_blueprint(search_bp, url_prefix='/api')
+    app.register_blueprint(telemetry_bp, url_prefix='/api')
+    app.register_blueprint(lanes_bp, url_prefix='/api')
+    app.register_blueprint(availability_bp, url_prefix='/api')
+    app.register_blueprint(archive_bp, url_prefix='/api')
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(fuel_bp, url_prefix='/api')
+    app.register_blueprint(health_bp, url_prefix='/api')
+    if app.config['METRICS_ENABLED']:
+        app.register_blueprint(metrics_bp, url_prefix='/api')
+
+    app.add_url_rule('/', defaults={'path': ''}, view_func=serve)
+    app.add_url_rule('/<path:path>', view_func=serve)
+
+    if connect:
+        init_mongo(app)
+    return app
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
 def serve(path):
-    static_folder_path = app.static_folder
+    static_assets = current_app.extensions.get('static_assets')
+    if static_assets is not None:
+        # Served from memory; unknown paths fall back to index.html (SPA routing)
+        asset = (static_assets.get(path) if path else None) or static_assets.get('index.html')
+        if asset is None:
+            return "index.html not found", 404
+        return asset_response(asset)
+
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
             return "Static folder not configured", 404
 
@@ -57,4 +166,4 @@ def serve(path):
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    create_app().run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,243 @@
+# Request and MongoDB metrics, exposed in Prometheus text format at
+# /api/_metrics.
+#
+# Route timings come from before/after_request hooks; Mongo command timings and
+# pool statistics come from pymongo event listeners registered on the shared
+# client in init_mongo.  Commands are attributed to the request that issued
+# them through a context variable, which follows the request across threads,
+# greenlets and asyncio tasks alike.  Metrics are kept per process: under
+# gunicorn each worker reports its own numbers (the pid label tells them apart).
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from flask import Blueprint, Response, g, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+class RequestStats:
+    """Mongo commands issued while serving one request."""
+
+    def __init__(self):
+        self.commands = 0
+        self.command_seconds = 0.0
+
+current_request = ContextVar('current_request', default=None)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.request_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.request_commands = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+            self.request_command_seconds = defaultdict(float)
+            self.responses = defaultdict(int)
+            self.command_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.command_failures = defaultdict(int)
+            self.pool_gauges = defaultdict(int)
+            self.pool_counters = defaultdict(int)
+            self.checkout_wait = Histogram(LATENCY_BUCKETS)
+
+    def record_request(self, route, method, status, seconds, stats):
+        key = (route, method)
+        with self._lock:
+            self.request_latency[key].observe(seconds)
+            self.responses[(route, method, str(status))] += 1
+            if stats is not None:
+                self.request_commands[key].observe(stats.commands)
+                self.request_command_seconds[key] += stats.command_seconds
+
+    def record_command(self, name, seconds, failed):
+        with self._lock:
+            self.command_latency[name].observe(seconds)
+            if failed:
+                self.command_failures[name] += 1
+
+    def adjust_pool(self, address, gauge, delta):
+        with self._lock:
+            self.pool_gauges[(address, gauge)] += delta
+
+    def count_pool(self, address, counter):
+        with self._lock:
+            self.pool_counters[(address, counter)] += 1
+
+    def observe_checkout_wait(self, seconds):
+        with self._lock:
+            self.checkout_wait.observe(seconds)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        pid = str(os.getpid())
+        lines = []
+        with self._lock:
+            histogram(lines, 'fleet_http_request_duration_seconds', 'Request latency by route.',
+                      self.request_latency, ('route', 'method'), pid)
+            counter(lines, 'fleet_http_responses_total', 'Responses by route and status.',
+                    self.responses, ('route', 'method', 'status'), pid)
+            histogram(lines, 'fleet_http_request_mongo_commands', 'Mongo commands issued per request.',
+                      self.request_commands, ('route', 'method'), pid)
+            counter(lines, 'fleet_http_request_mongo_seconds_total', 'Time spent in Mongo commands per route.',
+                    self.request_command_seconds, ('route', 'method'), pid)
+            histogram(lines, 'fleet_mongo_command_duration_seconds', 'Mongo command latency by command name.',
+                      {(name,): h for name, h in self.command_latency.items()}, ('command',), pid)
+            counter(lines, 'fleet_mongo_command_failures_total', 'Failed Mongo commands by command name.',
+                    {(name,): n for name, n in self.command_failures.items()}, ('command',), pid)
+            gauge(lines, 'fleet_mongo_pool_connections', 'Open and checked-out pool connections.',
+                  self.pool_gauges, ('address', 'state'), pid)
+            counter(lines, 'fleet_mongo_pool_events_total', 'Pool clears, checkout failures and connection churn.',
+                    self.pool_counters, ('address', 'event'), pid)
+            histogram(lines, 'fleet_mongo_pool_checkout_wait_seconds', 'Time spent waiting for a pool connection.',
+                      {(): self.checkout_wait}, (), pid)
+        return '\n'.join(lines) + '\n'
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def labels(names, values, pid, **extra):
+    pairs = list(zip(names, values)) + [('pid', pid)] + list(extra.items())
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in pairs) + '}'
+
+def counter(lines, name, help_text, values, label_names, pid):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} counter')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{labels(label_names, key, pid)} {value}')
+
+def gauge(lines, name, help_text, values, label_names, pid):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} gauge')
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{labels(label_names, key, pid)} {value}')
+
+def histogram(lines, name, help_text, histograms, label_names, pid):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, h in sorted(histograms.items()):
+        for bound, count in zip(h.buckets, h.counts):
+            lines.append(f'{name}_bucket{labels(label_names, key, pid, le=bound)} {count}')
+        lines.append(f'{name}_bucket{labels(label_names, key, pid, le="+Inf")} {h.total}')
+        lines.append(f'{name}_sum{labels(label_names, key, pid)} {h.sum}')
+        lines.append(f'{name}_count{labels(label_names, key, pid)} {h.total}')
+
+registry = MetricsRegistry()
+
+# ---- pymongo listeners ----
+
+class CommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, failed=False)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed):
+        seconds = event.duration_micros / 1e6
+        registry.record_command(event.command_name, seconds, failed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.commands += 1
+            stats.command_seconds += seconds
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        registry.count_pool(address(event), 'pool_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        registry.adjust_pool(address(event), 'open', 1)
+        registry.count_pool(address(event), 'connection_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        registry.adjust_pool(address(event), 'open', -1)
+        registry.count_pool(address(event), 'connection_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        registry.count_pool(address(event), f'checkout_failed_{event.reason}')
+
+    def connection_checked_out(self, event):
+        registry.adjust_pool(address(event), 'checked_out', 1)
+        # duration (time spent waiting, in seconds) is reported by pymongo >= 4.7
+        wait = getattr(event, 'duration', None)
+        if wait is not None:
+            registry.observe_checkout_wait(wait)
+
+    def connection_checked_in(self, event):
+        registry.adjust_pool(address(event), 'checked_out', -1)
+
+def address(event):
+    host, port = event.address
+    return f'{host}:{port}'
+
+def event_listeners():
+    """Listeners to pass to MongoClient/AsyncMongoClient(event_listeners=...)."""
+    return [CommandMetrics(), PoolMetrics()]
+
+# ---- Flask integration ----
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/_metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+def start_request_metrics():
+    g.metrics_start = time.perf_counter()
+    g.metrics_stats = RequestStats()
+    g.metrics_token = current_request.set(g.metrics_stats)
+
+def record_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        registry.record_request(route, request.method, response.status_code,
+                                time.perf_counter() - start, g.get('metrics_stats'))
+    return response
+
+def finish_request_metrics(exc=None):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        # Worker threads are reused between requests: don't leak this request's stats into the next
+        current_request.reset(token)
+
+def init_metrics(app):
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(finish_request_metrics)
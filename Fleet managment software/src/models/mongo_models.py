@@ -1,10 +1,20 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
 from flask import current_app
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 def get_db():
     return current_app.db
 
+# Serves collection_version() for conditional GETs on the entity lists and the
+# (updated_at, _id) keyset scans of the change export (src/routes/export.py)
+UPDATED_AT_INDEX = IndexModel([('updated_at', ASCENDING), ('_id', ASCENDING)])
+
+def version_index(field):
+    """(field, updated_at): collection_version({field: value}) from the index alone, for a list filter."""
+    return IndexModel([(field, ASCENDING), ('updated_at', ASCENDING)])
+
 def bson_to_str(obj):
     if isinstance(obj, ObjectId):
         return str(obj)
@@ -18,6 +28,8 @@ def bson_to_str(obj):
         return obj
 
 class BaseModel:
+    indexes = []
+
     @classmethod
     def get_collection(cls):
         db = get_db()
@@ -40,6 +52,43 @@ class BaseModel:
         except Exception:
             return None
 
+    @classmethod
+    def find_by_ids(cls, doc_ids):
+        # One $in query; returns {str(_id): doc} and silently skips ids that are not ObjectIds
+        object_ids = {ObjectId(doc_id) for doc_id in doc_ids if doc_id and ObjectId.is_valid(doc_id)}
+        if not object_ids:
+            return {}
+        collection = cls.get_collection()
+        return {str(doc["_id"]): doc for doc in collection.find({"_id": {"$in": list(object_ids)}})}
+
+    @classmethod
+    def find_version(cls, doc_id):
+        """(updated_at, 1) for one document, or None if it does not exist."""
+        collection = cls.get_collection()
+        if not isinstance(doc_id, ObjectId):
+            if not ObjectId.is_valid(doc_id):
+                return None
+            doc_id = ObjectId(doc_id)
+        doc = collection.find_one({"_id": doc_id}, {"_id": 0, "updated_at": 1})
+        return (doc.get("updated_at"), 1) if doc is not None else None
+
+    @classmethod
+    def collection_version(cls, filter_dict=None):
+        """(max updated_at, count) over the documents matching filter_dict.
+
+        Unfiltered, and for a single equality filter with a (field, updated_at)
+        index (see version_index), both parts are answered from the index alone:
+        the newest entry and a count scan.  Other filters (several fields, date
+        ranges) still use an index to find the matches but read each one.
+        """
+        collection = cls.get_collection()
+        latest = collection.find_one(filter_dict or {}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+        updated_at = latest.get("updated_at") if latest else None
+        if not filter_dict:
+            # Metadata count: no collection scan
+            return (updated_at, collection.estimated_document_count())
+        return (updated_at, collection.count_documents(filter_dict))
+
     @classmethod
     def insert_one(cls, document):
         collection = cls.get_collection()
@@ -49,6 +98,22 @@ class BaseModel:
         result = collection.insert_one(document)
         return result.inserted_id
 
+    @classmethod
+    def insert_many(cls, documents):
+        collection = cls.get_collection()
+        now = datetime.utcnow()
+        for document in documents:
+            if 'created_at' not in document:
+                document['created_at'] = now
+            document['updated_at'] = now
+        return collection.insert_many(documents, ordered=False)
+
+    @classmethod
+    def insert_and_return(cls, document):
+        # insert_one fills in document['_id'], so the caller gets the stored document back without a re-read
+        cls.insert_one(document)
+        return document
+
     @classmethod
     def update_one(cls, doc_id, update_dict):
         collection = cls.get_collection()
@@ -57,6 +122,69 @@ class BaseModel:
         update_dict['updated_at'] = datetime.utcnow()
         return collection.update_one({"_id": doc_id}, {"$set": update_dict})
 
+    @classmethod
+    def update_and_return(cls, doc_id, update_dict, extra_filter=None, return_document=ReturnDocument.AFTER):
+        collection = cls.get_collection()
+        if not isinstance(doc_id, ObjectId):
+            if not ObjectId.is_valid(doc_id):
+                return None
+            doc_id = ObjectId(doc_id)
+        update_dict['updated_at'] = datetime.utcnow()
+        query = {"_id": doc_id, **(extra_filter or {})}
+        return collection.find_one_and_update(query, {"$set": update_dict}, return_document=return_document)
+
+    @classmethod
+    def increment_one(cls, doc_id, inc_dict):
+        collection = cls.get_collection()
+        if isinstance(doc_id, str):
+            doc_id = ObjectId(doc_id)
+        return collection.update_one({"_id": doc_id}, {"$inc": inc_dict, "$set": {"updated_at": datetime.utcnow()}})
+
+    @classmethod
+    def update_many_by_ids(cls, doc_ids, update_dict):
+        # Returns ([{'id', 'result'}] in request order, ObjectIds actually changed)
+        collection = cls.get_collection()
+        object_ids = [ObjectId(doc_id) for doc_id in doc_ids if ObjectId.is_valid(doc_id)]
+        found = set()
+        changed = []
+        projection = {field: 1 for field in update_dict}
+        for doc in collection.find({"_id": {"$in": object_ids}}, projection):
+            found.add(doc["_id"])
+            if any(doc.get(field) != value for field, value in update_dict.items()):
+                changed.append(doc["_id"])
+        if changed:
+            collection.update_many(
+                {"_id": {"$in": changed}},
+                {"$set": {**update_dict, "updated_at": datetime.utcnow()}}
+            )
+        changed_set = set(changed)
+        results = []
+        for doc_id in doc_ids:
+            if not ObjectId.is_valid(doc_id):
+                result = 'invalid_id'
+            elif ObjectId(doc_id) in changed_set:
+                result = 'updated'
+            elif ObjectId(doc_id) in found:
+                result = 'unchanged'
+            else:
+                result = 'not_found'
+            results.append({'id': str(doc_id), 'result': result})
+        return results, changed
+
+    @classmethod
+    def increment_and_return(cls, doc_id, inc_dict, touch=True):
+        # touch=False leaves updated_at alone, for counters (e.g. views) that should not
+        # invalidate cached responses or show up in the change export
+        collection = cls.get_collection()
+        if not isinstance(doc_id, ObjectId):
+            if not ObjectId.is_valid(doc_id):
+                return None
+            doc_id = ObjectId(doc_id)
+        update = {"$inc": inc_dict}
+        if touch:
+            update["$set"] = {"updated_at": datetime.utcnow()}
+        return collection.find_one_and_update({"_id": doc_id}, update, return_document=ReturnDocument.AFTER)
+
     @classmethod
     def delete_one(cls, doc_id):
         collection = cls.get_collection()
@@ -66,6 +194,7 @@ class BaseModel:
 
 class Truck(BaseModel):
     collection_name = 'trucks'
+    indexes = [UPDATED_AT_INDEX, version_index('status'), version_index('region')]
 
     @staticmethod
     def to_dict(truck_doc):
@@ -78,6 +207,7 @@ class Truck(BaseModel):
 
 class Employee(BaseModel):
     collection_name = 'employees'
+    indexes = [UPDATED_AT_INDEX, version_index('position'), version_index('status'), version_index('region')]
 
     @staticmethod
     def to_dict(employee_doc):
@@ -90,6 +220,63 @@ class Employee(BaseModel):
 
 class Trip(BaseModel):
     collection_name = 'trips'
+    indexes = [
+        IndexModel([('trip_number', ASCENDING)]),
+        UPDATED_AT_INDEX,
+        version_index('status'),
+        version_index('truck_id'),
+        version_index('driver_id'),
+        # A truck's / driver's trips by end then start, for find_overlap()
+        IndexModel([('truck_id', ASCENDING), ('end_date', ASCENDING), ('start_date', ASCENDING)]),
+        IndexModel([('driver_id', ASCENDING), ('end_date', ASCENDING), ('start_date', ASCENDING)]),
+        # Trips still running after a given time, for busy_resources()
+        IndexModel([('end_date', ASCENDING), ('start_date', ASCENDING)]),
+    ]
+    # A trip without an end_date (e.g. still planned) is taken to occupy this long from its start
+    OPEN_TRIP_DURATION = timedelta(days=1)
+
+    @classmethod
+    def trip_end(cls, trip):
+        return trip.get('end_date') or trip['start_date'] + cls.OPEN_TRIP_DURATION
+
+    @classmethod
+    def find_overlap(cls, field, resource_id, start, end, exclude_id=None):
+        """The earliest non-cancelled trip of a truck/driver (field = 'truck_id'/'driver_id') overlapping [start, end).
+
+        Two range scans on the (field, end_date, start_date) index: trips ending
+        after start, and open trips (no end_date) starting within
+        OPEN_TRIP_DURATION of it.  Only the resource's trips still running at
+        `start` or later are read, however long its history, and the check
+        does not rely on existing trips being disjoint (legacy data, imports).
+        """
+        collection = cls.get_collection()
+        base = {field: resource_id, 'status': {'$ne': 'cancelled'}}
+        if exclude_id is not None:
+            base['_id'] = {'$ne': exclude_id}
+        candidates = [
+            collection.find_one({**base, 'end_date': {'$gt': start}, 'start_date': {'$lt': end}},
+                                sort=[('start_date', ASCENDING)]),
+            collection.find_one({**base, 'end_date': None, 'start_date': {'$gt': start - cls.OPEN_TRIP_DURATION, '$lt': end}},
+                                sort=[('start_date', ASCENDING)]),
+        ]
+        candidates = [trip for trip in candidates if trip]
+        return min(candidates, key=lambda trip: trip['start_date']) if candidates else None
+
+    @classmethod
+    def busy_resources(cls, start, end):
+        """(truck ids, driver ids) with a non-cancelled trip overlapping [start, end)."""
+        overlapping = cls.get_collection().find({
+            'status': {'$ne': 'cancelled'},
+            '$or': [
+                {'end_date': {'$gt': start}, 'start_date': {'$lt': end}},
+                {'end_date': None, 'start_date': {'$gt': start - cls.OPEN_TRIP_DURATION, '$lt': end}},
+            ],
+        }, {'truck_id': 1, 'driver_id': 1})
+        trucks, drivers = set(), set()
+        for trip in overlapping:
+            trucks.add(trip.get('truck_id'))
+            drivers.add(trip.get('driver_id'))
+        return trucks, drivers
 
     @staticmethod
     def to_dict(trip_doc):
@@ -101,7 +288,12 @@ class Trip(BaseModel):
         return bson_to_str(trip_doc)
 
     @staticmethod
-    def to_dict_populated(trip_doc):
+    def to_dict_populated(trip_doc, trucks=None, drivers=None):
+        """Serialize a trip with truck_number and driver_name filled in.
+
+        Pass `trucks`/`drivers` maps from find_by_ids to populate many trips
+        without a lookup per trip.
+        """
         from src.models.mongo_models import Truck, Employee
         trip_dict = Trip.to_dict(trip_doc)
 
@@ -114,12 +306,17 @@ class Trip(BaseModel):
                 trip_dict[field] = 0
 
         # Truck
-        truck = Truck.find_by_id(trip_dict.get('truck_id'))
+        if trucks is not None:
+            truck = trucks.get(str(trip_dict.get('truck_id')))
+        else:
+            truck = Truck.find_by_id(trip_dict.get('truck_id'))
         trip_dict['truck_number'] = truck.get('truck_number') if truck else ''
         # Driver by _id (stored in driver_id as a string)
         driver_id = trip_dict.get('driver_id')
         driver = None
-        if driver_id:
+        if driver_id and drivers is not None:
+            driver = drivers.get(str(driver_id))
+        elif driver_id:
             try:
                 driver = Employee.find_by_id(driver_id)
             except Exception:
@@ -134,6 +331,13 @@ class Trip(BaseModel):
 
 class Expense(BaseModel):
     collection_name = 'expenses'
+    indexes = [
+        IndexModel([('expense_number', ASCENDING)]),
+        UPDATED_AT_INDEX,
+        version_index('truck_id'),
+        version_index('category'),
+        version_index('status'),
+    ]
 
     @staticmethod
     def to_dict(expense_doc):
@@ -145,13 +349,13 @@ class Expense(BaseModel):
         return bson_to_str(expense_doc)
 
     @staticmethod
-    def to_dict_populated(expense_doc):
+    def to_dict_populated(expense_doc, trucks=None):
         from src.models.mongo_models import Truck
         data = Expense.to_dict(expense_doc)
         truck_id = data.get('truck_id')
         truck_number = ''
         if truck_id:
-            truck = Truck.find_by_id(truck_id)
+            truck = trucks.get(str(truck_id)) if trucks is not None else Truck.find_by_id(truck_id)
             if truck:
                 truck_number = truck.get('truck_number', '')
         data['truck_number'] = truck_number
@@ -183,6 +387,62 @@ class User(BaseModel):
 
 class SubTrip(BaseModel):
     collection_name = 'subtrips'
+    indexes = [
+        # Also the (trip_id) lookup index; makes each trip detail's sub-trip version index-only
+        version_index('trip_id'),
+        IndexModel([('client_name', ASCENDING), ('date', ASCENDING)]),
+        IndexModel([('origin', ASCENDING), ('destination', ASCENDING), ('date', ASCENDING)]),
+        UPDATED_AT_INDEX,
+    ]
+
+    @staticmethod
+    def revenue_pipeline(trip_ids):
+        """Aggregation summing sub-trip cost per trip_id for the given trips."""
+        return [
+            {'$match': {'trip_id': {'$in': list(trip_ids)}}},
+            {'$group': {'_id': '$trip_id', 'revenue': {'$sum': '$cost'}}}
+        ]
+
+    @staticmethod
+    def receivables_pipeline(client_name=None, date_from=None, date_to=None, include_archive=False):
+        """Aggregation of billed total, trip count, advance paid and outstanding balance per client.
+
+        Sub-trip dates are stored as ISO strings, so the range compares strings:
+        date_to is an inclusive day ('2024-03-31' also matches '2024-03-31T18:00').
+        include_archive adds the matching archived sub-trips ($unionWith).
+        """
+        match = {}
+        if client_name:
+            match['client_name'] = client_name
+        if date_from or date_to:
+            match['date'] = {}
+            if date_from:
+                match['date']['$gte'] = date_from
+            if date_to:
+                match['date']['$lte'] = date_to + '\uffff'
+        archive = [{'$unionWith': {'coll': SubTripArchive.collection_name, 'pipeline': [{'$match': match}]}}] if include_archive else []
+        return [
+            {'$match': match},
+            *archive,
+            # Per (client, trip) first so trip_count counts trips, not sub-trips
+            {'$group': {'_id': {'client_name': '$client_name', 'trip_id': '$trip_id'},
+                        'billed': {'$sum': '$cost'}, 'subtrips': {'$sum': 1}}},
+            {'$group': {'_id': '$_id.client_name', 'billed_total': {'$sum': '$billed'},
+                        'trip_count': {'$sum': 1}, 'subtrip_count': {'$sum': '$subtrips'}}},
+            {'$lookup': {'from': ClientPayment.collection_name, 'localField': '_id',
+                         'foreignField': 'client_name', 'as': 'payments'}},
+            {'$project': {
+                '_id': 0,
+                'client_name': '$_id',
+                'billed_total': 1,
+                'trip_count': 1,
+                'subtrip_count': 1,
+                'advance_paid': {'$sum': '$payments.advance_payment'},
+                'payment_status': {'$arrayElemAt': ['$payments.status', 0]},
+            }},
+            {'$addFields': {'outstanding': {'$subtract': ['$billed_total', '$advance_paid']}}},
+            {'$sort': {'outstanding': -1, 'client_name': 1}},
+        ]
 
     @staticmethod
     def to_dict(subtrip_doc):
@@ -195,6 +455,7 @@ class SubTrip(BaseModel):
 
 class ClientPayment(BaseModel):
     collection_name = 'clientpayments'
+    indexes = [IndexModel([('client_name', ASCENDING)]), UPDATED_AT_INDEX]
 
     @staticmethod
     def to_dict(clientpayment_doc):
@@ -203,4 +464,158 @@ class ClientPayment(BaseModel):
         clientpayment_doc = clientpayment_doc.copy()
         clientpayment_doc['id'] = str(clientpayment_doc['_id'])
         del clientpayment_doc['_id']
-        return bson_to_str(clientpayment_doc)
\ No newline at end of file
+        return bson_to_str(clientpayment_doc)
+
+class SearchEntry(BaseModel):
+    """One typeahead entry per truck, employee, trip or client (see src/routes/search.py)."""
+    collection_name = 'search_index'
+    # Anchored, case-sensitive regexes on the normalized keys are answered as index range scans
+    indexes = [IndexModel([('keys', ASCENDING), ('type', ASCENDING)])]
+
+class TripArchive(Trip):
+    """Cold tier: closed trips moved out of `trips` by `flask archive run` (see src/routes/archive.py)."""
+    collection_name = 'trips_archive'
+    indexes = [
+        UPDATED_AT_INDEX,
+        IndexModel([('start_date', ASCENDING)]),
+        IndexModel([('truck_id', ASCENDING), ('start_date', ASCENDING)]),
+        IndexModel([('driver_id', ASCENDING), ('start_date', ASCENDING)]),
+    ]
+
+class SubTripArchive(SubTrip):
+    """Sub-trips of archived trips."""
+    collection_name = 'subtrips_archive'
+    indexes = [
+        UPDATED_AT_INDEX,
+        IndexModel([('trip_id', ASCENDING)]),
+        IndexModel([('client_name', ASCENDING), ('date', ASCENDING)]),
+        IndexModel([('origin', ASCENDING), ('destination', ASCENDING), ('date', ASCENDING)]),
+    ]
+
+class TripMonthlyRollup(BaseModel):
+    """Archived trip totals per (month, truck_id, status), rewritten for each month an archive run touches."""
+    collection_name = 'trip_monthly_rollups'
+    indexes = [IndexModel([('month', ASCENDING), ('truck_id', ASCENDING), ('status', ASCENDING)], unique=True)]
+
+class Tombstone(BaseModel):
+    """Record of a hard delete, so the change export can pass deletions on (see src/routes/export.py)."""
+    collection_name = 'tombstones'
+    indexes = [IndexModel([('entity', ASCENDING), ('deleted_at', ASCENDING), ('_id', ASCENDING)])]
+
+    @classmethod
+    def record(cls, entity, doc_id):
+        cls.get_collection().insert_one({'entity': entity, 'ref_id': str(doc_id), 'deleted_at': datetime.utcnow()})
+
+class ArchiveState(BaseModel):
+    """Single document {'_id': 'trips', 'cutoff': datetime}: closed trips that started before cutoff may be archived."""
+    collection_name = 'archive_state'
+
+    @classmethod
+    def cutoff(cls):
+        state = cls.get_collection().find_one({'_id': 'trips'})
+        return state.get('cutoff') if state else None
+
+class LaneRollup(BaseModel):
+    """Sub-trip totals per (origin, destination, client_name, month), kept current by the sub-trip writes.
+
+    See src/routes/lanes.py; `flask lanes rebuild` recomputes it from subtrips.
+    """
+    collection_name = 'lane_rollups'
+    indexes = [IndexModel([('month', ASCENDING), ('origin', ASCENDING), ('destination', ASCENDING), ('client_name', ASCENDING)], unique=True)]
+
+class TruckTelemetry(BaseModel):
+    """GPS/odometer/fuel pings bucketed per truck per hour (see src/routes/telemetry.py).
+
+    Bucket _id is '<truck_id>:<YYYYMMDDHH>', so each flush is one upsert per
+    bucket that $push-es the new points; a truck reporting every 10 seconds
+    fills 360 points an hour into a single document.
+    """
+    collection_name = 'truck_telemetry'
+    indexes = [IndexModel([('truck_id', ASCENDING), ('hour', ASCENDING)])]
+
+    @staticmethod
+    def bucket_hour(timestamp):
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+    @classmethod
+    def bucket_updates(cls, points):
+        """Group points by (truck_id, hour): [(UpdateOne, points), ...] for one bulk_write."""
+        buckets = {}
+        for point in points:
+            hour = cls.bucket_hour(point['t'])
+            buckets.setdefault((point['truck_id'], hour), []).append(point)
+        updates = []
+        for (truck_id, hour), bucket_points in buckets.items():
+            stored = [{k: v for k, v in point.items() if k != 'truck_id'} for point in bucket_points]
+            times = [point['t'] for point in stored]
+            updates.append((UpdateOne(
+                {'_id': f"{truck_id}:{hour.strftime('%Y%m%d%H')}"},
+                {
+                    '$setOnInsert': {'truck_id': truck_id, 'hour': hour},
+                    '$push': {'points': {'$each': stored}},
+                    '$inc': {'count': len(stored)},
+                    '$min': {'first_at': min(times)},
+                    '$max': {'last_at': max(times)},
+                },
+                upsert=True,
+            ), bucket_points))
+        return updates
+
+class TruckFuelStats(BaseModel):
+    """Running fuel efficiency (km/l) per truck: {'_id': truck_id, 'n', 'mean', 'm2'} (see src/routes/fuel.py).
+
+    Welford's method: each completed trip updates the document in place, so
+    the variance (m2 / (n - 1)) never needs the trip history.
+    """
+    collection_name = 'truck_fuel_stats'
+
+    @staticmethod
+    def std_dev(stats):
+        if not stats or stats.get('n', 0) < 2:
+            return None
+        return (max(stats['m2'], 0.0) / (stats['n'] - 1)) ** 0.5
+
+    @classmethod
+    def add_sample(cls, truck_id, kmpl):
+        """Fold one km/l reading into the truck's stats in a single atomic update; returns the stats before it."""
+        return cls.get_collection().find_one_and_update(
+            {'_id': truck_id},
+            [
+                {'$set': {'prev_mean': {'$ifNull': ['$mean', 0.0]}, 'n': {'$add': [{'$ifNull': ['$n', 0]}, 1]}}},
+                {'$set': {'mean': {'$add': ['$prev_mean', {'$divide': [{'$subtract': [kmpl, '$prev_mean']}, '$n']}]}}},
+                {'$set': {
+                    'm2': {'$add': [
+                        {'$ifNull': ['$m2', 0.0]},
+                        {'$multiply': [{'$subtract': [kmpl, '$prev_mean']}, {'$subtract': [kmpl, '$mean']}]},
+                    ]},
+                    'updated_at': datetime.utcnow(),
+                }},
+                {'$project': {'prev_mean': 0}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+class FuelSample(BaseModel):
+    """{'_id': trip ObjectId, 'sampled_at'}: the trip's km/l is already in TruckFuelStats.
+
+    Kept apart from the trip so the marker never shows in trip payloads or
+    the change export, and survives the trip's move to the archive.
+    """
+    collection_name = 'fuel_samples'
+
+    @classmethod
+    def claim(cls, trip_id):
+        """True if this call recorded the trip, False if it had been sampled already."""
+        try:
+            cls.get_collection().insert_one({'_id': trip_id, 'sampled_at': datetime.utcnow()})
+            return True
+        except DuplicateKeyError:
+            return False
+
+def ensure_indexes(db):
+    """Create the indexes declared on each model (no-op when they already exist)."""
+    for model in (Truck, Employee, Trip, Expense, Alert, User, SubTrip, ClientPayment, SearchEntry, TruckTelemetry, LaneRollup,
+                  TripArchive, SubTripArchive, TripMonthlyRollup, Tombstone):
+        if model.indexes:
+            db[model.collection_name].create_indexes(model.indexes)
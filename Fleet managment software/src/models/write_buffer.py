@@ -0,0 +1,192 @@
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+class IncrementBuffer:
+    """Write-behind buffer for counters.
+
+    Increments are summed in memory per (collection, document, field) and a
+    background thread applies them with one unordered bulk_write of $inc updates
+    per collection every flush interval. Counters are not content: the flush
+    leaves updated_at alone, so conditional GETs and the change export do not
+    see a document as modified. State is per process: a forked worker starts
+    with an empty buffer and its own flush thread.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._collections = {}
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def add(self, collection, doc_id, inc_dict, flush_interval):
+        """Buffer an $inc for one document and return its total pending increments."""
+        self._ensure_process()
+        key = (collection.full_name, doc_id)
+        with self._lock:
+            self._collections[collection.full_name] = collection
+            pending = self._pending[key]
+            for field, amount in inc_dict.items():
+                pending[field] += amount
+            snapshot = dict(pending)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(flush_interval,), name='increment-buffer', daemon=True
+                )
+                self._thread.start()
+        return snapshot
+
+    def pending(self, collection, doc_id):
+        self._ensure_process()
+        with self._lock:
+            return dict(self._pending.get((collection.full_name, doc_id), {}))
+
+    def flush(self):
+        """Apply all buffered increments; failed batches are put back for the next flush."""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            collections = dict(self._collections)
+        if not pending:
+            return
+
+        by_collection = defaultdict(list)
+        for key in pending:
+            by_collection[key[0]].append(key)
+        for name, keys in by_collection.items():
+            requests = [
+                UpdateOne({'_id': doc_id}, {'$inc': dict(pending[(name, doc_id)])})
+                for _, doc_id in keys
+            ]
+            try:
+                collections[name].bulk_write(requests, ordered=False)
+            except BulkWriteError as e:
+                failed = [keys[err['index']] for err in e.details.get('writeErrors', [])]
+                logger.warning('Increment flush to %s failed for %d documents, retrying later', name, len(failed))
+                self._restore(pending, failed)
+            except PyMongoError as e:
+                logger.warning('Increment flush to %s failed, retrying later: %s', name, e)
+                self._restore(pending, keys)
+
+    def _restore(self, pending, keys):
+        with self._lock:
+            for key in keys:
+                for field, amount in pending[key].items():
+                    self._pending[key][field] += amount
+
+    def _run(self, flush_interval):
+        while not self._stop.wait(flush_interval):
+            self.flush()
+
+class GroupCommitBuffer:
+    """Write-behind buffer for append-only points (truck telemetry).
+
+    Points are appended to an in-memory list and a background thread writes
+    everything pending with one unordered bulk_write per collection, either
+    every flush interval or as soon as flush_size points are waiting.
+    build_requests(points) returns [(write request, points it carries), ...]
+    so the points of a failed request can be put back for the next flush;
+    delivery is therefore at-least-once, and points still buffered when the
+    process is killed are lost. State is per process, as for IncrementBuffer.
+    """
+
+    def __init__(self, build_requests):
+        self.build_requests = build_requests
+        self._pid = None
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._collections = {}
+        self._pending = defaultdict(list)
+        self._size = 0
+        self._thread = None
+        self._wake = threading.Event()
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def add(self, collection, points, flush_interval, flush_size, max_pending):
+        """Buffer points for collection; returns False (nothing buffered) when max_pending would be exceeded."""
+        self._ensure_process()
+        with self._lock:
+            if self._size + len(points) > max_pending:
+                return False
+            self._collections[collection.full_name] = collection
+            self._pending[collection.full_name].extend(points)
+            self._size += len(points)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, args=(flush_interval,), name='group-commit-buffer', daemon=True
+                )
+                self._thread.start()
+            if self._size >= flush_size:
+                self._wake.set()
+        return True
+
+    def pending_count(self):
+        self._ensure_process()
+        with self._lock:
+            return self._size
+
+    def flush(self):
+        """Write all buffered points; the points of failed requests are put back."""
+        if self._pid != os.getpid():
+            return
+        # One flush at a time, so a size-triggered flush and atexit cannot interleave batches
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, defaultdict(list)
+                self._size = 0
+                collections = dict(self._collections)
+            for name, points in pending.items():
+                if points:
+                    self._write(collections[name], points)
+
+    def _write(self, collection, points):
+        requests = self.build_requests(points)
+        try:
+            collection.bulk_write([request for request, _ in requests], ordered=False)
+            return
+        except BulkWriteError as e:
+            failed = [point for err in e.details.get('writeErrors', []) for point in requests[err['index']][1]]
+            logger.warning('Flush to %s failed for %d points, retrying later', collection.full_name, len(failed))
+        except PyMongoError as e:
+            failed = points
+            logger.warning('Flush to %s failed, retrying later: %s', collection.full_name, e)
+        self._restore(collection, failed)
+
+    def _restore(self, collection, points):
+        self._ensure_process()
+        with self._lock:
+            self._collections[collection.full_name] = collection
+            self._pending[collection.full_name].extend(points)
+            self._size += len(points)
+
+    def _run(self, flush_interval):
+        while True:
+            self._wake.wait(flush_interval)
+            self._wake.clear()
+            self.flush()
@@ -0,0 +1,49 @@
+from bson import ObjectId
+from flask import request
+
+# Helpers for the multi-get variants of the entity endpoints:
+#   GET  /api/<entity>?ids=a,b,c
+#   POST /api/<entity>/lookup  {"ids": ["a", "b", "c"]}   (for lists too long for a URL)
+# The ids are resolved with one $in query (BaseModel.find_by_ids); the
+# response lists the documents in the order requested, each id once, and
+# names the ids that matched nothing under 'missing'.  Valid ObjectIds are
+# canonicalised to lowercase hex first, the form find_by_ids keys its result
+# by, so 'ABC...' and 'abc...' count as one id.
+
+MAX_IDS = 1000
+
+def canonical_id(doc_id):
+    return str(ObjectId(doc_id)) if ObjectId.is_valid(doc_id) else doc_id
+
+def checked_ids(ids):
+    """(canonical ids, error): blanks dropped and first occurrences kept, in order."""
+    ids = list(dict.fromkeys(canonical_id(doc_id) for doc_id in ids if doc_id))
+    if not ids:
+        return None, 'ids must not be empty'
+    if len(ids) > MAX_IDS:
+        return None, f'At most {MAX_IDS} ids per request'
+    return ids, None
+
+def query_ids(value):
+    """(ids, error) from an ?ids=a,b,c value."""
+    return checked_ids(doc_id.strip() for doc_id in value.split(','))
+
+def requested_ids():
+    """(ids, error) for the current multi-get request, from ?ids= or the JSON body."""
+    if request.method != 'POST':
+        return query_ids(request.args.get('ids', ''))
+    ids = (request.get_json(silent=True) or {}).get('ids')
+    if not isinstance(ids, list) or not all(isinstance(doc_id, str) for doc_id in ids):
+        return None, 'ids must be a list of id strings'
+    return checked_ids(ids)
+
+def in_request_order(ids, found):
+    """(documents in the order of ids, ids not in found) for checked_ids and their find_by_ids result."""
+    docs, missing = [], []
+    for doc_id in ids:
+        doc = found.get(doc_id)
+        if doc is None:
+            missing.append(doc_id)
+        else:
+            docs.append(doc)
+    return docs, missing
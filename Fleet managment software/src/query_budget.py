@@ -0,0 +1,167 @@
+# N+1 query detection.
+#
+# Every Mongo command is recorded, with its query shape (the filter with
+# values replaced by '?') and the application call site that issued it, into
+# the query logs active in the current context.  Two things open a log:
+#
+# * the request hooks, when QUERY_BUDGET is set: a request that issues more
+#   commands than its budget logs a warning listing the repeated shapes and
+#   where they came from.  Use @query_budget(n) to give a route its own limit;
+# * assert_max_queries(n), for tests and scripts:
+#
+#       with assert_max_queries(3):
+#           client.get('/api/trips')
+#
+# When no log is open the listener returns straight away, so it is always
+# registered on the client.
+import logging
+import os
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import current_app, g, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CALL_SITE_DEPTH = 3
+MAX_REPORTED_SHAPES = 5
+
+active_logs = ContextVar('active_query_logs', default=())
+
+class QueryLog:
+    def __init__(self):
+        self.queries = []  # (shape, call_site)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self):
+        """[(shape, count, call_sites)] for shapes issued more than once, most frequent first."""
+        counts = Counter(shape for shape, _ in self.queries)
+        result = []
+        for shape, count in counts.most_common():
+            if count < 2:
+                break
+            sites = Counter(site for s, site in self.queries if s == shape)
+            result.append((shape, count, [site for site, _ in sites.most_common()]))
+        return result
+
+    def summary(self):
+        lines = [f'{len(self)} queries']
+        for shape, count, sites in self.repeated()[:MAX_REPORTED_SHAPES]:
+            lines.append(f'  {count}x {shape}')
+            lines.extend(f'      at {site}' for site in sites[:2])
+        return '\n'.join(lines)
+
+def normalize(value):
+    """Replace literal values with '?' so queries differing only in their arguments compare equal."""
+    if isinstance(value, dict):
+        return {key: normalize(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return ['...'] if value else []
+    return '?'
+
+def query_shape(event):
+    command = event.command
+    name = event.command_name
+    collection = command.get(name)
+    if name == 'find':
+        criteria = command.get('filter', {})
+    elif name == 'aggregate':
+        criteria = [
+            {'$match': normalize(stage['$match'])} if '$match' in stage else next(iter(stage), '?')
+            for stage in command.get('pipeline', [])
+        ]
+    elif name in ('update', 'delete'):
+        statements = command.get('updates' if name == 'update' else 'deletes') or [{}]
+        criteria = statements[0].get('q', {})
+    elif name in ('findAndModify', 'count', 'distinct'):
+        criteria = command.get('query', {})
+    else:
+        criteria = None
+    shape = f'{name} {collection}' if isinstance(collection, str) else name
+    if criteria is not None:
+        shape += ' ' + str(criteria if name == 'aggregate' else normalize(criteria))
+    return shape
+
+def call_site():
+    """The innermost application frames that led to the command, e.g. 'models/x.py:10 in f <- ...'."""
+    frames = [
+        frame for frame in reversed(traceback.extract_stack())
+        if frame.filename.startswith(SRC_DIR) and not frame.filename.endswith('query_budget.py')
+    ]
+    return ' <- '.join(
+        f'{os.path.relpath(frame.filename, SRC_DIR)}:{frame.lineno} in {frame.name}'
+        for frame in frames[:CALL_SITE_DEPTH]
+    ) or '<outside src>'
+
+class QueryBudgetListener(monitoring.CommandListener):
+    def started(self, event):
+        logs = active_logs.get()
+        if not logs:
+            return
+        entry = (query_shape(event), call_site())
+        for log in logs:
+            log.queries.append(entry)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+@contextmanager
+def track_queries():
+    """Record the Mongo commands issued inside the block into a QueryLog."""
+    log = QueryLog()
+    token = active_logs.set(active_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        active_logs.reset(token)
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail with the repeated query shapes when the block issues more than `limit` commands."""
+    with track_queries() as log:
+        yield log
+    if len(log) > limit:
+        raise AssertionError(f'Expected at most {limit} queries, got {log.summary()}')
+
+def query_budget(limit):
+    """Override QUERY_BUDGET for one route."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+# ---- Flask integration ----
+
+def start_query_log():
+    g.query_log_cm = track_queries()
+    g.query_log = g.query_log_cm.__enter__()
+
+def check_query_budget(response):
+    log = g.get('query_log')
+    if log is None:
+        return response
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, 'query_budget', current_app.config['QUERY_BUDGET'])
+    response.headers['X-Query-Count'] = str(len(log))
+    if len(log) > budget:
+        logger.warning('%s %s exceeded its query budget of %d: %s',
+                       request.method, request.path, budget, log.summary())
+    return response
+
+def stop_query_log(exc=None):
+    cm = g.pop('query_log_cm', None)
+    if cm is not None:
+        cm.__exit__(None, None, None)
+
+def init_query_budget(app):
+    app.before_request(start_query_log)
+    app.after_request(check_query_budget)
+    app.teardown_request(stop_query_log)
@@ -0,0 +1,173 @@
+import re
+from datetime import datetime, timedelta
+from flask import Blueprint, jsonify, request
+from pymongo import ReplaceOne
+import click
+from src.models.mongo_models import ArchiveState, SubTrip, SubTripArchive, Trip, TripArchive, TripMonthlyRollup, bson_to_str
+
+archive_bp = Blueprint('archive', __name__)
+
+CLOSED_STATUSES = ['completed', 'cancelled']
+DEFAULT_MONTHS = 12
+BATCH_SIZE = 1000
+# A trip's sub-trips can be dated after the trip starts, so sub-trip queries look
+# at the archive for ranges beginning up to this long after the cutoff
+SUBTRIP_SPILLOVER = timedelta(days=31)
+ROLLUP_FIELDS = (
+    'revenue', 'distance_km', 'fuel_consumed', 'fuel_cost', 'toll', 'rto', 'adblue', 'driver_salary',
+    'labour_charges', 'extra_expense', 'other_expenses', 'profit',
+)
+MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+
+# ---- Hot/cold reads ----
+#
+# `trips`/`subtrips` are the hot tier.  `flask archive run` moves closed trips
+# that started before a cutoff, with their sub-trips, to trips_archive /
+# subtrips_archive and records the cutoff in archive_state.  Listings read
+# the hot tier only; reports and analytics add the archive when their
+# start_date range begins before the cutoff.  Archived trips carry
+# `archived_at` and are read-only.
+
+def range_start(filter_dict, field='start_date'):
+    """Lower bound of filter_dict[field] (None when unbounded)."""
+    condition = filter_dict.get(field)
+    if isinstance(condition, dict):
+        return condition.get('$gte', condition.get('$gt'))
+    return condition
+
+def needs_archive(cutoff, start):
+    return cutoff is not None and (start is None or start < cutoff)
+
+def merge_tiers(hot, cold):
+    """Archived (older) documents first, then hot ones; duplicates an interrupted archive run can leave keep the hot copy."""
+    seen = {doc['_id'] for doc in hot}
+    return [doc for doc in cold if doc['_id'] not in seen] + hot
+
+def find_trips(filter_dict):
+    """Trips matching filter_dict, from the archive too when the start_date range reaches back before the cutoff."""
+    trips = Trip.find_all(filter_dict)
+    if needs_archive(ArchiveState.cutoff(), range_start(filter_dict)):
+        trips = merge_tiers(trips, TripArchive.find_all(filter_dict))
+    return trips
+
+def subtrips_need_archive(date_from=None):
+    """Whether a sub-trip query from date_from (ISO string, None = unbounded) must include the archive."""
+    cutoff = ArchiveState.cutoff()
+    if cutoff is None:
+        return False
+    return not date_from or date_from < (cutoff + SUBTRIP_SPILLOVER).isoformat()
+
+# ---- Archive job ----
+
+def archive_cutoff(months, now=None):
+    """First day of the month `months` months before now."""
+    now = now or datetime.utcnow()
+    index = now.year * 12 + now.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def archive_closed_trips(months=DEFAULT_MONTHS, batch_size=BATCH_SIZE, dry_run=False):
+    """Move completed/cancelled trips that started before the cutoff, with their sub-trips, to the archive.
+
+    Each batch is copied with idempotent upserts before it is deleted from the
+    hot tier, so an interrupted run leaves at worst duplicates (which readers
+    skip) and the next run finishes the move. Returns the counts moved.
+    """
+    cutoff = archive_cutoff(months)
+    query = {'status': {'$in': CLOSED_STATUSES}, 'start_date': {'$lt': cutoff}}
+    trip_collection = Trip.get_collection()
+    subtrip_collection = SubTrip.get_collection()
+    if dry_run:
+        return {'cutoff': cutoff, 'trips': trip_collection.count_documents(query), 'subtrips': None, 'months': 0}
+
+    # Readers start including the archive before the first trip leaves the hot tier
+    ArchiveState.get_collection().update_one({'_id': 'trips'}, {'$max': {'cutoff': cutoff}}, upsert=True)
+    counts = {'cutoff': cutoff, 'trips': 0, 'subtrips': 0, 'months': 0}
+    months_touched = set()
+    while True:
+        trips = list(trip_collection.find(query).sort('_id', 1).limit(batch_size))
+        if not trips:
+            break
+        now = datetime.utcnow()
+        trip_ids = [trip['_id'] for trip in trips]
+        subtrips = list(subtrip_collection.find({'trip_id': {'$in': [str(trip_id) for trip_id in trip_ids]}}))
+        if subtrips:
+            SubTripArchive.get_collection().bulk_write(
+                [ReplaceOne({'_id': sub['_id']}, sub, upsert=True) for sub in subtrips], ordered=False
+            )
+        TripArchive.get_collection().bulk_write(
+            [ReplaceOne({'_id': trip['_id']}, {**trip, 'archived_at': now}, upsert=True) for trip in trips], ordered=False
+        )
+        if subtrips:
+            subtrip_collection.delete_many({'_id': {'$in': [sub['_id'] for sub in subtrips]}})
+        trip_collection.delete_many({'_id': {'$in': trip_ids}})
+        counts['trips'] += len(trips)
+        counts['subtrips'] += len(subtrips)
+        months_touched.update(trip['start_date'].strftime('%Y-%m') for trip in trips)
+
+    rewrite_monthly_rollups(months_touched)
+    counts['months'] = len(months_touched)
+    return counts
+
+def rewrite_monthly_rollups(months):
+    """Recompute the archived totals per (month, truck_id, status) for the given 'YYYY-MM' months."""
+    collection = TripMonthlyRollup.get_collection()
+    now = datetime.utcnow()
+    for month in sorted(months):
+        start = datetime.strptime(month, '%Y-%m')
+        end = archive_cutoff(-1, start)  # first day of the next month
+        rows = TripArchive.get_collection().aggregate([
+            {'$match': {'start_date': {'$gte': start, '$lt': end}}},
+            {'$group': {
+                '_id': {'truck_id': '$truck_id', 'status': '$status'},
+                'trips': {'$sum': 1},
+                **{field: {'$sum': f'${field}'} for field in ROLLUP_FIELDS},
+            }},
+        ])
+        requests = []
+        for row in rows:
+            key = {'month': month, 'truck_id': row['_id']['truck_id'], 'status': row['_id']['status']}
+            totals = {field: row[field] for field in ('trips',) + ROLLUP_FIELDS}
+            requests.append(ReplaceOne(key, {**key, **totals, 'updated_at': now}, upsert=True))
+        if requests:
+            collection.bulk_write(requests, ordered=False)
+
+@archive_bp.cli.command('run')
+@click.option('--months', default=DEFAULT_MONTHS, show_default=True, help='Archive closed trips that started more than this many months ago.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Only count the trips that would be archived.')
+def archive_command(months, batch_size, dry_run):
+    """Move old completed/cancelled trips and their sub-trips to the archive tier."""
+    counts = archive_closed_trips(months, batch_size, dry_run)
+    cutoff = counts['cutoff'].strftime('%Y-%m-%d')
+    if dry_run:
+        click.echo(f"{counts['trips']} trips started before {cutoff} would be archived.")
+    else:
+        click.echo(f"Archived {counts['trips']} trips and {counts['subtrips']} sub-trips started before {cutoff}; "
+                   f"rolled up {counts['months']} months.")
+
+# ---- Rollups ----
+
+@archive_bp.route('/archive/rollups', methods=['GET'])
+def get_monthly_rollups():
+    """Archived trip totals per month, truck and status: ?start_month=YYYY-MM&end_month=YYYY-MM&truck_id="""
+    try:
+        filter_dict = {}
+        month_filter = {}
+        for arg, operator in (('start_month', '$gte'), ('end_month', '$lte')):
+            value = request.args.get(arg)
+            if value:
+                if not MONTH_PATTERN.match(value):
+                    return jsonify({'error': f'Invalid month: {value}; expected YYYY-MM'}), 400
+                month_filter[operator] = value
+        if month_filter:
+            filter_dict['month'] = month_filter
+        if request.args.get('truck_id'):
+            filter_dict['truck_id'] = request.args['truck_id']
+        rows = TripMonthlyRollup.get_collection().find(filter_dict, {'_id': 0}).sort([('month', 1), ('truck_id', 1)])
+        cutoff = ArchiveState.cutoff()
+        return jsonify({
+            'cutoff': cutoff.isoformat() if cutoff else None,
+            'rollups': [bson_to_str(row) for row in rows],
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
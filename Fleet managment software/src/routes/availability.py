@@ -0,0 +1,50 @@
+from datetime import datetime
+from bson import ObjectId
+from flask import Blueprint, jsonify, request
+from src.models.mongo_models import Trip, Truck, Employee
+
+availability_bp = Blueprint('availability', __name__)
+
+# Soft-deleted trucks and employees are set to 'Inactive'
+RETIRED_STATUSES = ['inactive', 'Inactive']
+
+def excluded_ids(ids):
+    return [ObjectId(doc_id) for doc_id in ids if doc_id and ObjectId.is_valid(doc_id)]
+
+@availability_bp.route('/availability', methods=['GET'])
+def get_availability():
+    """Trucks and drivers free for the whole of [from, to), with insurance, FC and licence valid until `to`."""
+    try:
+        try:
+            start = datetime.fromisoformat(request.args['from'])
+            end = datetime.fromisoformat(request.args['to'])
+        except KeyError:
+            return jsonify({'error': 'from and to are required'}), 400
+        except ValueError:
+            return jsonify({'error': 'from and to must be ISO dates'}), 400
+        if end <= start:
+            return jsonify({'error': 'to must be after from'}), 400
+
+        busy_trucks, busy_drivers = Trip.busy_resources(start, end)
+        # Truck expiry dates are stored as 'YYYY-MM-DD' strings, licence expiry as a datetime
+        valid_until = end.strftime('%Y-%m-%d')
+        trucks = Truck.get_collection().find({
+            '_id': {'$nin': excluded_ids(busy_trucks)},
+            'status': {'$nin': RETIRED_STATUSES},
+            'insurance_expiry': {'$gte': valid_until},
+            'fc_expiry': {'$gte': valid_until},
+        }, {'truck_number': 1, 'license_plate': 1, 'make': 1, 'model': 1, 'insurance_expiry': 1, 'fc_expiry': 1})
+        drivers = Employee.get_collection().find({
+            '_id': {'$nin': excluded_ids(busy_drivers)},
+            'position': 'driver',
+            'status': {'$nin': RETIRED_STATUSES},
+            'license_expiry': {'$gte': end},
+        }, {'first_name': 1, 'last_name': 1, 'employee_number': 1, 'license_expiry': 1})
+        return jsonify({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'trucks': [Truck.to_dict(truck) for truck in trucks],
+            'drivers': [Employee.to_dict(driver) for driver in drivers],
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
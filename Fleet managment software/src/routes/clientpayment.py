@@ -1,6 +1,8 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime
-from src.models.mongo_models import ClientPayment, SubTrip
+from src.models.mongo_models import ClientPayment, SubTrip, Tombstone
+from src.routes.search import index_clients, unindex_client_if_unused
+from src.routes.archive import subtrips_need_archive
 from bson import ObjectId
 
 clientpayment_bp = Blueprint('clientpayment', __name__)
@@ -47,8 +49,8 @@ def create_client_payment():
             'status': data['status'],
             'created_at': datetime.utcnow()
         }
-        payment_id = ClientPayment.insert_one(payment_doc)
-        payment = ClientPayment.find_by_id(payment_id)
+        payment = ClientPayment.insert_and_return(payment_doc)
+        index_clients([payment_doc['client_name']])
         doc = dict(payment)
         doc['id'] = str(doc.get('_id'))
         doc.pop('_id', None)
@@ -85,6 +87,29 @@ def get_all_subtrips():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@clientpayment_bp.route('/clients/receivables', methods=['GET'])
+def get_client_receivables():
+    """Billed total, trips, advance paid and outstanding per client: ?client_name=&start_date=&end_date="""
+    try:
+        client_name = request.args.get('client_name', '')
+        start_date = request.args.get('start_date', '')
+        end_date = request.args.get('end_date', '')
+        for value in (start_date, end_date):
+            if value:
+                try:
+                    datetime.fromisoformat(value)
+                except ValueError:
+                    return jsonify({'error': f'Invalid date: {value}; expected YYYY-MM-DD'}), 400
+        pipeline = SubTrip.receivables_pipeline(client_name, start_date, end_date, subtrips_need_archive(start_date))
+        receivables = list(SubTrip.get_collection().aggregate(pipeline))
+        totals = {
+            field: sum(row[field] for row in receivables)
+            for field in ('billed_total', 'trip_count', 'subtrip_count', 'advance_paid', 'outstanding')
+        }
+        return jsonify({'receivables': receivables, 'totals': totals})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Get, update, delete endpoints: update to use client_name as needed, or keep as payment_id
 
 @clientpayment_bp.route('/client-payments/<payment_id>', methods=['GET'])
@@ -103,9 +128,6 @@ def get_client_payment(payment_id):
 @clientpayment_bp.route('/client-payments/<payment_id>', methods=['PUT'])
 def update_client_payment(payment_id):
     try:
-        payment = ClientPayment.find_by_id(payment_id)
-        if not payment:
-            return jsonify({'error': 'Client payment not found'}), 404
         data = request.get_json()
         update_doc = {}
         for field in ['advance_payment', 'balance', 'status']:
@@ -114,8 +136,9 @@ def update_client_payment(payment_id):
                     update_doc[field] = parse_float(data[field])
                 else:
                     update_doc[field] = data[field]
-        ClientPayment.update_one(payment_id, update_doc)
-        updated = ClientPayment.find_by_id(payment_id)
+        updated = ClientPayment.update_and_return(payment_id, update_doc)
+        if not updated:
+            return jsonify({'error': 'Client payment not found'}), 404
         doc = dict(updated)
         doc['id'] = str(doc.get('_id'))
         doc.pop('_id', None)
@@ -130,6 +153,8 @@ def delete_client_payment(payment_id):
         if not payment:
             return jsonify({'error': 'Client payment not found'}), 404
         ClientPayment.delete_one(payment_id)
+        Tombstone.record('client_payments', payment['_id'])
+        unindex_client_if_unused(payment.get('client_name'))
         return jsonify({'message': 'Client payment deleted'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime, timedelta
-from src.models.mongo_models import Truck, Employee, Trip, Expense, Alert
+from src.models.mongo_models import Truck, Employee, Expense, Alert
+from src.admission import heavy_route
+from src.routes.archive import find_trips
+from src.deadline import DeadlineExceeded, check_deadline, deadline_response, is_deadline_error
 from dateutil.parser import parse as dateparse
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -148,26 +151,29 @@ def check_and_create_fc_expiry_alerts():
                     {'$set': {'status': 'inactive'}}
                 )
 
+def build_filters(trucks, drivers, regions):
+    truck_filters = [{'id': str(truck['_id']), 'label': truck['truck_number']} for truck in trucks]
+    driver_filters = []
+    for driver in drivers:
+        full_name = f"{driver.get('first_name', '')} {driver.get('last_name', '')}".strip()
+        driver_filters.append({'id': str(driver['_id']), 'label': full_name})
+    region_filters = [{'id': region, 'label': region} for region in regions if region]
+    return {
+        'filters': {
+            'trucks': truck_filters,
+            'drivers': driver_filters,
+            'regions': region_filters
+        }
+    }
+
 @dashboard_bp.route('/dashboard/filters', methods=['GET'])
 def get_filters():
     try:
         trucks = Truck.find_all({'status': 'active'})
-        truck_filters = [{'id': str(truck['_id']), 'label': truck['truck_number']} for truck in trucks]
         drivers = Employee.find_all({'position': 'driver', 'status': 'active'})
-        driver_filters = []
-        for driver in drivers:
-            full_name = f"{driver.get('first_name', '')} {driver.get('last_name', '')}".strip()
-            driver_filters.append({'id': str(driver['_id']), 'label': full_name})
         truck_collection = Truck.get_collection()
         regions = truck_collection.distinct('region', {'region': {'$ne': None, '$exists': True}})
-        region_filters = [{'id': region, 'label': region} for region in regions if region]
-        return jsonify({
-            'filters': {
-                'trucks': truck_filters,
-                'drivers': driver_filters,
-                'regions': region_filters
-            }
-        })
+        return jsonify(build_filters(trucks, drivers, regions))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -189,46 +195,52 @@ def get_alerts():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@dashboard_bp.route('/dashboard/analytics', methods=['GET'])
-def get_analytics():
-    try:
-        days = int(request.args.get('days', 30))
-        truck_id = request.args.get('truck_id', '')
-        driver_id = request.args.get('driver_id', '')
-        region = request.args.get('region', '')
+def analytics_query(args):
+    """Return (trip_filter, days, start_date) for the analytics window and filters."""
+    days = int(args.get('days', 30))
+    truck_id = args.get('truck_id', '')
+    driver_id = args.get('driver_id', '')
+    region = args.get('region', '')
 
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        trip_filter = { 'start_date': {'$gte': start_date, '$lte': end_date} }
-        if truck_id:
-            trip_filter['truck_id'] = truck_id
-        if driver_id:
-            trip_filter['driver_id'] = driver_id
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+    trip_filter = { 'start_date': {'$gte': start_date, '$lte': end_date} }
+    if truck_id:
+        trip_filter['truck_id'] = truck_id
+    if driver_id:
+        trip_filter['driver_id'] = driver_id
 
-        trips = Trip.find_all(trip_filter)
+    return trip_filter, days, start_date
 
-        # Parse start_date to datetime if needed
-        for trip in trips:
-            if 'start_date' in trip and not isinstance(trip['start_date'], datetime):
-                try:
-                    trip['start_date'] = dateparse(trip['start_date'])
-                except Exception:
-                    trip['start_date'] = None
+def build_analytics(trips, trucks, days, start_date):
+    # Parse start_date to datetime if needed
+    for trip in trips:
+        if 'start_date' in trip and not isinstance(trip['start_date'], datetime):
+            try:
+                trip['start_date'] = dateparse(trip['start_date'])
+            except Exception:
+                trip['start_date'] = None
 
-        # Only consider completed trips for analytics!
-        completed_trips = [trip for trip in trips if trip.get('status') == "completed"]
+    # Only consider completed trips for analytics!
+    completed_trips = [trip for trip in trips if trip.get('status') == "completed"]
 
-        total_trips = len(completed_trips)
-        total_distance = sum(safe_float(trip.get('distance_km')) for trip in completed_trips)
-        total_revenue = sum(safe_float(trip.get('revenue')) for trip in completed_trips)
-        total_fuel_cost = sum(safe_float(trip.get('fuel_cost')) for trip in completed_trips)
-        total_fuel_consumed = sum(safe_float(trip.get('fuel_consumed')) for trip in completed_trips)
-        total_other_expenses = sum(safe_float(trip.get('other_expenses')) for trip in completed_trips)
-        total_profit = total_revenue - total_fuel_cost - total_other_expenses
-        avg_fuel_efficiency = total_distance / total_fuel_consumed if total_fuel_consumed > 0 else 0
+    total_trips = len(completed_trips)
+    total_distance = sum(safe_float(trip.get('distance_km')) for trip in completed_trips)
+    total_revenue = sum(safe_float(trip.get('revenue')) for trip in completed_trips)
+    total_fuel_cost = sum(safe_float(trip.get('fuel_cost')) for trip in completed_trips)
+    total_fuel_consumed = sum(safe_float(trip.get('fuel_consumed')) for trip in completed_trips)
+    total_other_expenses = sum(safe_float(trip.get('other_expenses')) for trip in completed_trips)
+    total_profit = total_revenue - total_fuel_cost - total_other_expenses
+    avg_fuel_efficiency = total_distance / total_fuel_consumed if total_fuel_consumed > 0 else 0
 
-        profit_trends = []
+    # The chart series are built one at a time; if the deadline passes part-way the totals above
+    # and every finished series are still returned, and the unfinished ones are left empty
+    profit_trends, fuel_usage, fuel_efficiency, truck_stats = [], [], [], []
+    partial = False
+    try:
+        rows = []
         for i in reversed(range(days)):
+            check_deadline()
             day = start_date + timedelta(days=i)
             next_day = day + timedelta(days=1)
             day_trips = [trip for trip in completed_trips if trip.get('start_date') and day <= trip['start_date'] < next_day]
@@ -237,39 +249,43 @@ def get_analytics():
             day_other_expenses = sum(safe_float(trip.get('other_expenses')) for trip in day_trips)
             day_profit = day_revenue - day_fuel_cost - day_other_expenses
             day_expenses = day_fuel_cost + day_other_expenses
-            profit_trends.append({
+            rows.append({
                 'date': day.strftime('%Y-%m-%d'),
                 'profit': day_profit,
                 'revenue': day_revenue,
                 'expenses': day_expenses
             })
+        profit_trends = rows
 
-        truck_collection = Truck.get_collection()
-        trucks = list(truck_collection.find({'status': 'active'}))
-        fuel_usage = []
+        rows = []
         for truck in trucks:
+            check_deadline()
             truck_trips = [trip for trip in completed_trips if trip.get('truck_id') == str(truck['_id'])]
             truck_fuel = sum(safe_float(trip.get('fuel_consumed')) for trip in truck_trips)
-            fuel_usage.append({
+            rows.append({
                 'truck_number': truck.get('truck_number', 'Unknown'),
                 'fuel_consumed': truck_fuel
             })
+        fuel_usage = rows
 
-        fuel_efficiency = []
+        rows = []
         for i in reversed(range(days)):
+            check_deadline()
             day = start_date + timedelta(days=i)
             next_day = day + timedelta(days=1)
             day_trips = [trip for trip in completed_trips if trip.get('start_date') and day <= trip['start_date'] < next_day]
             day_distance = sum(safe_float(trip.get('distance_km')) for trip in day_trips)
             day_fuel = sum(safe_float(trip.get('fuel_consumed')) for trip in day_trips)
             efficiency = day_distance / day_fuel if day_fuel > 0 else 0
-            fuel_efficiency.append({
+            rows.append({
                 'date': day.strftime('%Y-%m-%d'),
                 'efficiency': efficiency
             })
+        fuel_efficiency = rows
 
-        truck_stats = []
+        rows = []
         for truck in trucks:
+            check_deadline()
             truck_trips = [trip for trip in completed_trips if trip.get('truck_id') == str(truck['_id'])]
             truck_revenue = sum(safe_float(trip.get('revenue')) for trip in truck_trips)
             truck_fuel_cost = sum(safe_float(trip.get('fuel_cost')) for trip in truck_trips)
@@ -278,7 +294,7 @@ def get_analytics():
             truck_distance = sum(safe_float(trip.get('distance_km')) for trip in truck_trips)
             trips_count = len(truck_trips)
             avg_profit_per_trip = truck_profit / trips_count if trips_count > 0 else 0
-            truck_stats.append({
+            rows.append({
                 'truck_number': truck.get('truck_number', 'Unknown'),
                 'trips': trips_count,
                 'revenue': truck_revenue,
@@ -286,21 +302,37 @@ def get_analytics():
                 'distance': truck_distance,
                 'avg_profit_per_trip': avg_profit_per_trip
             })
-        truck_stats = sorted(truck_stats, key=lambda x: x['profit'], reverse=True)[:5]
+        truck_stats = sorted(rows, key=lambda x: x['profit'], reverse=True)[:5]
+    except DeadlineExceeded:
+        partial = True
 
-        return jsonify({
-            "analytics": {
-                "summary": {
-                    "total_trips": total_trips,
-                    "total_revenue": total_revenue,
-                    "total_distance": total_distance,
-                    "avg_fuel_efficiency": round(avg_fuel_efficiency, 2)
-                },
-                "profit_trends": profit_trends,
-                "fuel_usage": fuel_usage,
-                "fuel_efficiency": fuel_efficiency,
-                "high_performing_trucks": truck_stats
-            }
-        })
+    return {
+        "analytics": {
+            "summary": {
+                "total_trips": total_trips,
+                "total_revenue": total_revenue,
+                "total_distance": total_distance,
+                "avg_fuel_efficiency": round(avg_fuel_efficiency, 2)
+            },
+            "profit_trends": profit_trends,
+            "fuel_usage": fuel_usage,
+            "fuel_efficiency": fuel_efficiency,
+            "high_performing_trucks": truck_stats,
+            "partial": partial
+        }
+    }
+
+@dashboard_bp.route('/dashboard/analytics', methods=['GET'])
+@heavy_route
+def get_analytics():
+    try:
+        trip_filter, days, start_date = analytics_query(request.args)
+        trips = find_trips(trip_filter)
+        truck_collection = Truck.get_collection()
+        trucks = list(truck_collection.find({'status': 'active'}))
+        check_deadline()
+        return jsonify(build_analytics(trips, trucks, days, start_date))
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        if is_deadline_error(e):
+            return deadline_response()
+        return jsonify({'error': str(e)}), 500
@@ -1,12 +1,10 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime
 from bson import ObjectId
-from pymongo import MongoClient
-
-# --- MongoDB Connection ---
-client = MongoClient("mongodb://localhost:27017/")
-db = client['fleet_management']
-employee_collection = db['employees']
+from src.models.mongo_models import Employee
+from src.routes.search import index_employee
+from src.conditional import document_version, documents_version, is_conditional, is_fresh, not_modified, with_validators
+from src.multiget import in_request_order, requested_ids
 
 employees_bp = Blueprint('employees', __name__)
 
@@ -34,8 +32,10 @@ def employee_to_dict(emp):
 
 @employees_bp.route('/employees', methods=['GET'])
 def get_employees():
-    """Get all employees with optional filtering"""
+    """Get all employees with optional filtering, or specific ones with ?ids=a,b,c"""
     try:
+        if 'ids' in request.args:
+            return get_employees_by_ids()
         position = request.args.get('position', '')
         region = request.args.get('region', '')
         status = request.args.get('status', '')
@@ -48,18 +48,44 @@ def get_employees():
         if status:
             filter_dict['status'] = status
 
-        employees = employee_collection.find(filter_dict)
+        if is_conditional():
+            version = Employee.collection_version(filter_dict)
+            if is_fresh(version):
+                return not_modified(version)
+        employees = Employee.find_all(filter_dict)
         employee_list = [employee_to_dict(emp) for emp in employees]
-        return jsonify({'employees': employee_list})
+        return with_validators(jsonify({'employees': employee_list}), documents_version(employees))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@employees_bp.route('/employees/lookup', methods=['POST'])
+def get_employees_by_ids():
+    """Get many employees by id in one query; body {"ids": [...]}"""
+    try:
+        ids, error = requested_ids()
+        if error:
+            return jsonify({'error': error}), 400
+        employees, missing = in_request_order(ids, Employee.find_by_ids(ids))
+        version = documents_version(employees)
+        if is_fresh(version):
+            return not_modified(version)
+        return with_validators(jsonify({
+            'employees': [employee_to_dict(emp) for emp in employees],
+            'missing': missing
+        }), version)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @employees_bp.route('/employees/<employee_id>', methods=['GET'])
 def get_employee(employee_id):
     try:
-        emp = employee_collection.find_one({'_id': ObjectId(employee_id)})
+        if is_conditional():
+            version = Employee.find_version(employee_id)
+            if version and is_fresh(version):
+                return not_modified(version)
+        emp = Employee.find_by_id(employee_id)
         if emp:
-            return jsonify({'employee': employee_to_dict(emp)})
+            return with_validators(jsonify({'employee': employee_to_dict(emp)}), document_version(emp))
         return jsonify({'error': 'Employee not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -75,9 +101,10 @@ def create_employee():
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
         # Unique constraints
-        if employee_collection.find_one({'employee_number': data['employee_number']}):
+        collection = Employee.get_collection()
+        if collection.find_one({'employee_number': data['employee_number']}):
             return jsonify({'error': 'Employee number already exists'}), 400
-        if employee_collection.find_one({'email': data['email']}):
+        if collection.find_one({'email': data['email']}):
             return jsonify({'error': 'Email already exists'}), 400
 
         # Parse dates
@@ -116,8 +143,8 @@ def create_employee():
             'created_at': now,
             'updated_at': now,
         }
-        result = employee_collection.insert_one(employee_doc)
-        new_emp = employee_collection.find_one({'_id': result.inserted_id})
+        new_emp = Employee.insert_and_return(employee_doc)
+        index_employee(new_emp)
         return jsonify({'message': 'Employee created successfully', 'employee': employee_to_dict(new_emp)}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -126,17 +153,17 @@ def create_employee():
 def update_employee(employee_id):
     """Update an existing employee (by MongoDB ObjectId)"""
     try:
-        emp = employee_collection.find_one({'_id': ObjectId(employee_id)})
-        if not emp:
+        if not ObjectId.is_valid(employee_id):
             return jsonify({'error': 'Employee not found'}), 404
 
         data = request.get_json()
-        # Unique constraints, skip if not changing
-        if 'employee_number' in data and data['employee_number'] != emp.get('employee_number'):
-            if employee_collection.find_one({'employee_number': data['employee_number'], '_id': {'$ne': ObjectId(employee_id)}}):
+        collection = Employee.get_collection()
+        # Unique constraints, excluding this employee
+        if 'employee_number' in data:
+            if collection.find_one({'employee_number': data['employee_number'], '_id': {'$ne': ObjectId(employee_id)}}):
                 return jsonify({'error': 'Employee number already exists'}), 400
-        if 'email' in data and data['email'] != emp.get('email'):
-            if employee_collection.find_one({'email': data['email'], '_id': {'$ne': ObjectId(employee_id)}}):
+        if 'email' in data:
+            if collection.find_one({'email': data['email'], '_id': {'$ne': ObjectId(employee_id)}}):
                 return jsonify({'error': 'Email already exists'}), 400
 
         # Parse dates
@@ -151,9 +178,10 @@ def update_employee(employee_id):
             else:
                 update_doc[key] = value
 
-        update_doc['updated_at'] = datetime.utcnow()
-        employee_collection.update_one({'_id': ObjectId(employee_id)}, {'$set': update_doc})
-        updated_emp = employee_collection.find_one({'_id': ObjectId(employee_id)})
+        updated_emp = Employee.update_and_return(employee_id, update_doc)
+        if not updated_emp:
+            return jsonify({'error': 'Employee not found'}), 404
+        index_employee(updated_emp)
         return jsonify({'message': 'Employee updated successfully', 'employee': employee_to_dict(updated_emp)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -162,10 +190,10 @@ def update_employee(employee_id):
 def delete_employee(employee_id):
     """Soft delete by setting status to 'inactive'"""
     try:
-        emp = employee_collection.find_one({'_id': ObjectId(employee_id)})
+        emp = Employee.find_by_id(employee_id)
         if not emp:
             return jsonify({'error': 'Employee not found'}), 404
-        employee_collection.update_one({'_id': ObjectId(employee_id)}, {'$set': {'status': 'inactive', 'updated_at': datetime.utcnow()}})
+        Employee.update_one(employee_id, {'status': 'inactive'})
         return jsonify({'message': 'Employee deactivated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
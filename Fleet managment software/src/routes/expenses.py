@@ -1,46 +1,105 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime
-from src.models.mongo_models import Expense
+from src.models.mongo_models import Expense, Truck
+from src.deadline import deadline_response, is_deadline_error
+from src.conditional import document_version, documents_version, is_conditional, is_fresh, not_modified, with_validators
+from src.multiget import in_request_order, requested_ids
 from bson import ObjectId
 
 expenses_bp = Blueprint('expenses', __name__)
 
+MAX_BULK_IDS = 1000
+
+def build_expense_doc(data):
+    """Validate an expense payload and return (expense_doc, error)."""
+    required_fields = ['expense_number', 'category', 'amount', 'expense_date']
+    for field in required_fields:
+        if field not in data:
+            return None, f'Missing required field: {field}'
+
+    expense_doc = {
+        'expense_number': data['expense_number'],
+        'truck_id': data.get('truck_id'),
+        'trip_id': data.get('trip_id'),
+        'category': data['category'],
+        'amount': data['amount'],
+        'expense_date': datetime.fromisoformat(data['expense_date']),
+        'vendor_name': data.get('vendor_name'),
+        'receipt_number': data.get('receipt_number'),
+        'payment_method': data.get('payment_method'),
+        'location': data.get('location'),
+        'description': data.get('description'),
+        'status': data.get('status', 'pending')
+    }
+    return expense_doc, None
+
+def expense_list_filter(args):
+    """Build the expenses query from list filters (truck, category, status, expense_date range)."""
+    truck_id = args.get('truck_id', '')
+    category = args.get('category', '')
+    status = args.get('status', '')
+    start_date = args.get('start_date', '')
+    end_date = args.get('end_date', '')
+    
+    filter_dict = {}
+    if truck_id:
+        filter_dict['truck_id'] = truck_id
+    if category:
+        filter_dict['category'] = category
+    if status:
+        filter_dict['status'] = status
+    
+    # Date range filtering
+    if start_date or end_date:
+        date_filter = {}
+        if start_date:
+            date_filter['$gte'] = datetime.fromisoformat(start_date)
+        if end_date:
+            date_filter['$lte'] = datetime.fromisoformat(end_date)
+        filter_dict['expense_date'] = date_filter
+    return filter_dict
+
 @expenses_bp.route('/expenses', methods=['GET'])
 def get_expenses():
-    """Get all expenses with optional filtering"""
+    """Get all expenses with optional filtering, or specific ones with ?ids=a,b,c"""
     try:
-        truck_id = request.args.get('truck_id', '')
-        category = request.args.get('category', '')
-        status = request.args.get('status', '')
-        start_date = request.args.get('start_date', '')
-        end_date = request.args.get('end_date', '')
-        
-        filter_dict = {}
-        if truck_id:
-            filter_dict['truck_id'] = truck_id
-        if category:
-            filter_dict['category'] = category
-        if status:
-            filter_dict['status'] = status
-        
-        # Date range filtering
-        if start_date or end_date:
-            date_filter = {}
-            if start_date:
-                date_filter['$gte'] = datetime.fromisoformat(start_date)
-            if end_date:
-                date_filter['$lte'] = datetime.fromisoformat(end_date)
-            filter_dict['expense_date'] = date_filter
-        
+        if 'ids' in request.args:
+            return get_expenses_by_ids()
+        filter_dict = expense_list_filter(request.args)
+        # Expense payloads embed truck numbers
+        truck_version = Truck.collection_version()
+        if is_conditional():
+            version = Expense.collection_version(filter_dict)
+            if is_fresh(version, truck_version):
+                return not_modified(version, truck_version)
         expenses = Expense.find_all(filter_dict)
-        expense_list = []
-        for expense in expenses:
-            expense_dict = Expense.to_dict_populated(expense)
-            expense_list.append(expense_dict)
+        trucks = Truck.find_by_ids({expense.get('truck_id') for expense in expenses})
+        expense_list = [Expense.to_dict_populated(expense, trucks) for expense in expenses]
         
-        return jsonify({
+        return with_validators(jsonify({
             'expenses': expense_list
-        })
+        }), documents_version(expenses), truck_version)
+    except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
+        return jsonify({'error': str(e)}), 500
+
+@expenses_bp.route('/expenses/lookup', methods=['POST'])
+def get_expenses_by_ids():
+    """Get many expenses by id in one query; body {"ids": [...]}"""
+    try:
+        ids, error = requested_ids()
+        if error:
+            return jsonify({'error': error}), 400
+        expenses, missing = in_request_order(ids, Expense.find_by_ids(ids))
+        versions = (documents_version(expenses), Truck.collection_version())
+        if is_fresh(*versions):
+            return not_modified(*versions)
+        trucks = Truck.find_by_ids({expense.get('truck_id') for expense in expenses})
+        return with_validators(jsonify({
+            'expenses': [Expense.to_dict_populated(expense, trucks) for expense in expenses],
+            'missing': missing
+        }), *versions)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -48,11 +107,16 @@ def get_expenses():
 def get_expense(expense_id):
     """Get a specific expense by ID"""
     try:
+        truck_version = Truck.collection_version()
+        if is_conditional():
+            version = Expense.find_version(expense_id)
+            if version and is_fresh(version, truck_version):
+                return not_modified(version, truck_version)
         expense = Expense.find_by_id(expense_id)
         if expense:
-            return jsonify({
+            return with_validators(jsonify({
                 'expense': Expense.to_dict_populated(expense)
-            })
+            }), document_version(expense), truck_version)
         return jsonify({'error': 'Expense not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -64,33 +128,16 @@ def create_expense():
         data = request.get_json()
         
         # Validate required fields
-        required_fields = ['expense_number', 'category', 'amount', 'expense_date']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        expense_doc, error = build_expense_doc(data)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Check for unique expense number
         collection = Expense.get_collection()
         if collection.find_one({'expense_number': data['expense_number']}):
             return jsonify({'error': 'Expense number already exists'}), 400
         
-        expense_doc = {
-            'expense_number': data['expense_number'],
-            'truck_id': data.get('truck_id'),
-            'trip_id': data.get('trip_id'),
-            'category': data['category'],
-            'amount': data['amount'],
-            'expense_date': datetime.fromisoformat(data['expense_date']),
-            'vendor_name': data.get('vendor_name'),
-            'receipt_number': data.get('receipt_number'),
-            'payment_method': data.get('payment_method'),
-            'location': data.get('location'),
-            'description': data.get('description'),
-            'status': data.get('status', 'pending')
-        }
-        
-        expense_id = Expense.insert_one(expense_doc)
-        expense = Expense.find_by_id(expense_id)
+        expense = Expense.insert_and_return(expense_doc)
         
         return jsonify({
             'message': 'Expense created successfully',
@@ -103,15 +150,14 @@ def create_expense():
 def update_expense(expense_id):
     """Update an existing expense"""
     try:
-        expense = Expense.find_by_id(expense_id)
-        if not expense:
+        if not ObjectId.is_valid(expense_id):
             return jsonify({'error': 'Expense not found'}), 404
         
         data = request.get_json()
         collection = Expense.get_collection()
         
         # Check for unique expense number (excluding current expense)
-        if 'expense_number' in data and data['expense_number'] != expense.get('expense_number'):
+        if 'expense_number' in data:
             if collection.find_one({'expense_number': data['expense_number'], '_id': {'$ne': ObjectId(expense_id)}}):
                 return jsonify({'error': 'Expense number already exists'}), 400
         
@@ -131,8 +177,9 @@ def update_expense(expense_id):
         if 'approved_date' in data and data['approved_date']:
             update_doc['approved_date'] = datetime.fromisoformat(data['approved_date'])
         
-        Expense.update_one(expense_id, update_doc)
-        updated_expense = Expense.find_by_id(expense_id)
+        updated_expense = Expense.update_and_return(expense_id, update_doc)
+        if not updated_expense:
+            return jsonify({'error': 'Expense not found'}), 404
         
         return jsonify({
             'message': 'Expense updated successfully',
@@ -141,6 +188,31 @@ def update_expense(expense_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@expenses_bp.route('/expenses', methods=['PATCH'])
+def bulk_update_expense_status():
+    """Apply one status change (e.g. batch approval) to many expenses"""
+    try:
+        data = request.get_json() or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': 'ids must be a non-empty list'}), 400
+        if len(ids) > MAX_BULK_IDS:
+            return jsonify({'error': f'At most {MAX_BULK_IDS} ids per request'}), 400
+        if not data.get('status'):
+            return jsonify({'error': 'Missing required field: status'}), 400
+
+        update_doc = {'status': data['status']}
+        if data.get('approved_date'):
+            update_doc['approved_date'] = datetime.fromisoformat(data['approved_date'])
+        results, changed = Expense.update_many_by_ids(ids, update_doc)
+        return jsonify({
+            'message': f'{len(changed)} expenses updated',
+            'updated': len(changed),
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @expenses_bp.route('/expenses/<expense_id>', methods=['DELETE'])
 def delete_expense(expense_id):
     """Delete an expense (soft delete by setting status to 'cancelled')"""
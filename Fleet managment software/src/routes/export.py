@@ -0,0 +1,216 @@
+import base64
+import heapq
+import io
+import itertools
+import json
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from src.models.mongo_models import (
+    ArchiveState, ClientPayment, Employee, Expense, SubTrip, SubTripArchive, Tombstone, Trip, TripArchive, Truck, bson_to_str
+)
+from src.admission import heavy_route
+from src.deadline import no_deadline
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: NDJSON is always available
+    pyarrow = None
+
+export_bp = Blueprint('export', __name__)
+
+ENTITIES = {
+    'trips': Trip,
+    'subtrips': SubTrip,
+    'expenses': Expense,
+    'client_payments': ClientPayment,
+    'trucks': Truck,
+    'employees': Employee,
+}
+# Closed trips and their sub-trips move to these after `flask archive run`
+# (src/routes/archive.py), keeping their updated_at; see read_changes
+ARCHIVES = {
+    'trips': TripArchive,
+    'subtrips': SubTripArchive,
+}
+DEFAULT_LIMIT = 50000
+MAX_LIMIT = 500000
+CHECKPOINT_EVERY = 1000
+# Writes stamp updated_at before they commit, so the newest few seconds are left
+# for the next sync rather than risk skipping a write that lands late
+SETTLE_LAG = timedelta(seconds=5)
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+# ---- Change cursor ----
+#
+# The export walks (updated_at, _id) in order for changed documents and
+# (deleted_at, _id) for tombstones, both straight off an index.  The token is
+# the last position reached in each, base64url-encoded JSON; pass it back as
+# ?since= to continue.  Checkpoint lines inside the NDJSON stream carry the
+# token so far, so an interrupted download can resume from its last
+# checkpoint instead of starting over.
+
+def encode_token(entity, changes, deletes):
+    position = {
+        'entity': entity,
+        'changes': [changes[0].isoformat(), str(changes[1])] if changes else None,
+        'deletes': [deletes[0].isoformat(), str(deletes[1])] if deletes else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+def decode_token(token, entity):
+    """(changes position, deletes position); raises ValueError for a malformed or foreign token."""
+    def parse(pair):
+        return (datetime.fromisoformat(pair[0]), ObjectId(pair[1])) if pair else None
+
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        owner = position['entity']
+        changes, deletes = parse(position['changes']), parse(position['deletes'])
+    except Exception:
+        raise ValueError('malformed token')
+    if owner != entity:
+        raise ValueError(f'token belongs to {owner!r}, not {entity!r}')
+    return changes, deletes
+
+def keyset_filter(field, position, until):
+    """Documents after `position` in (field, _id) order and before `until`."""
+    if position is None:
+        return {field: {'$lt': until}}
+    value, last_id = position
+    return {
+        field: {'$gte': value, '$lt': until},
+        '$or': [{field: {'$gt': value}}, {field: value, '_id': {'$gt': last_id}}],
+    }
+
+def changed_documents(model, entity, changes, until, limit):
+    """Documents of one entity in (updated_at, _id) order, archived ones merged in with the hot tier."""
+    models = [model]
+    if entity in ARCHIVES and ArchiveState.cutoff() is not None:
+        models.append(ARCHIVES[entity])
+    cursors = [
+        m.get_collection().find(
+            keyset_filter('updated_at', changes, until), sort=[('updated_at', 1), ('_id', 1)]
+        ).limit(limit)
+        for m in models
+    ]
+    last_position = None
+    for doc in heapq.merge(*cursors, key=lambda doc: (doc['updated_at'], doc['_id'])):
+        position = (doc['updated_at'], doc['_id'])
+        # An archive batch is copied before it is deleted, so a document can briefly be in both tiers
+        if position != last_position:
+            yield doc, position
+        last_position = position
+
+def read_changes(model, entity, since, until, limit):
+    """Yield ('upsert', doc, position) then ('delete', tombstone, position), at most `limit` of each.
+
+    Archiving keeps updated_at, so an archived trip has already been exported
+    by any sync that started before it moved; an initial load reads both tiers.
+    """
+    changes, deletes = since
+    for doc, position in itertools.islice(changed_documents(model, entity, changes, until, limit), limit):
+        yield 'upsert', doc, position
+    tombstones = Tombstone.get_collection().find(
+        {'entity': entity, **keyset_filter('deleted_at', deletes, until)}, sort=[('deleted_at', 1), ('_id', 1)]
+    ).limit(limit)
+    for tombstone in tombstones:
+        yield 'delete', tombstone, (tombstone['deleted_at'], tombstone['_id'])
+
+def change_record(entity, op, doc):
+    if op == 'delete':
+        return {'op': 'delete', 'entity': entity, 'id': doc['ref_id'], 'deleted_at': doc['deleted_at'].isoformat()}
+    return {'op': 'upsert', 'entity': entity, 'id': str(doc['_id']),
+            'updated_at': doc['updated_at'].isoformat(), 'doc': bson_to_str(doc)}
+
+# ---- Output formats ----
+
+def ndjson_stream(model, entity, since, until, limit):
+    changes, deletes = since
+    counts = {'upsert': 0, 'delete': 0}
+    for op, doc, position in read_changes(model, entity, since, until, limit):
+        if op == 'upsert':
+            changes = position
+        else:
+            deletes = position
+        counts[op] += 1
+        yield json.dumps(change_record(entity, op, doc)) + '\n'
+        if (counts['upsert'] + counts['delete']) % CHECKPOINT_EVERY == 0:
+            yield json.dumps({'op': 'checkpoint', 'token': encode_token(entity, changes, deletes)}) + '\n'
+    yield json.dumps({
+        'op': 'end',
+        'token': encode_token(entity, changes, deletes),
+        'upserts': counts['upsert'],
+        'deletes': counts['delete'],
+        # A full page of either kind means there may be more: call again with this token
+        'has_more': counts['upsert'] >= limit or counts['delete'] >= limit,
+    }) + '\n'
+
+def parquet_response(model, entity, since, until, limit):
+    """One page as a Parquet file (op, id, changed_at, doc as JSON); the next token is in X-Next-Token."""
+    changes, deletes = since
+    columns = {'op': [], 'id': [], 'changed_at': [], 'doc': []}
+    counts = {'upsert': 0, 'delete': 0}
+    for op, doc, position in read_changes(model, entity, since, until, limit):
+        if op == 'upsert':
+            changes = position
+        else:
+            deletes = position
+        counts[op] += 1
+        record = change_record(entity, op, doc)
+        columns['op'].append(op)
+        columns['id'].append(record['id'])
+        columns['changed_at'].append(position[0])
+        columns['doc'].append(json.dumps(record['doc']) if op == 'upsert' else None)
+    table = pyarrow.table({
+        'op': pyarrow.array(columns['op'], pyarrow.string()),
+        'id': pyarrow.array(columns['id'], pyarrow.string()),
+        'changed_at': pyarrow.array(columns['changed_at'], pyarrow.timestamp('ms')),
+        'doc': pyarrow.array(columns['doc'], pyarrow.string()),
+    })
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table, buffer, compression='zstd')
+    response = Response(buffer.getvalue(), mimetype=PARQUET_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}_changes.parquet'
+    response.headers['X-Next-Token'] = encode_token(entity, changes, deletes)
+    response.headers['X-Has-More'] = 'true' if counts['upsert'] >= limit or counts['delete'] >= limit else 'false'
+    return response
+
+@export_bp.route('/export/changes', methods=['GET'])
+@heavy_route
+@no_deadline
+def export_changes():
+    """Records of one entity changed or hard-deleted since a token: ?entity=&since=&limit=&format=ndjson|parquet
+
+    Without since, the export starts from the beginning (initial load).
+    """
+    try:
+        entity = request.args.get('entity', '')
+        model = ENTITIES.get(entity)
+        if model is None:
+            return jsonify({'error': f"entity must be one of {', '.join(ENTITIES)}"}), 400
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        since = (None, None)
+        if request.args.get('since'):
+            try:
+                since = decode_token(request.args['since'], entity)
+            except ValueError as e:
+                return jsonify({'error': f'Invalid since token: {e}'}), 400
+        until = datetime.utcnow() - SETTLE_LAG
+
+        fmt = request.args.get('format', 'ndjson')
+        if fmt == 'parquet':
+            if pyarrow is None:
+                return jsonify({'error': 'Parquet export needs pyarrow installed; use format=ndjson'}), 400
+            return parquet_response(model, entity, since, until, limit)
+        if fmt != 'ndjson':
+            return jsonify({'error': 'format must be ndjson or parquet'}), 400
+        return Response(
+            stream_with_context(ndjson_stream(model, entity, since, until, limit)), mimetype='application/x-ndjson'
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,143 @@
+import logging
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+import click
+from src.models.mongo_models import Alert, ArchiveState, FuelSample, Trip, TripArchive, Truck, TruckFuelStats
+
+fuel_bp = Blueprint('fuel', __name__)
+logger = logging.getLogger(__name__)
+
+CLAIM_BATCH_SIZE = 1000
+
+# ---- Detection, called from the trip write endpoints ----
+#
+# When a trip becomes 'completed' its km/l (distance_km / fuel_consumed) is
+# compared with the truck's running mean and standard deviation, then folded
+# into them.  The trip is claimed first by recording it in `fuel_samples`,
+# so repeated or concurrent completions count it once; trips without
+# distance or fuel are left unclaimed until they have both.  Failures are logged, not
+# raised: `flask fuel rebuild` recomputes the stats from the trips.
+
+def sample_filter():
+    return {'status': 'completed', 'distance_km': {'$gt': 0}, 'fuel_consumed': {'$gt': 0}}
+
+def kmpl(trip):
+    return trip['distance_km'] / trip['fuel_consumed']
+
+def claim_trip(trip_id):
+    trip = Trip.get_collection().find_one(
+        {'_id': trip_id, **sample_filter()},
+        {'truck_id': 1, 'trip_number': 1, 'distance_km': 1, 'fuel_consumed': 1, 'end_date': 1},
+    )
+    return trip if trip and FuelSample.claim(trip_id) else None
+
+def anomaly_alert(trip, value, stats, std_dev):
+    truck = Truck.find_by_id(trip['truck_id']) or {}
+    truck_number = truck.get('truck_number', trip['truck_id'])
+    direction = 'below' if value < stats['mean'] else 'above'
+    return {
+        'truck_id': truck['_id'] if truck else trip['truck_id'],
+        'truck_number': truck.get('truck_number'),
+        'trip_id': trip['_id'],
+        'trip_number': trip.get('trip_number'),
+        'type': 'fuel_anomaly',
+        'severity': 'warning',
+        'title': f"Unusual fuel efficiency for {truck_number}",
+        'message': f"Trip {trip.get('trip_number', '')} ran at {value:.2f} km/l, {abs(value - stats['mean']) / std_dev:.1f} "
+                   f"standard deviations {direction} the truck's average of {stats['mean']:.2f} km/l over {stats['n']} trips.",
+        'kmpl': value,
+        'mean_kmpl': stats['mean'],
+        'std_dev_kmpl': std_dev,
+        'status': 'active',
+        'alert_date': trip.get('end_date') or datetime.utcnow(),
+    }
+
+def record_completed_trips(trip_ids):
+    """Update the fuel stats for trips just completed, raising fuel_anomaly alerts; O(1) work per trip."""
+    sigma = current_app.config['FUEL_ANOMALY_SIGMA']
+    min_trips = current_app.config['FUEL_ANOMALY_MIN_TRIPS']
+    alerts = []
+    try:
+        for trip_id in trip_ids:
+            trip = claim_trip(trip_id)
+            if not trip:
+                continue
+            value = kmpl(trip)
+            # The trip is judged against the stats from before it, then folded in
+            stats = TruckFuelStats.add_sample(trip['truck_id'], value)
+            std_dev = TruckFuelStats.std_dev(stats)
+            if stats and stats['n'] >= min_trips and std_dev and abs(value - stats['mean']) > sigma * std_dev:
+                alerts.append(anomaly_alert(trip, value, stats, std_dev))
+        if alerts:
+            Alert.get_collection().insert_many(alerts)
+    except PyMongoError as e:
+        logger.warning('Could not update the fuel statistics: %s', e)
+
+# ---- Queries ----
+
+@fuel_bp.route('/trucks/<truck_id>/fuel-stats', methods=['GET'])
+def get_fuel_stats(truck_id):
+    """The truck's running km/l mean and standard deviation over its completed trips."""
+    try:
+        stats = TruckFuelStats.get_collection().find_one({'_id': truck_id})
+        if not stats and Truck.find_version(truck_id) is None:
+            return jsonify({'error': 'Truck not found'}), 404
+        return jsonify({
+            'truck_id': truck_id,
+            'trips': stats['n'] if stats else 0,
+            'mean_kmpl': stats['mean'] if stats else None,
+            'std_dev_kmpl': TruckFuelStats.std_dev(stats),
+            'updated_at': stats['updated_at'].isoformat() if stats and stats.get('updated_at') else None,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ---- Backfill ----
+
+def rebuild_fuel_stats():
+    """Claim every eligible completed trip and recompute each truck's stats from them; returns the trucks written."""
+    now = datetime.utcnow()
+    # Claim the hot trips first so a completion racing the rebuild is not counted again;
+    # archived trips are closed and never go through record_completed_trips
+    claims = []
+    for trip in Trip.get_collection().find(sample_filter(), {'_id': 1}):
+        claims.append(UpdateOne({'_id': trip['_id']}, {'$setOnInsert': {'sampled_at': now}}, upsert=True))
+        if len(claims) >= CLAIM_BATCH_SIZE:
+            FuelSample.get_collection().bulk_write(claims, ordered=False)
+            claims = []
+    if claims:
+        FuelSample.get_collection().bulk_write(claims, ordered=False)
+    archive = [{'$unionWith': {'coll': TripArchive.collection_name, 'pipeline': [{'$match': sample_filter()}]}}] \
+        if ArchiveState.cutoff() is not None else []
+    rows = Trip.get_collection().aggregate([
+        {'$match': sample_filter()},
+        *archive,
+        {'$project': {'truck_id': 1, 'kmpl': {'$divide': ['$distance_km', '$fuel_consumed']}}},
+        {'$group': {
+            '_id': '$truck_id',
+            'n': {'$sum': 1},
+            'mean': {'$avg': '$kmpl'},
+            'std_dev': {'$stdDevPop': '$kmpl'},
+        }},
+    ], allowDiskUse=True)
+    requests = []
+    truck_ids = []
+    for row in rows:
+        truck_ids.append(row['_id'])
+        # Welford's m2 is the sum of squared deviations from the mean: n * population variance
+        m2 = row['n'] * row['std_dev'] ** 2
+        requests.append(ReplaceOne(
+            {'_id': row['_id']}, {'n': row['n'], 'mean': row['mean'], 'm2': m2, 'updated_at': now}, upsert=True
+        ))
+    collection = TruckFuelStats.get_collection()
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    collection.delete_many({'_id': {'$nin': truck_ids}})
+    return len(requests)
+
+@fuel_bp.cli.command('rebuild')
+def rebuild_command():
+    """Recompute the per-truck fuel efficiency stats from completed trips."""
+    click.echo(f'Fuel stats written for {rebuild_fuel_stats()} trucks')
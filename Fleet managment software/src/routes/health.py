@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify, current_app
+import pymongo
+from pymongo.errors import PyMongoError
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/_health', methods=['GET'])
+def health():
+    """Liveness: the worker is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@health_bp.route('/_ready', methods=['GET'])
+def ready():
+    """Readiness: this worker has a Mongo client and the server answers a ping"""
+    mongo_client = getattr(current_app, 'mongo_client', None)
+    if mongo_client is None:
+        return jsonify({'status': 'starting', 'error': 'Database client not initialised'}), 503
+    try:
+        with pymongo.timeout(2):
+            mongo_client.admin.command('ping')
+        return jsonify({'status': 'ready'})
+    except PyMongoError as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
@@ -0,0 +1,242 @@
+from flask import Blueprint, jsonify, request
+import csv
+import json
+from pymongo.errors import BulkWriteError
+from src.models.mongo_models import Trip, SubTrip, Expense
+from src.routes.trips import build_trip_doc, build_subtrip_doc, reconcile_trip_revenues, schedule_conflict
+from src.routes.expenses import build_expense_doc
+from src.routes.search import index_clients, index_trips
+from src.routes.lanes import record_subtrips
+from src.routes.fuel import record_completed_trips
+from src.admission import heavy_route
+from src.deadline import batch_deadline, no_deadline
+
+imports_bp = Blueprint('imports', __name__)
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+def upload_format(upload):
+    """Work out whether the upload is CSV or NDJSON."""
+    fmt = request.args.get('format', '').lower()
+    if fmt in ('csv', 'ndjson'):
+        return fmt
+    filename = (upload.filename or '').lower() if upload else ''
+    mimetype = upload.mimetype if upload else request.mimetype
+    if filename.endswith('.csv') or 'csv' in (mimetype or ''):
+        return 'csv'
+    return 'ndjson'
+
+def iter_upload_rows():
+    """Stream-parse the request body (or a multipart 'file') into (row_number, row, error) tuples."""
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    lines = (line.decode('utf-8-sig') for line in stream)
+
+    if upload_format(upload) == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # CSV has no types: drop empty cells so optional fields fall back to their defaults
+            row = {k: v for k, v in row.items() if k and v not in ('', None)}
+            yield reader.line_num, row, None
+        return
+
+    for line_num, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield line_num, None, 'Each line must be a JSON object'
+            continue
+        yield line_num, row, None
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_num, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_num, 'error': message})
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+def insert_batch(model, batch, result):
+    """Insert a batch of (row_number, doc) pairs, recording per-row write errors."""
+    if not batch:
+        return []
+    docs = [doc for _, doc in batch]
+    try:
+        model.insert_many(docs)
+        result.inserted += len(docs)
+        return batch
+    except BulkWriteError as e:
+        failed_indexes = set()
+        for write_error in e.details.get('writeErrors', []):
+            index = write_error['index']
+            failed_indexes.add(index)
+            result.add_error(batch[index][0], write_error.get('errmsg', 'Write failed'))
+        result.inserted += e.details.get('nInserted', 0)
+        return [item for i, item in enumerate(batch) if i not in failed_indexes]
+
+def import_unique_rows(model, build_doc, unique_field, duplicate_message, after_insert=None, check_doc=None):
+    """Validate, de-duplicate and batch-insert rows that carry a unique business key.
+
+    `check_doc`, if given, is called with each new document and the documents
+    batched before it (not yet inserted), and returns an error message or None.
+    `after_insert`, if given, is called with each batch of documents actually inserted.
+    """
+    result = ImportResult()
+    collection = model.get_collection()
+    seen = set()
+    batch = []
+
+    def flush():
+        with batch_deadline():
+            keys = [doc[unique_field] for _, doc in batch]
+            existing = {
+                doc[unique_field]
+                for doc in collection.find({unique_field: {'$in': keys}}, {unique_field: 1, '_id': 0})
+            }
+            fresh = []
+            for row_num, doc in batch:
+                if doc[unique_field] in existing:
+                    result.add_error(row_num, duplicate_message)
+                else:
+                    fresh.append((row_num, doc))
+            inserted = insert_batch(model, fresh, result)
+            if after_insert and inserted:
+                after_insert([doc for _, doc in inserted])
+        batch.clear()
+
+    for row_num, row, error in iter_upload_rows():
+        if error:
+            result.add_error(row_num, error)
+            continue
+        try:
+            doc, error = build_doc(row)
+        except Exception as e:
+            doc, error = None, str(e)
+        if error:
+            result.add_error(row_num, error)
+            continue
+        if doc[unique_field] in seen:
+            result.add_error(row_num, duplicate_message)
+            continue
+        error = check_doc(doc, [pending for _, pending in batch]) if check_doc else None
+        if error:
+            result.add_error(row_num, error)
+            continue
+        seen.add(doc[unique_field])
+        batch.append((row_num, doc))
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return result
+
+def trip_schedule_error(trip, pending):
+    # Same overlap check as POST /trips, also against earlier rows of the batch
+    problem = schedule_conflict(trip, pending=pending)
+    return problem[0]['error'] if problem else None
+
+def trips_inserted(trips):
+    index_trips(trips)
+    # Same as POST /trips: completed trips feed the fuel stats and anomaly alerts
+    record_completed_trips([trip['_id'] for trip in trips if trip.get('status') == 'completed'])
+
+@imports_bp.route('/trips/import', methods=['POST'])
+@heavy_route
+@no_deadline
+def import_trips():
+    """Bulk import trips from an NDJSON or CSV upload"""
+    try:
+        result = import_unique_rows(
+            Trip, build_trip_doc, 'trip_number', 'Trip number already exists',
+            after_insert=trips_inserted, check_doc=trip_schedule_error
+        )
+        return jsonify({'message': 'Trip import finished', **result.to_dict()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@imports_bp.route('/expenses/import', methods=['POST'])
+@heavy_route
+@no_deadline
+def import_expenses():
+    """Bulk import expenses from an NDJSON or CSV upload"""
+    def build_doc(row):
+        if isinstance(row.get('amount'), str):
+            try:
+                row['amount'] = float(row['amount'])
+            except ValueError:
+                pass
+        return build_expense_doc(row)
+
+    try:
+        result = import_unique_rows(Expense, build_doc, 'expense_number', 'Expense number already exists')
+        return jsonify({'message': 'Expense import finished', **result.to_dict()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@imports_bp.route('/subtrips/import', methods=['POST'])
+@heavy_route
+@no_deadline
+def import_subtrips():
+    """Bulk import sub-trips (each row carries its trip_id) and recompute trip revenues once"""
+    try:
+        result = ImportResult()
+        trip_ids = set()
+        batch = []
+
+        def flush():
+            # Noted before the insert: a batch that fails part-way may still have written some rows
+            trip_ids.update(doc['trip_id'] for _, doc in batch)
+            with batch_deadline():
+                inserted = insert_batch(SubTrip, batch, result)
+                index_clients([doc['client_name'] for _, doc in inserted])
+                record_subtrips([doc for _, doc in inserted])
+            batch.clear()
+
+        try:
+            for row_num, row, error in iter_upload_rows():
+                if error:
+                    result.add_error(row_num, error)
+                    continue
+                if not row.get('trip_id'):
+                    result.add_error(row_num, 'Missing required field: trip_id')
+                    continue
+                try:
+                    doc, error = build_subtrip_doc(row['trip_id'], row)
+                except Exception as e:
+                    doc, error = None, str(e)
+                if error:
+                    result.add_error(row_num, error)
+                    continue
+                batch.append((row_num, doc))
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+        finally:
+            # Batches already committed keep their sub-trips, so their trips' revenue
+            # is repaired even when the import stops part-way
+            reconcile_trip_revenues(trip_ids)  # <-- once per affected trip
+        return jsonify({
+            'message': 'Sub Trip import finished',
+            'trips_updated': len(trip_ids),
+            **result.to_dict()
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
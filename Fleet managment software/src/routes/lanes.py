@@ -0,0 +1,257 @@
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime
+from flask import Blueprint, jsonify, request
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+import click
+from src.models.mongo_models import LaneRollup, SubTrip, SubTripArchive
+from src.routes.archive import subtrips_need_archive
+
+lanes_bp = Blueprint('lanes', __name__)
+logger = logging.getLogger(__name__)
+
+MONTH_PATTERN = re.compile(r'^\d{4}-\d{2}$')
+SORT_FIELDS = ('revenue', 'revenue_per_tonne', 'trip_count', 'cargo_weight')
+DEFAULT_MONTHS = 12
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+DEFAULT_TOP_CLIENTS = 3
+
+# ---- Rollup maintenance, called from the sub-trip write endpoints ----
+#
+# A lane is an (origin, destination) pair; the rollup keeps revenue, cargo
+# weight and sub-trip count per lane, client and month ('YYYY-MM' of the
+# sub-trip date).  Writes apply signed $inc deltas, so an update moves a
+# sub-trip's totals from its old key to its new one.  Failures are logged,
+# not raised: `flask lanes rebuild` repairs the rollup.
+
+def lane_name(value):
+    return str(value or '').strip()
+
+def rollup_key(subtrip):
+    # Stored values as-is (the sub-trip endpoints trim origin/destination), so the
+    # rollup groups exactly like `rebuild` and /lanes/detail
+    return (
+        subtrip.get('origin') or '',
+        subtrip.get('destination') or '',
+        subtrip.get('client_name') or '',
+        str(subtrip.get('date') or '')[:7],
+    )
+
+def new_deltas():
+    return defaultdict(lambda: {'revenue': 0.0, 'cargo_weight': 0.0, 'subtrips': 0})
+
+def add_deltas(deltas, subtrip, sign):
+    key = rollup_key(subtrip)
+    deltas[key]['revenue'] += sign * float(subtrip.get('cost') or 0)
+    deltas[key]['cargo_weight'] += sign * float(subtrip.get('cargo_weight') or 0)
+    deltas[key]['subtrips'] += sign
+
+def apply_deltas(deltas):
+    now = datetime.utcnow()
+    requests = [
+        UpdateOne(
+            {'origin': key[0], 'destination': key[1], 'client_name': key[2], 'month': key[3]},
+            {'$inc': inc, '$set': {'updated_at': now}},
+            upsert=True,
+        )
+        for key, inc in deltas.items() if any(inc.values())
+    ]
+    if not requests:
+        return
+    try:
+        LaneRollup.get_collection().bulk_write(requests, ordered=False)
+    except PyMongoError as e:
+        logger.warning('Could not update the lane rollup: %s', e)
+
+def record_subtrips(subtrips):
+    """Add newly inserted sub-trips to the rollup (one bulk_write per call)."""
+    deltas = new_deltas()
+    for subtrip in subtrips:
+        add_deltas(deltas, subtrip, 1)
+    apply_deltas(deltas)
+
+def unrecord_subtrip(subtrip):
+    deltas = new_deltas()
+    add_deltas(deltas, subtrip, -1)
+    apply_deltas(deltas)
+
+def move_subtrip(previous, updated):
+    """Shift a sub-trip's totals from its old values to its new ones (no-op if nothing relevant changed)."""
+    deltas = new_deltas()
+    add_deltas(deltas, previous, -1)
+    add_deltas(deltas, updated, 1)
+    apply_deltas(deltas)
+
+# ---- Queries ----
+
+def month_offset(month, months):
+    year, mon = int(month[:4]), int(month[5:7])
+    index = year * 12 + mon - 1 + months
+    return f'{index // 12:04d}-{index % 12 + 1:02d}'
+
+def lanes_pipeline(start_month, end_month, filters, sort, top_clients, limit):
+    match = {'month': {'$gte': start_month, '$lte': end_month}, 'subtrips': {'$gt': 0}, **filters}
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': {'origin': '$origin', 'destination': '$destination', 'client_name': '$client_name'},
+            'revenue': {'$sum': '$revenue'},
+            'cargo_weight': {'$sum': '$cargo_weight'},
+            'subtrips': {'$sum': '$subtrips'},
+        }},
+        # Sorted before the lane $group so each lane's client list comes out highest revenue first
+        {'$sort': {'revenue': -1}},
+        {'$group': {
+            '_id': {'origin': '$_id.origin', 'destination': '$_id.destination'},
+            'revenue': {'$sum': '$revenue'},
+            'cargo_weight': {'$sum': '$cargo_weight'},
+            'trip_count': {'$sum': '$subtrips'},
+            'clients': {'$push': {'client_name': '$_id.client_name', 'revenue': '$revenue', 'trip_count': '$subtrips'}},
+        }},
+        {'$project': {
+            '_id': 0,
+            'origin': '$_id.origin',
+            'destination': '$_id.destination',
+            'revenue': 1,
+            'cargo_weight': 1,
+            'trip_count': 1,
+            'revenue_per_tonne': {'$cond': [
+                {'$gt': ['$cargo_weight', 0]}, {'$divide': ['$revenue', '$cargo_weight']}, None
+            ]},
+            'client_count': {'$size': '$clients'},
+            'top_clients': {'$slice': ['$clients', top_clients]},
+        }},
+        {'$sort': {sort: -1, 'origin': 1, 'destination': 1}},
+        {'$limit': limit},
+    ]
+
+def int_arg(name, default, maximum):
+    return min(max(int(request.args.get(name, default)), 1), maximum)
+
+@lanes_bp.route('/lanes', methods=['GET'])
+def get_lanes():
+    """Revenue, revenue per tonne, trip count and top clients per lane from the monthly rollup.
+
+    ?start_month=YYYY-MM&end_month=YYYY-MM (default: the last 12 months)&origin=&destination=
+    &client_name=&sort=revenue|revenue_per_tonne|trip_count|cargo_weight&top_clients=&limit=
+    """
+    try:
+        end_month = request.args.get('end_month') or datetime.utcnow().strftime('%Y-%m')
+        start_month = request.args.get('start_month') or month_offset(end_month, 1 - DEFAULT_MONTHS)
+        for value in (start_month, end_month):
+            if not MONTH_PATTERN.match(value):
+                return jsonify({'error': f'Invalid month: {value}; expected YYYY-MM'}), 400
+        sort = request.args.get('sort', 'revenue')
+        if sort not in SORT_FIELDS:
+            return jsonify({'error': f"sort must be one of {', '.join(SORT_FIELDS)}"}), 400
+        try:
+            limit = int_arg('limit', DEFAULT_LIMIT, MAX_LIMIT)
+            top_clients = int_arg('top_clients', DEFAULT_TOP_CLIENTS, MAX_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'limit and top_clients must be integers'}), 400
+        filters = {
+            field: lane_name(request.args[field])
+            for field in ('origin', 'destination', 'client_name') if request.args.get(field)
+        }
+
+        pipeline = lanes_pipeline(start_month, end_month, filters, sort, top_clients, limit)
+        lanes = list(LaneRollup.get_collection().aggregate(pipeline))
+        return jsonify({'start_month': start_month, 'end_month': end_month, 'sort': sort, 'lanes': lanes})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@lanes_bp.route('/lanes/detail', methods=['GET'])
+def get_lane_detail():
+    """One lane over an exact date range, straight from subtrips: ?origin=&destination=&start_date=&end_date="""
+    try:
+        origin = lane_name(request.args.get('origin'))
+        destination = lane_name(request.args.get('destination'))
+        if not origin or not destination:
+            return jsonify({'error': 'origin and destination are required'}), 400
+        match = {'origin': origin, 'destination': destination}
+        start_date = request.args.get('start_date', '')
+        end_date = request.args.get('end_date', '')
+        for value in (start_date, end_date):
+            if value:
+                try:
+                    datetime.fromisoformat(value)
+                except ValueError:
+                    return jsonify({'error': f'Invalid date: {value}; expected YYYY-MM-DD'}), 400
+        if start_date or end_date:
+            match['date'] = {}
+            if start_date:
+                match['date']['$gte'] = start_date
+            if end_date:
+                match['date']['$lte'] = end_date + '\uffff'  # inclusive day, as for receivables
+
+        collection = SubTrip.get_collection()
+        archive = [{'$unionWith': {'coll': SubTripArchive.collection_name, 'pipeline': [{'$match': match}]}}] \
+            if subtrips_need_archive(start_date) else []
+
+        def grouped(key):
+            return list(collection.aggregate([
+                {'$match': match},
+                *archive,
+                {'$group': {'_id': key, 'revenue': {'$sum': '$cost'}, 'cargo_weight': {'$sum': '$cargo_weight'},
+                            'trip_count': {'$sum': 1}}},
+                {'$sort': {'_id': 1}},
+            ]))
+
+        # Both aggregations are answered from the (origin, destination, date) index range
+        months = [{'month': row.pop('_id'), **row} for row in grouped({'$substrBytes': ['$date', 0, 7]})]
+        clients = [{'client_name': row.pop('_id'), **row} for row in grouped('$client_name')]
+        clients.sort(key=lambda row: -row['revenue'])
+        revenue = sum(row['revenue'] for row in months)
+        cargo_weight = sum(row['cargo_weight'] for row in months)
+        return jsonify({
+            'origin': origin,
+            'destination': destination,
+            'revenue': revenue,
+            'cargo_weight': cargo_weight,
+            'trip_count': sum(row['trip_count'] for row in months),
+            'revenue_per_tonne': revenue / cargo_weight if cargo_weight else None,
+            'months': months,
+            'clients': clients,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ---- Backfill ----
+
+def rebuild_lane_rollups():
+    """Recompute the whole rollup from subtrips and the archive with one aggregation ($out swaps it in atomically)."""
+    SubTrip.get_collection().aggregate([
+        {'$unionWith': SubTripArchive.collection_name},
+        {'$group': {
+            '_id': {
+                'origin': {'$ifNull': ['$origin', '']},
+                'destination': {'$ifNull': ['$destination', '']},
+                'client_name': {'$ifNull': ['$client_name', '']},
+                'month': {'$substrBytes': [{'$ifNull': ['$date', '']}, 0, 7]},
+            },
+            'revenue': {'$sum': '$cost'},
+            'cargo_weight': {'$sum': '$cargo_weight'},
+            'subtrips': {'$sum': 1},
+        }},
+        {'$project': {
+            '_id': 0,
+            'origin': '$_id.origin',
+            'destination': '$_id.destination',
+            'client_name': '$_id.client_name',
+            'month': '$_id.month',
+            'revenue': 1,
+            'cargo_weight': 1,
+            'subtrips': 1,
+            'updated_at': '$$NOW',
+        }},
+        {'$out': LaneRollup.collection_name},
+    ], allowDiskUse=True)
+    return LaneRollup.get_collection().estimated_document_count()
+
+@lanes_bp.cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the lane rollup from subtrips."""
+    click.echo(f'{rebuild_lane_rollups()} lane rollup rows written')
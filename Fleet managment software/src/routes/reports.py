@@ -1,18 +1,42 @@
 from flask import Blueprint, jsonify, request, make_response
 from datetime import datetime
-from src.models.mongo_models import Truck, Employee, Trip, Expense, SubTrip
+from src.models.mongo_models import Truck, Employee, Expense, SubTrip, SubTripArchive
+from src.routes.archive import find_trips
+from src.admission import heavy_route
+from src.deadline import check_deadline, deadline_response, is_deadline_error
 import csv
 import io
 from bson import ObjectId
 
 reports_bp = Blueprint('reports', __name__)
 
-def export_to_csv(data, filename, columns):
-    """Helper function to export data to CSV"""
+TRIP_SUMMARY_COLUMNS = [
+    'trip_number', 'truck_number', 'driver_name',
+    'start_date', 'end_date', 'distance', 'revenue', 'fuel_consumed', 'fuel_cost', 'fuel_efficiency', 'other_expenses', 'profit'
+]
+EXPENSE_SUMMARY_COLUMNS = [
+    'expense_number', 'truck_number', 'category', 'amount', 'expense_date',
+    'vendor_name', 'receipt_number', 'location', 'description', 'status'
+]
+TRUCK_PERFORMANCE_COLUMNS = [
+    'truck_number', 'make_model', 'total_trips', 'total_distance', 'total_revenue',
+    'total_fuel_cost', 'total_expenses', 'fuel_efficiency', 'revenue_per_km',
+    'cost_per_km', 'profit_per_km', 'utilization_rate'
+]
+EMPLOYEE_PERFORMANCE_COLUMNS = [
+    'employee_number', 'full_name', 'position', 'total_trips', 'total_distance',
+    'total_revenue', 'total_profit', 'avg_revenue_per_trip', 'avg_distance_per_trip',
+    'productivity_score'
+]
+FINANCIAL_SUMMARY_COLUMNS = ['month', 'revenue', 'expenses', 'profit']
+
+def csv_text(data, columns):
+    """Render rows as CSV text"""
     output = io.StringIO()
     writer = csv.DictWriter(output, fieldnames=columns)
     writer.writeheader()
     for row in data:
+        check_deadline()
         csv_row = {}
         for col in columns:
             value = row.get(col, '')
@@ -23,11 +47,360 @@ def export_to_csv(data, filename, columns):
             else:
                 csv_row[col] = value
         writer.writerow(csv_row)
-    response = make_response(output.getvalue())
+    return output.getvalue()
+
+def export_to_csv(data, filename, columns):
+    """Helper function to export data to CSV"""
+    response = make_response(csv_text(data, columns))
     response.headers['Content-Type'] = 'text/csv'
     response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
+def date_range_filter(args):
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    if start_date and end_date:
+        return {
+            '$gte': datetime.fromisoformat(start_date),
+            '$lte': datetime.fromisoformat(end_date)
+        }
+    return {}
+
+# Trip ids per revenue aggregation: keeps each command far below the 16 MB BSON limit
+REVENUE_BATCH_SIZE = 1000
+
+def revenue_batches(trips):
+    """(sub-trip model, trip ids) chunks covering every trip, by tier."""
+    for model, archived in ((SubTrip, False), (SubTripArchive, True)):
+        trip_ids = [str(trip['_id']) for trip in trips if bool(trip.get('archived_at')) == archived]
+        for start in range(0, len(trip_ids), REVENUE_BATCH_SIZE):
+            yield model, trip_ids[start:start + REVENUE_BATCH_SIZE]
+
+def subtrip_revenues(trips):
+    """Sum sub-trip costs for all given trips, one aggregation per batch of trip ids; returns {trip_id: revenue}."""
+    revenues = {}
+    for model, trip_ids in revenue_batches(trips):
+        revenues.update(
+            (row['_id'], float(row['revenue'] or 0))
+            for row in model.get_collection().aggregate(SubTrip.revenue_pipeline(trip_ids))
+        )
+    return revenues
+
+# ---- Report queries (shared with the ASGI read API) ----
+
+def trip_summary_filter(args):
+    filter_dict = {}
+    date_filter = date_range_filter(args)
+    if date_filter:
+        filter_dict['start_date'] = date_filter
+    if args.get('truck_id'):
+        filter_dict['truck_id'] = args.get('truck_id')
+    if args.get('driver_id'):
+        filter_dict['driver_id'] = args.get('driver_id')
+    return filter_dict
+
+def expense_summary_filter(args):
+    filter_dict = {}
+    date_filter = date_range_filter(args)
+    if date_filter:
+        filter_dict['expense_date'] = date_filter
+    if args.get('truck_id'):
+        filter_dict['truck_id'] = args.get('truck_id')
+    if args.get('category'):
+        filter_dict['category'] = args.get('category')
+    if args.get('approval_status'):
+        filter_dict['status'] = args.get('approval_status')
+    return filter_dict
+
+def truck_performance_filters(args):
+    """Return (truck_filter, trip_filter_without_truck_ids)."""
+    truck_filter = {}
+    if args.get('truck_id'):
+        truck_filter['_id'] = ObjectId(args.get('truck_id'))
+    if args.get('region'):
+        truck_filter['region'] = args.get('region')
+    trip_filter = {}
+    date_filter = date_range_filter(args)
+    if date_filter:
+        trip_filter['start_date'] = date_filter
+    return truck_filter, trip_filter
+
+def employee_performance_filters(args):
+    """Return (employee_filter, trip_filter_without_driver_ids)."""
+    employee_filter = {}
+    if args.get('employee_id'):
+        employee_filter['_id'] = ObjectId(args.get('employee_id'))
+    if args.get('position'):
+        employee_filter['position'] = args.get('position')
+    if args.get('region'):
+        employee_filter['region'] = args.get('region')
+    trip_filter = {}
+    date_filter = date_range_filter(args)
+    if date_filter:
+        trip_filter['start_date'] = date_filter
+    return employee_filter, trip_filter
+
+def financial_summary_filters(args):
+    """Return (trip_filter, expense_filter)."""
+    date_filter = date_range_filter(args)
+    truck_id = args.get('truck_id')
+    trip_filter = {}
+    if date_filter:
+        trip_filter['start_date'] = date_filter
+    if truck_id:
+        trip_filter['truck_id'] = truck_id
+    expense_filter = {}
+    if date_filter:
+        expense_filter['expense_date'] = date_filter
+    if truck_id:
+        expense_filter['truck_id'] = truck_id
+    return trip_filter, expense_filter
+
+# ---- Report builders: pure functions over already-fetched documents ----
+
+def build_trip_summary(trips, trucks, drivers, revenues):
+    trip_data = []
+    for trip in trips:
+        check_deadline()
+        truck = trucks.get(str(trip.get('truck_id'))) if trip.get('truck_id') else None
+        driver = drivers.get(str(trip.get('driver_id'))) if trip.get('driver_id') else None
+        distance = float(trip.get('distance_km', 0) or 0)
+        fuel_cost = float(trip.get('fuel_cost', 0) or 0)
+        other_expenses = float(trip.get('other_expenses', 0) or 0)
+        fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
+        revenue = revenues.get(str(trip.get('_id')), 0.0)
+        profit = revenue - other_expenses
+        fuel_efficiency = float(trip.get('mileage', 0) or 0)
+        trip_info = {
+            'trip_number': trip.get('trip_number'),
+            'truck_number': truck.get('truck_number') if truck else 'N/A',
+            'driver_name': f"{driver.get('first_name', '')} {driver.get('last_name', '')}".strip() if driver else 'N/A',
+            'start_date': trip.get('start_date').isoformat() if trip.get('start_date') else None,
+            'end_date': trip.get('end_date').isoformat() if trip.get('end_date') else None,
+            'distance': distance,
+            'revenue': revenue,
+            'fuel_consumed': fuel_consumed,
+            'fuel_cost': fuel_cost,
+            'fuel_efficiency': fuel_efficiency,
+            'other_expenses': other_expenses,
+            'profit': profit
+        }
+        trip_data.append(trip_info)
+    total_trips = len(trip_data)
+    total_distance = sum(trip['distance'] for trip in trip_data)
+    total_revenue = sum(trip['revenue'] for trip in trip_data)
+    total_fuel_cost = sum(trip['fuel_cost'] for trip in trip_data)
+    total_other_expenses = sum(trip['other_expenses'] for trip in trip_data)
+    total_profit = total_revenue - total_other_expenses
+    avg_distance = total_distance / total_trips if total_trips > 0 else 0
+    avg_revenue = total_revenue / total_trips if total_trips > 0 else 0
+    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+    return {
+        'report_type': 'Trip Summary Report',
+        'generated_at': datetime.utcnow().isoformat(),
+        'summary': {
+            'total_trips': total_trips,
+            'average_distance': avg_distance,
+            'average_revenue': avg_revenue,
+            'profit_margin': profit_margin,
+            'total_distance': total_distance,
+            'total_fuel_cost': total_fuel_cost,
+            'total_other_expenses': total_other_expenses,
+            'total_profit': total_profit,
+            'total_revenue': total_revenue
+        },
+        'trips': trip_data
+    }
+
+def build_expense_summary(expenses, trucks):
+    category_summary = {}
+    total_amount = 0.0
+    for expense in expenses:
+        cat = expense.get('category', 'Other')
+        amount = float(expense.get('amount', 0) or 0)
+        if cat not in category_summary:
+            category_summary[cat] = {'count': 0, 'total': 0.0}
+        category_summary[cat]['count'] += 1
+        category_summary[cat]['total'] += amount
+        total_amount += amount
+    expense_data = []
+    for expense in expenses:
+        check_deadline()
+        truck = trucks.get(str(expense.get('truck_id'))) if expense.get('truck_id') else None
+        amount = float(expense.get('amount', 0) or 0)
+        expense_info = {
+            'expense_number': expense.get('expense_number'),
+            'truck_number': truck.get('truck_number') if truck else 'N/A',
+            'category': expense.get('category'),
+            'amount': amount,
+            'expense_date': expense.get('expense_date').isoformat() if expense.get('expense_date') else None,
+            'vendor_name': expense.get('vendor_name'),
+            'receipt_number': expense.get('receipt_number'),
+            'location': expense.get('location'),
+            'description': expense.get('description'),
+            'status': expense.get('status'),
+        }
+        expense_data.append(expense_info)
+    return {
+        'report_type': 'Expense Summary Report',
+        'generated_at': datetime.utcnow().isoformat(),
+        'summary': {
+            'total_expenses': len(expenses),
+            'total_amount': total_amount,
+            'category_breakdown': category_summary
+        },
+        'expenses': expense_data
+    }
+
+def group_trips_by(trips, field):
+    grouped = {}
+    for trip in trips:
+        grouped.setdefault(trip.get(field), []).append(trip)
+    return grouped
+
+def build_truck_performance(trucks, trips, revenues):
+    trips_by_truck = group_trips_by(trips, 'truck_id')
+    truck_performance = []
+    for truck in trucks:
+        check_deadline()
+        truck_trips = trips_by_truck.get(str(truck['_id']), [])
+        truck_trip_data = []
+        for trip in truck_trips:
+            distance = float(trip.get('distance_km', 0) or 0)
+            fuel_cost = float(trip.get('fuel_cost', 0) or 0)
+            other_expenses = float(trip.get('other_expenses', 0) or 0)
+            fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
+            revenue = revenues.get(str(trip.get('_id')), 0.0)
+            profit = revenue - other_expenses
+            fuel_efficiency = float(trip.get('mileage', 0) or 0)
+            truck_trip_data.append({
+                'distance': distance,
+                'revenue': revenue,
+                'fuel_cost': fuel_cost,
+                'other_expenses': other_expenses,
+                'profit': profit,
+                'fuel_consumed': fuel_consumed,
+                'fuel_efficiency': fuel_efficiency
+            })
+        total_trips = len(truck_trip_data)
+        total_distance = sum(t['distance'] for t in truck_trip_data)
+        total_revenue = sum(t['revenue'] for t in truck_trip_data)
+        total_fuel_cost = sum(t['fuel_cost'] for t in truck_trip_data)
+        total_other_expenses = sum(t['other_expenses'] for t in truck_trip_data)
+        total_profit = total_revenue - total_other_expenses
+        fuel_efficiency = (sum(t['fuel_efficiency'] for t in truck_trip_data) / total_trips) if total_trips else 0
+        revenue_per_km = total_revenue / total_distance if total_distance else 0
+        cost_per_km = total_other_expenses / total_distance if total_distance else 0
+        profit_per_km = revenue_per_km - cost_per_km
+        truck_performance.append({
+            'truck_number': truck.get('truck_number'),
+            'make_model': f"{truck.get('make', '')} {truck.get('model', '')}".strip(),
+            'total_trips': total_trips,
+            'total_distance': total_distance,
+            'total_revenue': total_revenue,
+            'total_fuel_cost': total_fuel_cost,
+            'total_expenses': total_other_expenses,
+            'fuel_efficiency': fuel_efficiency,
+            'revenue_per_km': revenue_per_km,
+            'cost_per_km': cost_per_km,
+            'profit_per_km': profit_per_km,
+            'utilization_rate': (total_trips / 30) * 100 if total_trips else 0  # Assuming 30 days period
+        })
+    return {
+        'report_type': 'Truck Performance Report',
+        'generated_at': datetime.utcnow().isoformat(),
+        'trucks': truck_performance
+    }
+
+def build_employee_performance(employees, trips, revenues):
+    trips_by_driver = group_trips_by(trips, 'driver_id')
+    employee_performance = []
+    for employee in employees:
+        check_deadline()
+        employee_trips = trips_by_driver.get(str(employee['_id']), [])
+        trip_data = []
+        for trip in employee_trips:
+            distance = float(trip.get('distance_km', 0) or 0)
+            fuel_cost = float(trip.get('fuel_cost', 0) or 0)
+            other_expenses = float(trip.get('other_expenses', 0) or 0)
+            fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
+            revenue = revenues.get(str(trip.get('_id')), 0.0)
+            profit = revenue - other_expenses
+            trip_data.append({
+                'distance': distance,
+                'revenue': revenue,
+                'fuel_cost': fuel_cost,
+                'other_expenses': other_expenses,
+                'profit': profit,
+                'fuel_consumed': fuel_consumed
+            })
+        total_trips = len(trip_data)
+        total_distance = sum(t['distance'] for t in trip_data)
+        total_revenue = sum(t['revenue'] for t in trip_data)
+        total_profit = total_revenue - sum(t['other_expenses'] for t in trip_data)
+        avg_revenue_per_trip = total_revenue / total_trips if total_trips > 0 else 0
+        avg_distance_per_trip = total_distance / total_trips if total_trips > 0 else 0
+        employee_performance.append({
+            'employee_number': employee.get('employee_number'),
+            'full_name': f"{employee.get('first_name', '')} {employee.get('last_name', '')}".strip(),
+            'position': employee.get('position'),
+            'total_trips': total_trips,
+            'total_distance': total_distance,
+            'total_revenue': total_revenue,
+            'total_profit': total_profit,
+            'avg_revenue_per_trip': avg_revenue_per_trip,
+            'avg_distance_per_trip': avg_distance_per_trip,
+            'productivity_score': (total_trips * 10 + total_distance * 0.1) if total_trips > 0 else 0
+        })
+    return {
+        'report_type': 'Employee Performance Report',
+        'generated_at': datetime.utcnow().isoformat(),
+        'employees': employee_performance
+    }
+
+def build_financial_summary(trips, expenses, revenues):
+    # Use subtrip revenue for all trips
+    total_revenue = sum(revenues.get(str(trip.get('_id')), 0.0) for trip in trips)
+    total_trip_expenses = sum(float(trip.get('other_expenses', 0) or 0) for trip in trips)
+    total_other_expenses = sum(float(expense.get('amount', 0) or 0) for expense in expenses)
+    total_expenses = total_trip_expenses + total_other_expenses
+    total_profit = total_revenue - total_expenses
+    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+    monthly_data = {}
+    for trip in trips:
+        check_deadline()
+        if trip.get('start_date'):
+            month_key = trip['start_date'].strftime('%Y-%m')
+            if month_key not in monthly_data:
+                monthly_data[month_key] = {'revenue': 0.0, 'expenses': 0.0, 'profit': 0.0}
+            monthly_data[month_key]['revenue'] += revenues.get(str(trip.get('_id')), 0.0)
+            monthly_data[month_key]['expenses'] += float(trip.get('other_expenses', 0) or 0)
+    for expense in expenses:
+        if expense.get('expense_date'):
+            month_key = expense['expense_date'].strftime('%Y-%m')
+            if month_key not in monthly_data:
+                monthly_data[month_key] = {'revenue': 0.0, 'expenses': 0.0, 'profit': 0.0}
+            monthly_data[month_key]['expenses'] += float(expense.get('amount', 0) or 0)
+    for month in monthly_data:
+        monthly_data[month]['profit'] = monthly_data[month]['revenue'] - monthly_data[month]['expenses']
+    return {
+        'report_type': 'Financial Summary Report',
+        'generated_at': datetime.utcnow().isoformat(),
+        'summary': {
+            'total_revenue': total_revenue,
+            'total_expenses': total_expenses,
+            'total_profit': total_profit,
+            'profit_margin': profit_margin
+        },
+        'monthly_breakdown': monthly_data
+    }
+
+def financial_summary_csv_rows(report_data):
+    return [
+        {'month': month, 'revenue': data['revenue'], 'expenses': data['expenses'], 'profit': data['profit']}
+        for month, data in report_data['monthly_breakdown'].items()
+    ]
+
 @reports_bp.route('/reports/types', methods=['GET'])
 def get_report_types():
     report_types = [
@@ -65,407 +438,88 @@ def get_report_types():
     return jsonify({'report_types': report_types})
 
 @reports_bp.route('/reports/trip_summary', methods=['GET'])
+@heavy_route
 def trip_summary_report():
     """Generate trip summary report"""
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        truck_id = request.args.get('truck_id')
-        driver_id = request.args.get('driver_id')
-        region = request.args.get('region')
-        export_format = request.args.get('format')
-
-        filter_dict = {}
-        if start_date and end_date:
-            filter_dict['start_date'] = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
-        if truck_id:
-            filter_dict['truck_id'] = truck_id
-        if driver_id:
-            filter_dict['driver_id'] = driver_id
-
-        trips = Trip.find_all(filter_dict)
-
-        trip_data = []
-        for trip in trips:
-            truck = Truck.find_by_id(trip.get('truck_id')) if trip.get('truck_id') else None
-            driver = Employee.find_by_id(trip.get('driver_id')) if trip.get('driver_id') else None
-            distance = float(trip.get('distance_km', 0) or 0)
-            fuel_cost = float(trip.get('fuel_cost', 0) or 0)
-            other_expenses = float(trip.get('other_expenses', 0) or 0)
-            fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
-            subtrips = SubTrip.find_all({'trip_id': str(trip.get('_id'))})
-            revenue = sum(float(st.get('cost', 0) or 0) for st in subtrips)
-            profit = revenue - other_expenses
-            fuel_efficiency = float(trip.get('mileage', 0) or 0)
-            trip_info = {
-                'trip_number': trip.get('trip_number'),
-                'truck_number': truck.get('truck_number') if truck else 'N/A',
-                'driver_name': f"{driver.get('first_name', '')} {driver.get('last_name', '')}".strip() if driver else 'N/A',
-                'start_date': trip.get('start_date').isoformat() if trip.get('start_date') else None,
-                'end_date': trip.get('end_date').isoformat() if trip.get('end_date') else None,
-                'distance': distance,
-                'revenue': revenue,
-                'fuel_consumed': fuel_consumed,
-                'fuel_cost': fuel_cost,
-                'fuel_efficiency': fuel_efficiency,
-                'other_expenses': other_expenses,
-                'profit': profit
-            }
-            trip_data.append(trip_info)
-        total_trips = len(trip_data)
-        total_distance = sum(trip['distance'] for trip in trip_data)
-        total_revenue = sum(trip['revenue'] for trip in trip_data)
-        total_fuel_cost = sum(trip['fuel_cost'] for trip in trip_data)
-        total_other_expenses = sum(trip['other_expenses'] for trip in trip_data)
-        total_profit = total_revenue - total_other_expenses
-        avg_distance = total_distance / total_trips if total_trips > 0 else 0
-        avg_revenue = total_revenue / total_trips if total_trips > 0 else 0
-        profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
-        report_data = {
-            'report_type': 'Trip Summary Report',
-            'generated_at': datetime.utcnow().isoformat(),
-            'summary': {
-                'total_trips': total_trips,
-                'average_distance': avg_distance,
-                'average_revenue': avg_revenue,
-                'profit_margin': profit_margin,
-                'total_distance': total_distance,
-                'total_fuel_cost': total_fuel_cost,
-                'total_other_expenses': total_other_expenses,
-                'total_profit': total_profit,
-                'total_revenue': total_revenue
-            },
-            'trips': trip_data
-        }
-        if export_format == 'csv':
-            return export_to_csv(trip_data, 'trip_summary_report.csv', [
-                'trip_number', 'truck_number', 'driver_name',
-                'start_date', 'end_date', 'distance', 'revenue', 'fuel_consumed', 'fuel_cost', 'fuel_efficiency', 'other_expenses', 'profit'
-            ])
+        trips = find_trips(trip_summary_filter(request.args))
+        trucks = Truck.find_by_ids({trip.get('truck_id') for trip in trips})
+        drivers = Employee.find_by_ids({trip.get('driver_id') for trip in trips})
+        check_deadline()
+        report_data = build_trip_summary(trips, trucks, drivers, subtrip_revenues(trips))
+        if request.args.get('format') == 'csv':
+            return export_to_csv(report_data['trips'], 'trip_summary_report.csv', TRIP_SUMMARY_COLUMNS)
         return jsonify(report_data)
     except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
         return jsonify({'error': str(e)}), 500
 
 @reports_bp.route('/reports/expense_summary', methods=['GET'])
+@heavy_route
 def expense_summary_report():
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        truck_id = request.args.get('truck_id')
-        category = request.args.get('category')
-        approval_status = request.args.get('approval_status')
-        export_format = request.args.get('format')
-
-        filter_dict = {}
-        if start_date and end_date:
-            filter_dict['expense_date'] = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
-        if truck_id:
-            filter_dict['truck_id'] = truck_id
-        if category:
-            filter_dict['category'] = category
-        if approval_status:
-            filter_dict['status'] = approval_status
-
-        expenses = Expense.find_all(filter_dict)
-        category_summary = {}
-        total_amount = 0.0
-        for expense in expenses:
-            cat = expense.get('category', 'Other')
-            amount = float(expense.get('amount', 0) or 0)
-            if cat not in category_summary:
-                category_summary[cat] = {'count': 0, 'total': 0.0}
-            category_summary[cat]['count'] += 1
-            category_summary[cat]['total'] += amount
-            total_amount += amount
-        expense_data = []
-        for expense in expenses:
-            truck = Truck.find_by_id(expense.get('truck_id')) if expense.get('truck_id') else None
-            amount = float(expense.get('amount', 0) or 0)
-            expense_info = {
-                'expense_number': expense.get('expense_number'),
-                'truck_number': truck.get('truck_number') if truck else 'N/A',
-                'category': expense.get('category'),
-                'amount': amount,
-                'expense_date': expense.get('expense_date').isoformat() if expense.get('expense_date') else None,
-                'vendor_name': expense.get('vendor_name'),
-                'receipt_number': expense.get('receipt_number'),
-                'location': expense.get('location'),
-                'description': expense.get('description'),
-                'status': expense.get('status'),
-            }
-            expense_data.append(expense_info)
-        report_data = {
-            'report_type': 'Expense Summary Report',
-            'generated_at': datetime.utcnow().isoformat(),
-            'summary': {
-                'total_expenses': len(expenses),
-                'total_amount': total_amount,
-                'category_breakdown': category_summary
-            },
-            'expenses': expense_data
-        }
-        if export_format == 'csv':
-            return export_to_csv(expense_data, 'expense_summary_report.csv', [
-                'expense_number', 'truck_number', 'category', 'amount', 'expense_date',
-                'vendor_name', 'receipt_number', 'location', 'description', 'status'
-            ])
+        expenses = Expense.find_all(expense_summary_filter(request.args))
+        trucks = Truck.find_by_ids({expense.get('truck_id') for expense in expenses})
+        check_deadline()
+        report_data = build_expense_summary(expenses, trucks)
+        if request.args.get('format') == 'csv':
+            return export_to_csv(report_data['expenses'], 'expense_summary_report.csv', EXPENSE_SUMMARY_COLUMNS)
         return jsonify(report_data)
     except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
         return jsonify({'error': str(e)}), 500
 
 @reports_bp.route('/reports/truck_performance', methods=['GET'])
+@heavy_route
 def truck_performance_report():
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        truck_id = request.args.get('truck_id')
-        region = request.args.get('region')
-        export_format = request.args.get('format')
-
-        truck_filter = {}
-        if truck_id:
-            truck_filter['_id'] = ObjectId(truck_id)
-        if region:
-            truck_filter['region'] = region
+        truck_filter, trip_filter = truck_performance_filters(request.args)
         trucks = Truck.find_all(truck_filter)
-
-        trip_date_filter = {}
-        if start_date and end_date:
-            trip_date_filter = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
-        truck_performance = []
-        for truck in trucks:
-            truck_id_str = str(truck['_id'])
-            trip_filter = {'truck_id': truck_id_str}
-            if trip_date_filter:
-                trip_filter['start_date'] = trip_date_filter
-            truck_trips = Trip.find_all(trip_filter)
-            truck_trip_data = []
-            for trip in truck_trips:
-                distance = float(trip.get('distance_km', 0) or 0)
-                fuel_cost = float(trip.get('fuel_cost', 0) or 0)
-                other_expenses = float(trip.get('other_expenses', 0) or 0)
-                fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
-                subtrips = SubTrip.find_all({'trip_id': str(trip.get('_id'))})
-                revenue = sum(float(st.get('cost', 0) or 0) for st in subtrips)
-                profit = revenue - other_expenses
-                fuel_efficiency = float(trip.get('mileage', 0) or 0)
-                truck_trip_data.append({
-                    'distance': distance,
-                    'revenue': revenue,
-                    'fuel_cost': fuel_cost,
-                    'other_expenses': other_expenses,
-                    'profit': profit,
-                    'fuel_consumed': fuel_consumed,
-                    'fuel_efficiency': fuel_efficiency
-                })
-            total_trips = len(truck_trip_data)
-            total_distance = sum(t['distance'] for t in truck_trip_data)
-            total_revenue = sum(t['revenue'] for t in truck_trip_data)
-            total_fuel_cost = sum(t['fuel_cost'] for t in truck_trip_data)
-            total_other_expenses = sum(t['other_expenses'] for t in truck_trip_data)
-            total_profit = total_revenue - total_other_expenses
-            fuel_efficiency = (sum(t['fuel_efficiency'] for t in truck_trip_data) / total_trips) if total_trips else 0
-            revenue_per_km = total_revenue / total_distance if total_distance else 0
-            cost_per_km = total_other_expenses / total_distance if total_distance else 0
-            profit_per_km = revenue_per_km - cost_per_km
-            truck_performance.append({
-                'truck_number': truck.get('truck_number'),
-                'make_model': f"{truck.get('make', '')} {truck.get('model', '')}".strip(),
-                'total_trips': total_trips,
-                'total_distance': total_distance,
-                'total_revenue': total_revenue,
-                'total_fuel_cost': total_fuel_cost,
-                'total_expenses': total_other_expenses,
-                'fuel_efficiency': fuel_efficiency,
-                'revenue_per_km': revenue_per_km,
-                'cost_per_km': cost_per_km,
-                'profit_per_km': profit_per_km,
-                'utilization_rate': (total_trips / 30) * 100 if total_trips else 0  # Assuming 30 days period
-            })
-        report_data = {
-            'report_type': 'Truck Performance Report',
-            'generated_at': datetime.utcnow().isoformat(),
-            'trucks': truck_performance
-        }
-        if export_format == 'csv':
-            return export_to_csv(truck_performance, 'truck_performance_report.csv', [
-                'truck_number', 'make_model', 'total_trips', 'total_distance', 'total_revenue',
-                'total_fuel_cost', 'total_expenses', 'fuel_efficiency', 'revenue_per_km',
-                'cost_per_km', 'profit_per_km', 'utilization_rate'
-            ])
+        trip_filter['truck_id'] = {'$in': [str(truck['_id']) for truck in trucks]}
+        trips = find_trips(trip_filter)
+        check_deadline()
+        report_data = build_truck_performance(trucks, trips, subtrip_revenues(trips))
+        if request.args.get('format') == 'csv':
+            return export_to_csv(report_data['trucks'], 'truck_performance_report.csv', TRUCK_PERFORMANCE_COLUMNS)
         return jsonify(report_data)
     except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
         return jsonify({'error': str(e)}), 500
 
 @reports_bp.route('/reports/employee_performance', methods=['GET'])
+@heavy_route
 def employee_performance_report():
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        employee_id = request.args.get('employee_id')
-        position = request.args.get('position')
-        region = request.args.get('region')
-        export_format = request.args.get('format')
-
-        employee_filter = {}
-        if employee_id:
-            employee_filter['_id'] = ObjectId(employee_id)
-        if position:
-            employee_filter['position'] = position
-        if region:
-            employee_filter['region'] = region
+        employee_filter, trip_filter = employee_performance_filters(request.args)
         employees = Employee.find_all(employee_filter)
-
-        trip_date_filter = {}
-        if start_date and end_date:
-            trip_date_filter = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
-        employee_performance = []
-        for employee in employees:
-            employee_id_str = str(employee['_id'])
-            trip_filter = {'driver_id': employee_id_str}
-            if trip_date_filter:
-                trip_filter['start_date'] = trip_date_filter
-            employee_trips = Trip.find_all(trip_filter)
-            trip_data = []
-            for trip in employee_trips:
-                distance = float(trip.get('distance_km', 0) or 0)
-                fuel_cost = float(trip.get('fuel_cost', 0) or 0)
-                other_expenses = float(trip.get('other_expenses', 0) or 0)
-                fuel_consumed = float(trip.get('fuel_consumed', 0) or 0)
-                subtrips = SubTrip.find_all({'trip_id': str(trip.get('_id'))})
-                revenue = sum(float(st.get('cost', 0) or 0) for st in subtrips)
-                profit = revenue - other_expenses
-                trip_data.append({
-                    'distance': distance,
-                    'revenue': revenue,
-                    'fuel_cost': fuel_cost,
-                    'other_expenses': other_expenses,
-                    'profit': profit,
-                    'fuel_consumed': fuel_consumed
-                })
-            total_trips = len(trip_data)
-            total_distance = sum(t['distance'] for t in trip_data)
-            total_revenue = sum(t['revenue'] for t in trip_data)
-            total_profit = total_revenue - sum(t['other_expenses'] for t in trip_data)
-            avg_revenue_per_trip = total_revenue / total_trips if total_trips > 0 else 0
-            avg_distance_per_trip = total_distance / total_trips if total_trips > 0 else 0
-            employee_performance.append({
-                'employee_number': employee.get('employee_number'),
-                'full_name': f"{employee.get('first_name', '')} {employee.get('last_name', '')}".strip(),
-                'position': employee.get('position'),
-                'total_trips': total_trips,
-                'total_distance': total_distance,
-                'total_revenue': total_revenue,
-                'total_profit': total_profit,
-                'avg_revenue_per_trip': avg_revenue_per_trip,
-                'avg_distance_per_trip': avg_distance_per_trip,
-                'productivity_score': (total_trips * 10 + total_distance * 0.1) if total_trips > 0 else 0
-            })
-        report_data = {
-            'report_type': 'Employee Performance Report',
-            'generated_at': datetime.utcnow().isoformat(),
-            'employees': employee_performance
-        }
-        if export_format == 'csv':
-            return export_to_csv(employee_performance, 'employee_performance_report.csv', [
-                'employee_number', 'full_name', 'position', 'total_trips', 'total_distance',
-                'total_revenue', 'total_profit', 'avg_revenue_per_trip', 'avg_distance_per_trip',
-                'productivity_score'
-            ])
+        trip_filter['driver_id'] = {'$in': [str(employee['_id']) for employee in employees]}
+        trips = find_trips(trip_filter)
+        check_deadline()
+        report_data = build_employee_performance(employees, trips, subtrip_revenues(trips))
+        if request.args.get('format') == 'csv':
+            return export_to_csv(report_data['employees'], 'employee_performance_report.csv', EMPLOYEE_PERFORMANCE_COLUMNS)
         return jsonify(report_data)
     except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
         return jsonify({'error': str(e)}), 500
 
 @reports_bp.route('/reports/financial_summary', methods=['GET'])
+@heavy_route
 def financial_summary_report():
     try:
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        truck_id = request.args.get('truck_id')
-        region = request.args.get('region')
-        export_format = request.args.get('format')
-
-        date_filter = {}
-        if start_date and end_date:
-            date_filter = {
-                '$gte': datetime.fromisoformat(start_date),
-                '$lte': datetime.fromisoformat(end_date)
-            }
-        trip_filter = {}
-        if date_filter:
-            trip_filter['start_date'] = date_filter
-        if truck_id:
-            trip_filter['truck_id'] = truck_id
-        expense_filter = {}
-        if date_filter:
-            expense_filter['expense_date'] = date_filter
-        if truck_id:
-            expense_filter['truck_id'] = truck_id
-        trips = Trip.find_all(trip_filter)
+        trip_filter, expense_filter = financial_summary_filters(request.args)
+        trips = find_trips(trip_filter)
         expenses = Expense.find_all(expense_filter)
-        # Use subtrip revenue for all trips
-        total_revenue = 0.0
-        for trip in trips:
-            subtrips = SubTrip.find_all({'trip_id': str(trip.get('_id'))})
-            total_revenue += sum(float(st.get('cost', 0) or 0) for st in subtrips)
-        total_trip_expenses = sum(float(trip.get('other_expenses', 0) or 0) for trip in trips)
-        total_other_expenses = sum(float(expense.get('amount', 0) or 0) for expense in expenses)
-        total_expenses = total_trip_expenses + total_other_expenses
-        total_profit = total_revenue - total_expenses
-        profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
-        monthly_data = {}
-        for trip in trips:
-            if trip.get('start_date'):
-                month_key = trip['start_date'].strftime('%Y-%m')
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'revenue': 0.0, 'expenses': 0.0, 'profit': 0.0}
-                subtrips = SubTrip.find_all({'trip_id': str(trip.get('_id'))})
-                trip_revenue = sum(float(st.get('cost', 0) or 0) for st in subtrips)
-                monthly_data[month_key]['revenue'] += trip_revenue
-                monthly_data[month_key]['expenses'] += float(trip.get('other_expenses', 0) or 0)
-        for expense in expenses:
-            if expense.get('expense_date'):
-                month_key = expense['expense_date'].strftime('%Y-%m')
-                if month_key not in monthly_data:
-                    monthly_data[month_key] = {'revenue': 0.0, 'expenses': 0.0, 'profit': 0.0}
-                monthly_data[month_key]['expenses'] += float(expense.get('amount', 0) or 0)
-        for month in monthly_data:
-            monthly_data[month]['profit'] = monthly_data[month]['revenue'] - monthly_data[month]['expenses']
-        report_data = {
-            'report_type': 'Financial Summary Report',
-            'generated_at': datetime.utcnow().isoformat(),
-            'summary': {
-                'total_revenue': total_revenue,
-                'total_expenses': total_expenses,
-                'total_profit': total_profit,
-                'profit_margin': profit_margin
-            },
-            'monthly_breakdown': monthly_data
-        }
-        if export_format == 'csv':
-            monthly_csv = []
-            for month, data in monthly_data.items():
-                monthly_csv.append({
-                    'month': month,
-                    'revenue': data['revenue'],
-                    'expenses': data['expenses'],
-                    'profit': data['profit']
-                })
-            return export_to_csv(monthly_csv, 'financial_summary_report.csv', [
-                'month', 'revenue', 'expenses', 'profit'
-            ])
+        check_deadline()
+        report_data = build_financial_summary(trips, expenses, subtrip_revenues(trips))
+        if request.args.get('format') == 'csv':
+            return export_to_csv(financial_summary_csv_rows(report_data), 'financial_summary_report.csv', FINANCIAL_SUMMARY_COLUMNS)
         return jsonify(report_data)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        if is_deadline_error(e):
+            return deadline_response()
+        return jsonify({'error': str(e)}), 500
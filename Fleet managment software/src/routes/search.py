@@ -0,0 +1,236 @@
+import logging
+import re
+import unicodedata
+from datetime import datetime
+from flask import Blueprint, jsonify, request
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+import click
+from src.models.mongo_models import ClientPayment, Employee, SearchEntry, SubTrip, SubTripArchive, Trip, TripArchive, Truck
+
+search_bp = Blueprint('search', __name__)
+logger = logging.getLogger(__name__)
+
+SEARCH_TYPES = ('truck', 'employee', 'driver', 'trip', 'client')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+CANDIDATES_PER_RESULT = 5
+REBUILD_BATCH_SIZE = 1000
+
+# ---- Normalized keys ----
+#
+# Each entry stores `keys`: every word of its searchable fields plus each
+# field with the separators removed, lowercased and accent-free, e.g.
+# 'TN-01 AB 1234' -> ['tn', '01', 'ab', '1234', 'tn01ab1234'].  A query
+# matches when each of its words is a prefix of some key (or the whole query,
+# run together, is), which the multikey index on `keys` answers directly.
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode().lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).strip()
+
+def search_keys(*values):
+    keys = []
+    for value in values:
+        if value in (None, ''):
+            continue
+        words = normalize(value).split()
+        keys.extend(words)
+        if len(words) > 1:
+            keys.append(''.join(words))
+    return sorted(set(keys))
+
+def truck_entry(truck):
+    return {
+        '_id': f"truck:{truck['_id']}",
+        'type': 'truck',
+        'ref_id': str(truck['_id']),
+        'label': truck.get('truck_number', ''),
+        'detail': ' · '.join(filter(None, [truck.get('license_plate'), f"{truck.get('make', '')} {truck.get('model', '')}".strip()])),
+        'keys': search_keys(truck.get('truck_number'), truck.get('license_plate'), truck.get('vin')),
+    }
+
+def employee_entry(employee):
+    full_name = f"{employee.get('first_name', '')} {employee.get('last_name', '')}".strip()
+    return {
+        '_id': f"employee:{employee['_id']}",
+        'type': 'employee',
+        'ref_id': str(employee['_id']),
+        'label': full_name,
+        'detail': ' · '.join(filter(None, [employee.get('employee_number'), employee.get('position')])),
+        'position': employee.get('position'),
+        'keys': search_keys(full_name, employee.get('employee_number')),
+    }
+
+def trip_entry(trip):
+    start_date = trip.get('start_date')
+    return {
+        '_id': f"trip:{trip['_id']}",
+        'type': 'trip',
+        'ref_id': str(trip['_id']),
+        'label': trip.get('trip_number', ''),
+        'detail': start_date.strftime('%Y-%m-%d') if hasattr(start_date, 'strftime') else '',
+        'keys': search_keys(trip.get('trip_number')),
+    }
+
+def client_entry(client_name):
+    return {
+        '_id': f'client:{client_name}',
+        'type': 'client',
+        'ref_id': client_name,
+        'label': client_name,
+        'detail': '',
+        'keys': search_keys(client_name),
+    }
+
+# ---- Index maintenance, called from the write endpoints ----
+
+def index_entries(entries):
+    """Upsert search entries. Failures are logged, not raised: `flask search rebuild` repairs the index."""
+    entries = [entry for entry in entries if entry['label']]
+    if not entries:
+        return
+    # `rebuild` drops entries not written since it started
+    now = datetime.utcnow()
+    try:
+        SearchEntry.get_collection().bulk_write(
+            [ReplaceOne({'_id': entry['_id']}, {**entry, 'indexed_at': now}, upsert=True) for entry in entries],
+            ordered=False,
+        )
+    except PyMongoError as e:
+        logger.warning('Could not update the search index: %s', e)
+
+def index_truck(truck):
+    index_entries([truck_entry(truck)])
+
+def index_employee(employee):
+    index_entries([employee_entry(employee)])
+
+def index_trips(trips):
+    index_entries([trip_entry(trip) for trip in trips])
+
+def index_clients(client_names):
+    index_entries([client_entry(name) for name in set(client_names) if name])
+
+CLIENT_SOURCES = (SubTrip, SubTripArchive, ClientPayment)
+
+def unindex_client_if_unused(client_name):
+    """Drop a client's entry once no sub-trip (hot or archived) or client payment references it."""
+    try:
+        if client_name and not any(
+            model.get_collection().find_one({'client_name': client_name}, {'_id': 1}) for model in CLIENT_SOURCES
+        ):
+            SearchEntry.get_collection().delete_one({'_id': f'client:{client_name}'})
+    except PyMongoError as e:
+        logger.warning('Could not update the search index: %s', e)
+
+# ---- Query ----
+
+def with_types(filter_dict, types):
+    type_filters = []
+    plain_types = [t for t in types if t != 'driver']
+    if plain_types:
+        type_filters.append({'type': {'$in': plain_types}})
+    if 'driver' in types and 'employee' not in types:
+        type_filters.append({'type': 'employee', 'position': 'driver'})
+    if type_filters and set(types) != set(SEARCH_TYPES):
+        filter_dict = {'$and': [filter_dict, {'$or': type_filters}]}
+    return filter_dict
+
+def search_filter(query, types):
+    words = query.split()
+    joined = ''.join(words)
+    word_match = {'$and': [{'keys': {'$regex': f'^{re.escape(word)}'}} for word in words]}
+    filter_dict = {'$or': [{'keys': {'$regex': f'^{re.escape(joined)}'}}, word_match]} if len(words) > 1 else word_match
+    return with_types(filter_dict, types)
+
+def score(entry, query):
+    """Exact key > whole-query prefix > all words matched; shorter labels win ties."""
+    joined = query.replace(' ', '')
+    keys = entry['keys']
+    if joined in keys:
+        rank = 3
+    elif any(key.startswith(joined) for key in keys):
+        rank = 2
+    else:
+        rank = 1
+    return rank * 100 - min(len(entry['label']), 99)
+
+def search(query, types, limit):
+    query = normalize(query)
+    if not query:
+        return []
+    collection = SearchEntry.get_collection()
+    projection = {'keys': 1, 'type': 1, 'ref_id': 1, 'label': 1, 'detail': 1}
+    # Exact key matches rank highest, so fetch them first: the prefix scan below is
+    # cut off in index order and could otherwise miss them for a short, common prefix
+    exact = collection.find(with_types({'keys': query.replace(' ', '')}, types), projection).limit(limit)
+    candidates = {entry['_id']: entry for entry in exact}
+    for entry in collection.find(search_filter(query, types), projection).limit(limit * CANDIDATES_PER_RESULT):
+        candidates.setdefault(entry['_id'], entry)
+    ranked = sorted(candidates.values(), key=lambda entry: (-score(entry, query), entry['label']))
+    return [
+        {'type': entry['type'], 'id': entry['ref_id'], 'label': entry['label'],
+         'detail': entry.get('detail', ''), 'score': score(entry, query)}
+        for entry in ranked[:limit]
+    ]
+
+@search_bp.route('/search', methods=['GET'])
+def search_all():
+    """Typeahead over trucks, employees, trips and clients: ?q=&types=truck,driver&limit="""
+    try:
+        types = [t for t in request.args.get('types', '').split(',') if t] or list(SEARCH_TYPES)
+        unknown = [t for t in types if t not in SEARCH_TYPES]
+        if unknown:
+            return jsonify({'error': f"Unknown type(s): {', '.join(unknown)}; expected {', '.join(SEARCH_TYPES)}"}), 400
+        try:
+            limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        q = request.args.get('q', '')
+        return jsonify({'query': q, 'results': search(q, types, limit)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ---- Backfill ----
+
+def rebuild_search_index():
+    """Re-create every entry from the source collections; returns {type: entries written, 'removed': stale entries}."""
+    collection = SearchEntry.get_collection()
+    started = datetime.utcnow()
+    counts = {}
+    sources = [
+        ('truck', Truck, truck_entry, {'truck_number': 1, 'license_plate': 1, 'vin': 1, 'make': 1, 'model': 1}),
+        ('employee', Employee, employee_entry, {'first_name': 1, 'last_name': 1, 'employee_number': 1, 'position': 1}),
+        ('trip', Trip, trip_entry, {'trip_number': 1, 'start_date': 1}),
+        # Archived trips stay searchable: GET /api/trips/<id> still finds them
+        ('trip', TripArchive, trip_entry, {'trip_number': 1, 'start_date': 1}),
+    ]
+    for entry_type, model, build_entry, projection in sources:
+        counts.setdefault(entry_type, 0)
+        batch = []
+        for doc in model.get_collection().find({}, projection):
+            batch.append(build_entry(doc))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                index_entries(batch)
+                counts[entry_type] += len(batch)
+                batch = []
+        index_entries(batch)
+        counts[entry_type] += len(batch)
+    client_names = sorted({
+        name for model in CLIENT_SOURCES for name in model.get_collection().distinct('client_name') if name
+    })
+    for start in range(0, len(client_names), REBUILD_BATCH_SIZE):
+        index_clients(client_names[start:start + REBUILD_BATCH_SIZE])
+    counts['client'] = len(client_names)
+    # Every live source was rewritten above, and the write endpoints stamp their own
+    # entries too, so anything not written since the start has no source any more
+    stale = collection.delete_many({'indexed_at': {'$not': {'$gte': started}}})
+    counts['removed'] = stale.deleted_count
+    return counts
+
+@search_bp.cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the search index from trucks, employees, trips and sub-trip clients."""
+    counts = rebuild_search_index()
+    click.echo(', '.join(f'{count} {name}' for name, count in counts.items()))
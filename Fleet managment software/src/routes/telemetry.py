@@ -0,0 +1,157 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from flask import Blueprint, current_app, jsonify, request
+from src.models.mongo_models import Truck, TruckTelemetry, bson_to_str
+from src.models.write_buffer import GroupCommitBuffer
+
+telemetry_bp = Blueprint('telemetry', __name__)
+telemetry_buffer = GroupCommitBuffer(TruckTelemetry.bucket_updates)
+
+POINT_FIELDS = ('lat', 'lon', 'odometer', 'fuel_level', 'speed')
+MAX_REPORTED_ERRORS = 10
+DEFAULT_RANGE = timedelta(hours=24)
+MAX_RANGE_POINTS = 10000
+
+# ---- Ingest ----
+#
+# Devices (or a gateway in front of them) POST newline-delimited JSON, one
+# ping per line:
+#   {"truck_id": "<Truck _id>", "ts": "2024-05-01T10:00:00Z", "lat": 12.97, "lon": 77.59,
+#    "odometer": 120345.2, "fuel_level": 61.5, "speed": 54}
+# ts may also be epoch seconds.  Valid lines are buffered and group-committed
+# into hourly buckets; invalid lines are counted and reported, not fatal.
+
+def parse_timestamp(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None)
+    if isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    raise ValueError('ts must be an ISO timestamp or epoch seconds')
+
+def parse_point(line):
+    """One NDJSON line -> stored point {'truck_id', 't', <fields>}; raises ValueError when invalid."""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        raise ValueError('not valid JSON')
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object')
+    truck_id = data.get('truck_id')
+    if not isinstance(truck_id, str) or not ObjectId.is_valid(truck_id):
+        raise ValueError('truck_id must be a truck id')
+    if 'ts' not in data:
+        raise ValueError('missing ts')
+    # 't' first: points sort and compare by time
+    point = {'truck_id': truck_id, 't': parse_timestamp(data['ts'])}
+    for field in POINT_FIELDS:
+        value = data.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f'{field} must be a number')
+        point[field] = float(value)
+    return point
+
+def read_ndjson():
+    body = request.get_data()
+    if request.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return body.splitlines()
+
+@telemetry_bp.route('/telemetry', methods=['POST'])
+def ingest_telemetry():
+    """Accept a batch of NDJSON pings; 202 once buffered (or written, when buffering is off)."""
+    try:
+        try:
+            lines = read_ndjson()
+        except (OSError, EOFError):
+            return jsonify({'error': 'Body is not valid gzip'}), 400
+        points, errors = [], []
+        rejected = 0
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                points.append(parse_point(line))
+            except ValueError as e:
+                rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'line': number, 'error': str(e)})
+        result = {'accepted': len(points), 'rejected': rejected, 'errors': errors}
+        if not points:
+            return jsonify(result), 400 if rejected else 202
+
+        config = current_app.config
+        collection = TruckTelemetry.get_collection()
+        if config['TELEMETRY_FLUSH_INTERVAL']:
+            buffered = telemetry_buffer.add(
+                collection, points, config['TELEMETRY_FLUSH_INTERVAL'],
+                config['TELEMETRY_FLUSH_SIZE'], config['TELEMETRY_MAX_PENDING'],
+            )
+            if not buffered:
+                # Writes are falling behind: make the sender back off and resend this batch
+                response = jsonify({'error': 'Telemetry buffer is full, please retry shortly'})
+                response.status_code = 503
+                response.headers['Retry-After'] = '1'
+                return response
+        else:
+            collection.bulk_write([update for update, _ in TruckTelemetry.bucket_updates(points)], ordered=False)
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ---- Queries ----
+
+def point_to_dict(point):
+    return bson_to_str(point)
+
+@telemetry_bp.route('/trucks/<truck_id>/telemetry/latest', methods=['GET'])
+def get_latest_position(truck_id):
+    """The truck's most recent written ping (buffered pings appear after the next flush)."""
+    try:
+        # The newest bucket holds the newest ping; points inside it may have arrived out of order
+        bucket = TruckTelemetry.get_collection().find_one(
+            {'truck_id': truck_id}, {'points': 1}, sort=[('hour', -1)]
+        )
+        if not bucket:
+            if Truck.find_version(truck_id) is None:
+                return jsonify({'error': 'Truck not found'}), 404
+            return jsonify({'truck_id': truck_id, 'position': None})
+        latest = max(bucket['points'], key=lambda point: point['t'])
+        return jsonify({'truck_id': truck_id, 'position': point_to_dict(latest)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@telemetry_bp.route('/trucks/<truck_id>/telemetry', methods=['GET'])
+def get_telemetry_range(truck_id):
+    """Pings between start_date and end_date (default: the last 24 hours), oldest first: ?start_date=&end_date=&limit="""
+    try:
+        try:
+            end = parse_timestamp(request.args['end_date']) if request.args.get('end_date') else datetime.utcnow()
+            start = parse_timestamp(request.args['start_date']) if request.args.get('start_date') else end - DEFAULT_RANGE
+            limit = min(max(int(request.args.get('limit', MAX_RANGE_POINTS)), 1), MAX_RANGE_POINTS)
+        except ValueError:
+            return jsonify({'error': 'start_date/end_date must be ISO timestamps and limit an integer'}), 400
+        if start > end:
+            return jsonify({'error': 'start_date must not be after end_date'}), 400
+
+        buckets = TruckTelemetry.get_collection().find(
+            {'truck_id': truck_id, 'hour': {'$gte': TruckTelemetry.bucket_hour(start), '$lte': end}},
+            {'points': 1},
+        ).sort('hour', 1)
+        points = [point for bucket in buckets for point in bucket['points'] if start <= point['t'] <= end]
+        points.sort(key=lambda point: point['t'])
+        return jsonify({
+            'truck_id': truck_id,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'points': [point_to_dict(point) for point in points[:limit]],
+            'truncated': len(points) > limit,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
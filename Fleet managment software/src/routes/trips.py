@@ -1,57 +1,287 @@
 from flask import Blueprint, jsonify, request
 from datetime import datetime
-from src.models.mongo_models import Trip, SubTrip
+from src.models.mongo_models import Trip, SubTrip, Truck, Employee, TripArchive, SubTripArchive, Tombstone
+from src.routes.archive import find_trips
+from src.routes.search import index_clients, index_trips, unindex_client_if_unused
+from src.routes.lanes import move_subtrip, record_subtrips, unrecord_subtrip
+from src.routes.fuel import record_completed_trips
+from src.deadline import deadline_response, is_deadline_error
+from src.conditional import document_version, documents_version, is_conditional, is_fresh, not_modified, with_validators
+from src.multiget import in_request_order, requested_ids
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+import click
 
 trips_bp = Blueprint('trips', __name__)
 
+MAX_BULK_IDS = 1000
+
 def parse_float(val, default=0.0):
     try:
         return float(val)
     except (TypeError, ValueError):
         return default
 
-def update_trip_revenue(trip_id):
-    """Sum all subtrip costs and update the parent trip's revenue."""
-    subtrips = SubTrip.find_all({'trip_id': trip_id})
-    total_revenue = sum(float(sub.get('cost', 0) or 0) for sub in subtrips)
-    Trip.update_one(trip_id, {'revenue': total_revenue})
+def clean_text(value):
+    return value.strip() if isinstance(value, str) else value
+
+def adjust_trip_revenue(trip_id, delta):
+    """Atomically shift the parent trip's revenue by a sub-trip cost delta."""
+    if delta:
+        Trip.increment_one(trip_id, {'revenue': delta})
+
+def reconcile_trip_revenues(trip_ids=None, dry_run=False, batch_size=1000):
+    """Check stored trip revenues against their sub-trip costs and repair any drift.
+
+    Sums sub-trip costs per trip with one aggregation, then rewrites only the
+    mismatching trips with bulk_write. Returns (checked, repaired).
+    """
+    pipeline = [{'$group': {'_id': '$trip_id', 'revenue': {'$sum': '$cost'}}}]
+    trip_filter = {}
+    if trip_ids is not None:
+        trip_ids = [tid for tid in set(trip_ids) if ObjectId.is_valid(tid)]
+        if not trip_ids:
+            return 0, 0
+        pipeline.insert(0, {'$match': {'trip_id': {'$in': trip_ids}}})
+        trip_filter = {'_id': {'$in': [ObjectId(tid) for tid in trip_ids]}}
+    totals = {
+        row['_id']: float(row['revenue'] or 0)
+        for row in SubTrip.get_collection().aggregate(pipeline, allowDiskUse=True)
+    }
+
+    trip_collection = Trip.get_collection()
+    checked = repaired = 0
+    requests = []
+    now = datetime.utcnow()
+    for trip in trip_collection.find(trip_filter, {'revenue': 1}):
+        checked += 1
+        expected = totals.get(str(trip['_id']), 0.0)
+        if abs(parse_float(trip.get('revenue'), 0) - expected) <= 1e-6:
+            continue
+        repaired += 1
+        if dry_run:
+            continue
+        requests.append(UpdateOne({'_id': trip['_id']}, {'$set': {'revenue': expected, 'updated_at': now}}))
+        if len(requests) >= batch_size:
+            trip_collection.bulk_write(requests, ordered=False)
+            requests = []
+    if requests:
+        trip_collection.bulk_write(requests, ordered=False)
+    return checked, repaired
+
+@trips_bp.cli.command('reconcile-revenue')
+@click.option('--dry-run', is_flag=True, help='Only report trips whose revenue has drifted.')
+def reconcile_revenue_command(dry_run):
+    """Check every trip's revenue against its sub-trips and repair mismatches."""
+    checked, repaired = reconcile_trip_revenues(dry_run=dry_run)
+    action = 'would be repaired' if dry_run else 'repaired'
+    click.echo(f'Checked {checked} trips, {repaired} {action}.')
+
+def build_trip_doc(data):
+    """Validate a trip payload and return (trip_doc, error)."""
+    required_fields = ['trip_number', 'truck_id', 'driver_id']
+    for field in required_fields:
+        if field not in data:
+            return None, f'Missing required field: {field}'
+
+    trip_doc = {
+        'trip_number': data['trip_number'],
+        'truck_id': data['truck_id'],
+        'driver_id': data['driver_id'],
+        'start_date': datetime.fromisoformat(data['start_date']),
+        'end_date': datetime.fromisoformat(data['end_date']) if data.get('end_date') else None,
+        'distance_km': parse_float(data.get('distance_km', 0)),
+        'mileage': parse_float(data.get('mileage', 0)),
+        'revenue': parse_float(data.get('revenue', 0)),
+        'fuel_consumed': parse_float(data.get('fuel_consumed', 0)),
+        'fuel_cost': parse_float(data.get('fuel_cost', 0)),
+        'toll': parse_float(data.get('toll', 0)),
+        'rto': parse_float(data.get('rto', 0)),
+        'adblue': parse_float(data.get('adblue', 0)),
+        'driver_salary': parse_float(data.get('driver_salary', 0)),
+        'labour_charges': parse_float(data.get('labour_charges', 0)),
+        'extra_expense': parse_float(data.get('extra_expense', 0)),
+        'other_expenses': parse_float(data.get('other_expenses', 0)),
+        'profit': parse_float(data.get('profit', 0)),
+        'status': data.get('status', 'planned'),
+        'notes': data.get('notes', ''),
+    }
+    return trip_doc, None
+
+def build_subtrip_doc(trip_id, data):
+    """Validate a sub-trip payload and return (subtrip_doc, error)."""
+    required_fields = ['date', 'end_date', 'origin', 'destination', 'client_name', 'cargo_weight', 'cost']
+    for field in required_fields:
+        if field not in data:
+            return None, f'Missing required field: {field}'
+
+    # Validation
+    date_val = datetime.fromisoformat(data['date'])
+    end_date_val = datetime.fromisoformat(data['end_date'])
+    if date_val > end_date_val:
+        return None, 'Date cannot be after End Date'
+
+    subtrip_doc = {
+        'trip_id': trip_id,
+        'date': data['date'],
+        'end_date': data['end_date'],
+        'origin': clean_text(data['origin']),
+        'destination': clean_text(data['destination']),
+        'client_name': data['client_name'],
+        'cargo_weight': parse_float(data.get('cargo_weight', 0)),
+        'cost': parse_float(data.get('cost', 0))
+    }
+    return subtrip_doc, None
+
+def trip_list_filter(args):
+    """Build the trips query from list filters (truck, driver, status, start_date range)."""
+    truck_id = args.get('truck_id', '')
+    driver_id = args.get('driver_id', '')
+    status = args.get('status', '')
+    start_date = args.get('start_date', '')
+    end_date = args.get('end_date', '')
+
+    filter_dict = {}
+    if truck_id:
+        filter_dict['truck_id'] = truck_id
+    if driver_id:
+        filter_dict['driver_id'] = driver_id
+    if status:
+        filter_dict['status'] = status
+
+    # Date range filtering
+    if start_date or end_date:
+        date_filter = {}
+        if start_date:
+            date_filter['$gte'] = datetime.fromisoformat(start_date)
+        if end_date:
+            date_filter['$lte'] = datetime.fromisoformat(end_date)
+        filter_dict['start_date'] = date_filter
+    return filter_dict
+
+def overlaps(trip, start, end):
+    return trip['start_date'] < end and start < Trip.trip_end(trip)
+
+def schedule_conflict(trip, exclude_id=None, pending=()):
+    """(error payload, status) if the trip's dates are invalid or its truck or driver is already booked, else None.
+
+    `pending` lists trips about to be written with this one, which the database cannot see yet.
+    """
+    if trip.get('status') == 'cancelled' or not trip.get('start_date'):
+        return None
+    start, end = trip['start_date'], Trip.trip_end(trip)
+    if end < start:
+        return {'error': 'Start Date cannot be after End Date'}, 400
+    for field, label in (('truck_id', 'Truck'), ('driver_id', 'Driver')):
+        if not trip.get(field):
+            continue
+        conflict = Trip.find_overlap(field, trip[field], start, end, exclude_id) or next(
+            (other for other in pending if other.get(field) == trip[field] and overlaps(other, start, end)), None
+        )
+        if conflict:
+            return {
+                'error': f"{label} is already assigned to trip {conflict.get('trip_number', '')} in this period",
+                'conflict': {
+                    'field': field,
+                    'trip_id': str(conflict['_id']) if '_id' in conflict else None,
+                    'trip_number': conflict.get('trip_number', ''),
+                    'start_date': conflict['start_date'].isoformat(),
+                    'end_date': Trip.trip_end(conflict).isoformat(),
+                },
+            }, 409
+    return None
+
+def schedule_conflict_response(trip, exclude_id=None):
+    """Return a 409 response if the trip's truck or driver already has an overlapping trip, else None."""
+    problem = schedule_conflict(trip, exclude_id)
+    if problem is None:
+        return None
+    payload, status = problem
+    return jsonify(payload), status
+
+def reactivation_conflicts(ids, status):
+    """Schedule conflicts of the cancelled trips among ids that a bulk change to `status` would put back on the schedule.
+
+    Trips that are not cancelled keep their dates and are already on the
+    schedule, so a status change cannot make them overlap anything new.
+    """
+    object_ids = [ObjectId(doc_id) for doc_id in ids if ObjectId.is_valid(doc_id)]
+    conflicts = []
+    reactivated = []
+    for trip in Trip.get_collection().find({'_id': {'$in': object_ids}, 'status': 'cancelled'}):
+        trip = {**trip, 'status': status}
+        problem = schedule_conflict(trip, exclude_id=trip['_id'], pending=reactivated)
+        if problem:
+            conflicts.append({'id': str(trip['_id']), **problem[0]})
+        else:
+            reactivated.append(trip)
+    return conflicts
+
+def reference_versions():
+    # Trip payloads embed truck numbers and driver names, so any truck or employee change invalidates them
+    return [Truck.collection_version(), Employee.collection_version()]
+
+def embedded_versions(trip, trucks, drivers):
+    """Versions of the one truck and driver a trip payload embeds; (None, 0) for a missing one."""
+    truck = trucks.get(str(trip.get('truck_id')))
+    driver = drivers.get(str(trip.get('driver_id')))
+    return [document_version(doc) or (None, 0) for doc in (truck, driver)]
 
 @trips_bp.route('/trips', methods=['GET'])
 def get_trips():
-    try:
-        truck_id = request.args.get('truck_id', '')
-        driver_id = request.args.get('driver_id', '')
-        status = request.args.get('status', '')
-        start_date = request.args.get('start_date', '')
-        end_date = request.args.get('end_date', '')
-
-        filter_dict = {}
-        if truck_id:
-            filter_dict['truck_id'] = truck_id
-        if driver_id:
-            filter_dict['driver_id'] = driver_id
-        if status:
-            filter_dict['status'] = status
-
-        # Date range filtering
-        if start_date or end_date:
-            date_filter = {}
-            if start_date:
-                date_filter['$gte'] = datetime.fromisoformat(start_date)
-            if end_date:
-                date_filter['$lte'] = datetime.fromisoformat(end_date)
-            filter_dict['start_date'] = date_filter
-
-        trips = Trip.find_all(filter_dict)
-        trip_list = []
-        for trip in trips:
-            trip_dict = Trip.to_dict_populated(trip)
-            trip_list.append(trip_dict)
+    """List trips from the hot tier; ?include_archived=1 adds archived trips when the date range needs them.
 
-        return jsonify({
+    ?ids=a,b,c returns those trips instead (see get_trips_by_ids).
+    """
+    try:
+        if 'ids' in request.args:
+            return get_trips_by_ids()
+        filter_dict = trip_list_filter(request.args)
+        include_archived = request.args.get('include_archived') == '1'
+        references = reference_versions()
+        if include_archived:
+            references.append(TripArchive.collection_version(filter_dict))
+        if is_conditional():
+            version = Trip.collection_version(filter_dict)
+            if is_fresh(version, *references):
+                return not_modified(version, *references)
+        trips = find_trips(filter_dict) if include_archived else Trip.find_all(filter_dict)
+        # Resolve every referenced truck and driver with one query each
+        trucks = Truck.find_by_ids({trip.get('truck_id') for trip in trips})
+        drivers = Employee.find_by_ids({trip.get('driver_id') for trip in trips})
+        trip_list = [Trip.to_dict_populated(trip, trucks, drivers) for trip in trips]
+
+        # Versioned like the 304 check: the hot tier's own version, with the archive's in references
+        hot_trips = [trip for trip in trips if not trip.get('archived_at')]
+        return with_validators(jsonify({
             'trips': trip_list
-        })
+        }), documents_version(hot_trips), *references)
+    except Exception as e:
+        if is_deadline_error(e):
+            return deadline_response()
+        return jsonify({'error': str(e)}), 500
+
+@trips_bp.route('/trips/lookup', methods=['POST'])
+def get_trips_by_ids():
+    """Get many trips by id in one query; body {"ids": [...]}. Archived trips are found too."""
+    try:
+        ids, error = requested_ids()
+        if error:
+            return jsonify({'error': error}), 400
+        found = Trip.find_by_ids(ids)
+        if len(found) < len(ids):
+            # Only ids missing from the hot tier cost a second $in, on the archive
+            found.update(TripArchive.find_by_ids([doc_id for doc_id in ids if doc_id not in found]))
+        trips, missing = in_request_order(ids, found)
+        versions = (documents_version(trips), *reference_versions())
+        if is_fresh(*versions):
+            return not_modified(*versions)
+        trucks = Truck.find_by_ids({trip.get('truck_id') for trip in trips})
+        drivers = Employee.find_by_ids({trip.get('driver_id') for trip in trips})
+        return with_validators(jsonify({
+            'trips': [Trip.to_dict_populated(trip, trucks, drivers) for trip in trips],
+            'missing': missing
+        }), *versions)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,13 +289,28 @@ def get_trips():
 def get_trip(trip_id):
     try:
         trip = Trip.find_by_id(trip_id)
-        if trip:
-            trip_dict = Trip.to_dict_populated(trip)
-            # Get subtrips for this trip
-            subtrips = SubTrip.find_all({'trip_id': trip_id})
-            trip_dict['subtrips'] = [SubTrip.to_dict(sub) for sub in subtrips]
-            return jsonify({'trip': trip_dict})
-        return jsonify({'error': 'Trip not found'}), 404
+        subtrip_model = SubTrip
+        if not trip:
+            # Archived trips stay readable by id
+            trip = TripArchive.find_by_id(trip_id)
+            subtrip_model = SubTripArchive
+        if not trip:
+            return jsonify({'error': 'Trip not found'}), 404
+        trucks = Truck.find_by_ids([trip.get('truck_id')])
+        drivers = Employee.find_by_ids([trip.get('driver_id')])
+        references = embedded_versions(trip, trucks, drivers)
+        if is_conditional():
+            versions = (document_version(trip), subtrip_model.collection_version({'trip_id': trip_id}), *references)
+            if is_fresh(*versions):
+                return not_modified(*versions)
+        trip_dict = Trip.to_dict_populated(trip, trucks, drivers)
+        # Get subtrips for this trip
+        subtrips = subtrip_model.find_all({'trip_id': trip_id})
+        trip_dict['subtrips'] = [SubTrip.to_dict(sub) for sub in subtrips]
+        return with_validators(
+            jsonify({'trip': trip_dict}),
+            document_version(trip), documents_version(subtrips), *references
+        )
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -73,40 +318,21 @@ def get_trip(trip_id):
 def create_trip():
     try:
         data = request.get_json()
-        required_fields = ['trip_number', 'truck_id', 'driver_id']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
+        trip_doc, error = build_trip_doc(data)
+        if error:
+            return jsonify({'error': error}), 400
 
         collection = Trip.get_collection()
         if collection.find_one({'trip_number': data['trip_number']}):
             return jsonify({'error': 'Trip number already exists'}), 400
-
-        trip_doc = {
-            'trip_number': data['trip_number'],
-            'truck_id': data['truck_id'],
-            'driver_id': data['driver_id'],
-            'start_date': datetime.fromisoformat(data['start_date']),
-            'end_date': datetime.fromisoformat(data['end_date']) if data.get('end_date') else None,
-            'distance_km': parse_float(data.get('distance_km', 0)),
-            'mileage': parse_float(data.get('mileage', 0)),
-            'revenue': parse_float(data.get('revenue', 0)),
-            'fuel_consumed': parse_float(data.get('fuel_consumed', 0)),
-            'fuel_cost': parse_float(data.get('fuel_cost', 0)),
-            'toll': parse_float(data.get('toll', 0)),
-            'rto': parse_float(data.get('rto', 0)),
-            'adblue': parse_float(data.get('adblue', 0)),
-            'driver_salary': parse_float(data.get('driver_salary', 0)),
-            'labour_charges': parse_float(data.get('labour_charges', 0)),
-            'extra_expense': parse_float(data.get('extra_expense', 0)),
-            'other_expenses': parse_float(data.get('other_expenses', 0)),
-            'profit': parse_float(data.get('profit', 0)),
-            'status': data.get('status', 'planned'),
-            'notes': data.get('notes', ''),
-        }
-
-        trip_id = Trip.insert_one(trip_doc)
-        trip = Trip.find_by_id(trip_id)
+        conflict = schedule_conflict_response(trip_doc)
+        if conflict:
+            return conflict
+
+        trip = Trip.insert_and_return(trip_doc)
+        index_trips([trip])
+        if trip['status'] == 'completed':
+            record_completed_trips([trip['_id']])
         return jsonify({
             'message': 'Trip created successfully',
             'trip': Trip.to_dict_populated(trip)
@@ -117,14 +343,13 @@ def create_trip():
 @trips_bp.route('/trips/<trip_id>', methods=['PUT'])
 def update_trip(trip_id):
     try:
-        trip = Trip.find_by_id(trip_id)
-        if not trip:
+        if not ObjectId.is_valid(trip_id):
             return jsonify({'error': 'Trip not found'}), 404
 
         data = request.get_json()
         collection = Trip.get_collection()
 
-        if 'trip_number' in data and data['trip_number'] != trip.get('trip_number'):
+        if 'trip_number' in data:
             if collection.find_one({'trip_number': data['trip_number'], '_id': {'$ne': ObjectId(trip_id)}}):
                 return jsonify({'error': 'Trip number already exists'}), 400
 
@@ -150,8 +375,20 @@ def update_trip(trip_id):
         if 'end_date' in data and data['end_date']:
             update_doc['end_date'] = datetime.fromisoformat(data['end_date'])
 
-        Trip.update_one(trip_id, update_doc)
-        updated_trip = Trip.find_by_id(trip_id)
+        if update_doc.keys() & {'truck_id', 'driver_id', 'start_date', 'end_date', 'status'}:
+            current = Trip.find_by_id(trip_id)
+            if not current:
+                return jsonify({'error': 'Trip not found'}), 404
+            conflict = schedule_conflict_response({**current, **update_doc}, exclude_id=current['_id'])
+            if conflict:
+                return conflict
+
+        updated_trip = Trip.update_and_return(trip_id, update_doc)
+        if not updated_trip:
+            return jsonify({'error': 'Trip not found'}), 404
+        index_trips([updated_trip])
+        if updated_trip.get('status') == 'completed':
+            record_completed_trips([updated_trip['_id']])
 
         return jsonify({
             'message': 'Trip updated successfully',
@@ -160,6 +397,38 @@ def update_trip(trip_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@trips_bp.route('/trips', methods=['PATCH'])
+def bulk_update_trip_status():
+    """Apply one status change to many trips"""
+    try:
+        data = request.get_json() or {}
+        ids = data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': 'ids must be a non-empty list'}), 400
+        if len(ids) > MAX_BULK_IDS:
+            return jsonify({'error': f'At most {MAX_BULK_IDS} ids per request'}), 400
+        if not data.get('status'):
+            return jsonify({'error': 'Missing required field: status'}), 400
+
+        if data['status'] != 'cancelled':
+            conflicts = reactivation_conflicts(ids, data['status'])
+            if conflicts:
+                return jsonify({
+                    'error': 'Trips would overlap another trip of the same truck or driver; nothing was updated',
+                    'conflicts': conflicts
+                }), 409
+
+        results, changed = Trip.update_many_by_ids(ids, {'status': data['status']})
+        if data['status'] == 'completed':
+            record_completed_trips(changed)
+        return jsonify({
+            'message': f'{len(changed)} trips updated',
+            'updated': len(changed),
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @trips_bp.route('/trips/<trip_id>', methods=['DELETE'])
 def delete_trip(trip_id):
     try:
@@ -182,6 +451,8 @@ def get_subtrips(trip_id):
     """Get all sub-trips for a parent trip"""
     try:
         subtrips = SubTrip.find_all({'trip_id': trip_id})
+        if not subtrips and TripArchive.find_version(trip_id):
+            subtrips = SubTripArchive.find_all({'trip_id': trip_id})
         subtrip_list = [SubTrip.to_dict(sub) for sub in subtrips]
         return jsonify({'subtrips': subtrip_list})
     except Exception as e:
@@ -192,30 +463,14 @@ def create_subtrip(trip_id):
     """Create a sub-trip linked to a trip"""
     try:
         data = request.get_json()
-        required_fields = ['date', 'end_date', 'origin', 'destination', 'client_name', 'cargo_weight', 'cost']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({'error': f'Missing required field: {field}'}), 400
-
-        # Validation
-        date_val = datetime.fromisoformat(data['date'])
-        end_date_val = datetime.fromisoformat(data['end_date'])
-        if date_val > end_date_val:
-            return jsonify({'error': 'Date cannot be after End Date'}), 400     
-
-        subtrip_doc = {
-            'trip_id': trip_id,
-            'date': data['date'],
-            'end_date': data['end_date'],
-            'origin': data['origin'],
-            'destination': data['destination'],
-            'client_name': data['client_name'],
-            'cargo_weight': parse_float(data.get('cargo_weight', 0)),
-            'cost': parse_float(data.get('cost', 0))
-        }
-        subtrip_id = SubTrip.insert_one(subtrip_doc)
-        update_trip_revenue(trip_id)  # <-- keep revenue in sync
-        subtrip = SubTrip.find_by_id(subtrip_id)
+        subtrip_doc, error = build_subtrip_doc(trip_id, data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        subtrip = SubTrip.insert_and_return(subtrip_doc)
+        adjust_trip_revenue(trip_id, subtrip_doc['cost'])  # <-- keep revenue in sync
+        index_clients([subtrip_doc['client_name']])
+        record_subtrips([subtrip_doc])
         return jsonify({'message': 'Sub Trip added', 'subtrip': SubTrip.to_dict(subtrip)}), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -224,10 +479,6 @@ def create_subtrip(trip_id):
 def update_subtrip(trip_id, subtrip_id):
     """Update a sub-trip"""
     try:
-        subtrip = SubTrip.find_by_id(subtrip_id)
-        if not subtrip or subtrip.get('trip_id') != trip_id:
-            return jsonify({'error': 'Sub Trip not found'}), 404
-
         data = request.get_json()
         updatable_fields = ['date', 'end_date', 'origin', 'destination', 'client_name', 'cargo_weight', 'cost']
         update_doc = {}
@@ -238,15 +489,27 @@ def update_subtrip(trip_id, subtrip_id):
                     if parsed < 0:
                         return jsonify({'error': f'{field.replace("_", " ").title()} must be ≥ 0'}), 400
                     update_doc[field] = parsed
+                elif field in ['origin', 'destination']:
+                    update_doc[field] = clean_text(data[field])
                 else:
                     update_doc[field] = data[field]
         if 'date' in update_doc and 'end_date' in update_doc:
             if update_doc['date'] > update_doc['end_date']:
                 return jsonify({'error': 'Date cannot be after End Date'}), 400
 
-        SubTrip.update_one(subtrip_id, update_doc)
-        update_trip_revenue(trip_id)  # <-- keep revenue in sync
-        updated = SubTrip.find_by_id(subtrip_id)
+        # Swap in the new values and get the old cost back in one atomic step
+        previous = SubTrip.update_and_return(
+            subtrip_id, update_doc, {'trip_id': trip_id}, return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
+            return jsonify({'error': 'Sub Trip not found'}), 404
+        if 'cost' in update_doc:
+            adjust_trip_revenue(trip_id, update_doc['cost'] - parse_float(previous.get('cost'), 0))  # <-- keep revenue in sync
+        if update_doc.get('client_name') and update_doc['client_name'] != previous.get('client_name'):
+            index_clients([update_doc['client_name']])
+            unindex_client_if_unused(previous.get('client_name'))
+        updated = {**previous, **update_doc}
+        move_subtrip(previous, updated)
         return jsonify({'message': 'Sub Trip updated', 'subtrip': SubTrip.to_dict(updated)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -255,11 +518,15 @@ def update_subtrip(trip_id, subtrip_id):
 def delete_subtrip(trip_id, subtrip_id):
     """Delete a sub-trip (hard delete)"""
     try:
-        subtrip = SubTrip.find_by_id(subtrip_id)
-        if not subtrip or subtrip.get('trip_id') != trip_id:
+        if not ObjectId.is_valid(subtrip_id):
+            return jsonify({'error': 'Sub Trip not found'}), 404
+        subtrip = SubTrip.get_collection().find_one_and_delete({'_id': ObjectId(subtrip_id), 'trip_id': trip_id})
+        if not subtrip:
             return jsonify({'error': 'Sub Trip not found'}), 404
-        SubTrip.delete_one(subtrip_id)
-        update_trip_revenue(trip_id)  # <-- keep revenue in sync
+        adjust_trip_revenue(trip_id, -parse_float(subtrip.get('cost'), 0))  # <-- keep revenue in sync
+        unindex_client_if_unused(subtrip.get('client_name'))
+        unrecord_subtrip(subtrip)
+        Tombstone.record('subtrips', subtrip['_id'])
         return jsonify({'message': 'Sub Trip deleted'})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
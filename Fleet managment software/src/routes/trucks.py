@@ -1,13 +1,52 @@
-from flask import Blueprint, jsonify, request
+import threading
+import time
+from flask import Blueprint, jsonify, request, current_app
 from bson import ObjectId
 from src.models.mongo_models import Truck
+from src.conditional import document_version, documents_version, is_conditional, is_fresh, not_modified, with_validators
+from src.multiget import in_request_order, requested_ids
+from src.models.write_buffer import IncrementBuffer
+from src.routes.search import index_truck
 
 trucks_bp = Blueprint('trucks', __name__)
+view_buffer = IncrementBuffer()
+# Buffered mode: truck documents served by /view, {truck_id: (expires_at, truck)}; see viewed_truck
+view_cache = {}
+view_cache_lock = threading.Lock()
+
+def viewed_truck(truck_id, max_age):
+    """Count a buffered view and return the truck with it, reading Mongo at most once per max_age seconds.
+
+    The cached document's view count is kept current with this process's own
+    views; views counted by other workers show up when it is reloaded.
+    Truck writes in this process evict it straight away.
+    """
+    now = time.monotonic()
+    with view_cache_lock:
+        entry = view_cache.get(truck_id)
+    if entry is None or entry[0] <= now:
+        truck = Truck.find_by_id(truck_id)
+        if not truck:
+            return None
+        # Views this process has buffered but not flushed yet are not in the stored count
+        truck['views'] = truck.get('views', 0) + view_buffer.pending(Truck.get_collection(), truck['_id']).get('views', 0)
+        entry = (now + max_age, truck)
+    view_buffer.add(Truck.get_collection(), entry[1]['_id'], {'views': 1}, max_age)
+    with view_cache_lock:
+        current = view_cache.get(truck_id)
+        if current is not None and current[0] > now:
+            # Count on top of views other requests recorded since this one read the cache
+            entry = current
+        truck = {**entry[1], 'views': entry[1].get('views', 0) + 1}
+        view_cache[truck_id] = (entry[0], truck)
+    return truck
 
 @trucks_bp.route('/trucks', methods=['GET'])
 def get_trucks():
-    """Get all trucks with optional filtering"""
+    """Get all trucks with optional filtering, or specific ones with ?ids=a,b,c"""
     try:
+        if 'ids' in request.args:
+            return get_trucks_by_ids()
         status = request.args.get('status', '')
         region = request.args.get('region', '')
         filter_dict = {}
@@ -15,9 +54,31 @@ def get_trucks():
             filter_dict['status'] = status
         if region:
             filter_dict['region'] = region
+        if is_conditional():
+            version = Truck.collection_version(filter_dict)
+            if is_fresh(version):
+                return not_modified(version)
         trucks = Truck.find_all(filter_dict)
         truck_list = [Truck.to_dict(truck) for truck in trucks]
-        return jsonify({'trucks': truck_list})
+        return with_validators(jsonify({'trucks': truck_list}), documents_version(trucks))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@trucks_bp.route('/trucks/lookup', methods=['POST'])
+def get_trucks_by_ids():
+    """Get many trucks by id in one query; body {"ids": [...]}"""
+    try:
+        ids, error = requested_ids()
+        if error:
+            return jsonify({'error': error}), 400
+        trucks, missing = in_request_order(ids, Truck.find_by_ids(ids))
+        version = documents_version(trucks)
+        if is_fresh(version):
+            return not_modified(version)
+        return with_validators(jsonify({
+            'trucks': [Truck.to_dict(truck) for truck in trucks],
+            'missing': missing
+        }), version)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -25,9 +86,13 @@ def get_trucks():
 def get_truck(truck_id):
     """Get a specific truck by ID"""
     try:
+        if is_conditional():
+            version = Truck.find_version(truck_id)
+            if version and is_fresh(version):
+                return not_modified(version)
         truck = Truck.find_by_id(truck_id)
         if truck:
-            return jsonify({'truck': Truck.to_dict(truck)})
+            return with_validators(jsonify({'truck': Truck.to_dict(truck)}), document_version(truck))
         return jsonify({'error': 'Truck not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -36,13 +101,17 @@ def get_truck(truck_id):
 def view_truck(truck_id):
     """Increment view count for a truck and return it"""
     try:
-        truck = Truck.find_by_id(truck_id)
-        if not truck:
-            return jsonify({'error': 'Truck not found'}), 404
-        views = truck.get('views', 0) + 1
-        Truck.update_one(truck_id, {'views': views})
-        updated_truck = Truck.find_by_id(truck_id)
-        return jsonify({'message': 'Truck viewed', 'truck': Truck.to_dict(updated_truck)})
+        flush_interval = current_app.config.get('TRUCK_VIEW_FLUSH_INTERVAL', 0)
+        if flush_interval:
+            # Write-behind: count the view in memory, the buffer flushes it with the others
+            truck = viewed_truck(truck_id, flush_interval)
+            if not truck:
+                return jsonify({'error': 'Truck not found'}), 404
+        else:
+            truck = Truck.increment_and_return(truck_id, {'views': 1}, touch=False)
+            if not truck:
+                return jsonify({'error': 'Truck not found'}), 404
+        return jsonify({'message': 'Truck viewed', 'truck': Truck.to_dict(truck)})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -76,8 +145,8 @@ def create_truck():
             'status': data.get('status', 'active'),
             'region': data.get('region'),
         }
-        truck_id = Truck.insert_one(truck_doc)
-        new_truck = Truck.find_by_id(str(truck_id))
+        new_truck = Truck.insert_and_return(truck_doc)
+        index_truck(new_truck)
         return jsonify({
             'message': 'Truck created successfully',
             'truck': Truck.to_dict(new_truck)
@@ -89,21 +158,23 @@ def create_truck():
 def update_truck(truck_id):
     """Update an existing truck and return the updated truck"""
     try:
-        truck = Truck.find_by_id(truck_id)
-        if not truck:
+        if not ObjectId.is_valid(truck_id):
             return jsonify({'error': 'Truck not found'}), 404
 
         data = request.get_json()
         collection = Truck.get_collection()
         for unique_field in ['truck_number', 'license_plate', 'vin']:
-            if unique_field in data and data[unique_field] != truck.get(unique_field):
+            if unique_field in data:
                 if collection.find_one({unique_field: data[unique_field], '_id': {'$ne': ObjectId(truck_id)}}):
                     return jsonify({'error': f"{unique_field.replace('_', ' ').title()} already exists"}), 400
 
         updatable_fields = ['truck_number', 'make', 'model', 'year', 'license_plate','insurance_expiry', 'vin', 'fuel_capacity', 'status', 'region','fc_expiry','fc_number','insurance_number']
         update_doc = {field: data[field] for field in updatable_fields if field in data}
-        Truck.update_one(truck_id, update_doc)
-        updated_truck = Truck.find_by_id(truck_id)
+        updated_truck = Truck.update_and_return(truck_id, update_doc)
+        if not updated_truck:
+            return jsonify({'error': 'Truck not found'}), 404
+        index_truck(updated_truck)
+        view_cache.pop(truck_id, None)
         return jsonify({
             'message': 'Truck updated successfully',
             'truck': Truck.to_dict(updated_truck)
@@ -119,6 +190,7 @@ def delete_truck(truck_id):
         if not truck:
             return jsonify({'error': 'Truck not found'}), 404
         Truck.update_one(truck_id, {'status': 'Inactive'})
+        view_cache.pop(truck_id, None)
         return jsonify({'message': 'Truck retired successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,72 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from datetime import datetime, timezone
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is always available
+    brotli = None
+
+DEFAULT_MAX_AGE = 3600
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+class StaticAsset:
+    def __init__(self, rel_path, body, mtime):
+        self.rel_path = rel_path
+        self.mimetype = mimetypes.guess_type(rel_path)[0] or 'application/octet-stream'
+        self.fingerprint = hashlib.sha256(body).hexdigest()[:16]
+        self.last_modified = datetime.fromtimestamp(int(mtime), tz=timezone.utc)
+        # Pre-encoded variants, keyed by Content-Encoding ('identity' = as stored)
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE and self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            self._add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=11))
+
+    def _add_variant(self, encoding, data):
+        if len(data) < len(self.variants['identity']):
+            self.variants[encoding] = data
+
+class StaticAssetCache:
+    """Static files loaded once at startup, pre-compressed in memory; the content hash is the ETag."""
+
+    def __init__(self, folder):
+        self.assets = {}
+        if not folder or not os.path.isdir(folder):
+            return
+        for root, _, files in os.walk(folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                rel_path = os.path.relpath(full_path, folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    body = f.read()
+                self.assets[rel_path] = StaticAsset(rel_path, body, os.path.getmtime(full_path))
+
+    def get(self, rel_path):
+        return self.assets.get(rel_path)
+
+def asset_response(asset):
+    """Serve the best pre-encoded variant for the request, with validators and cache headers."""
+    encoding = request.accept_encodings.best_match([e for e in ('br', 'gzip') if e in asset.variants])
+    if encoding is None:
+        encoding = 'identity'
+
+    response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+    response.vary.add('Accept-Encoding')
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    # Each encoding is a different byte stream, so it gets its own strong ETag
+    response.set_etag(asset.fingerprint if encoding == 'identity' else f'{asset.fingerprint}-{encoding}')
+    response.last_modified = asset.last_modified
+
+    response.cache_control.public = True
+    if asset.mimetype == 'text/html':
+        # Pages are requested by fixed URL: keep them, but revalidate (a cheap 304) every time
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.max_age = DEFAULT_MAX_AGE
+    return response.make_conditional(request)
@@ -0,0 +1,6 @@
+# WSGI entry point for production servers (gunicorn -c gunicorn.conf.py).
+# The app is built without a database connection; each worker creates its own
+# MongoClient in gunicorn's post_fork hook.
+from src.main import create_app
+
+app = create_app(connect=False)
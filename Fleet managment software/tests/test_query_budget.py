@@ -0,0 +1,134 @@
+"""Query-count regression tests for the endpoints whose N+1 loops were removed.
+
+Each request must issue a fixed number of Mongo commands however many trips
+there are.  From the project directory:
+
+    python -m pytest tests
+
+The commands are counted with pymongo command monitoring against the mongod
+at TEST_MONGO_URI (its database is dropped afterwards).  When none is
+reachable the tests run on mongomock instead, which publishes no command
+events: each top-level collection call is recorded as the command pymongo
+would send for it (see counted_mongomock).  They are skipped only when
+neither is available.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from bench.seed_fleet import FleetConfig, seed
+from src.main import create_app, init_mongo
+from src.query_budget import QueryBudgetListener, assert_max_queries
+
+TEST_MONGO_URI = os.environ.get('TEST_MONGO_URI', 'mongodb://localhost:27017/fleet_query_budget_test')
+# Below the server's first batch of 101 documents, so no getMore is counted
+TRIPS = 40
+
+# mongomock Collection method -> the command pymongo sends for it, and the command's filter
+MONGOMOCK_COMMANDS = {
+    'find': ('find', lambda filter=None, *a, **k: {'filter': filter or {}}),
+    'find_one': ('find', lambda filter=None, *a, **k: {'filter': filter if isinstance(filter, dict) else {}}),
+    'aggregate': ('aggregate', lambda pipeline, *a, **k: {'pipeline': pipeline}),
+    'count_documents': ('aggregate', lambda filter, *a, **k: {'pipeline': [{'$match': filter}, {'$group': {}}]}),
+    'estimated_document_count': ('count', lambda *a, **k: {'query': {}}),
+    'distinct': ('distinct', lambda key, filter=None, *a, **k: {'query': filter or {}}),
+    'insert_one': ('insert', lambda *a, **k: {}),
+    'insert_many': ('insert', lambda *a, **k: {}),
+    'update_one': ('update', lambda filter, *a, **k: {'updates': [{'q': filter}]}),
+    'update_many': ('update', lambda filter, *a, **k: {'updates': [{'q': filter}]}),
+    'replace_one': ('update', lambda filter, *a, **k: {'updates': [{'q': filter}]}),
+    'find_one_and_update': ('findAndModify', lambda filter, *a, **k: {'query': filter}),
+    'delete_one': ('delete', lambda filter, *a, **k: {'deletes': [{'q': filter}]}),
+    'delete_many': ('delete', lambda filter, *a, **k: {'deletes': [{'q': filter}]}),
+    'bulk_write': ('update', lambda *a, **k: {}),
+}
+
+@contextmanager
+def counted_mongomock(mongomock):
+    """Publish one command-started event per top-level mongomock collection call to a QueryBudgetListener."""
+    listener = QueryBudgetListener()
+    nested = threading.local()
+
+    def counted(method, command_name, arguments):
+        def wrapper(self, *args, **kwargs):
+            depth = getattr(nested, 'depth', 0)
+            if depth == 0:
+                # mongomock implements some calls with others (find_one with find): count the outer one only
+                command = {command_name: self.name, **arguments(*args, **kwargs)}
+                listener.started(SimpleNamespace(command_name=command_name, command=command))
+            nested.depth = depth + 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                nested.depth = depth
+        return wrapper
+
+    with pytest.MonkeyPatch.context() as patch:
+        for name, (command_name, arguments) in MONGOMOCK_COMMANDS.items():
+            patch.setattr(mongomock.Collection, name, counted(getattr(mongomock.Collection, name), command_name, arguments))
+        yield
+
+@pytest.fixture(scope='module')
+def app():
+    try:
+        MongoClient(TEST_MONGO_URI, serverSelectionTimeoutMS=1000).admin.command('ping')
+    except PyMongoError:
+        yield from mongomock_app()
+        return
+    app = create_app(connect=False)
+    app.config['MONGO_URI'] = TEST_MONGO_URI
+    init_mongo(app)
+    seed(app.db, FleetConfig(TRIPS, seed=1), drop=True)
+    yield app
+    app.mongo_client.drop_database(app.db.name)
+    app.mongo_client.close()
+
+def mongomock_app():
+    mongomock = pytest.importorskip('mongomock', reason=f'no mongod at {TEST_MONGO_URI} and mongomock is not installed')
+    client = mongomock.MongoClient()
+    app = create_app(connect=False)
+    app.mongo_client, app.db = client, client['fleet_query_budget_test']
+    seed(app.db, FleetConfig(TRIPS, seed=1), drop=True)
+    with counted_mongomock(mongomock):
+        yield app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def trip_ids(app):
+    return [str(trip['_id']) for trip in app.db.trips.find({}, {'_id': 1}).limit(5)]
+
+def test_trips_list(client):
+    # Reference versions for the ETag (2 per collection), the trips, then one $in each for trucks and drivers
+    with assert_max_queries(7):
+        response = client.get('/api/trips')
+    assert response.status_code == 200
+    assert len(response.get_json()['trips']) == TRIPS
+
+def test_trips_lookup(client, trip_ids):
+    with assert_max_queries(7):
+        response = client.get('/api/trips?ids=' + ','.join(trip_ids))
+    assert response.status_code == 200
+    assert [trip['id'] for trip in response.get_json()['trips']] == trip_ids
+
+def test_expenses_list(client):
+    with assert_max_queries(4):
+        response = client.get('/api/expenses')
+    assert response.status_code == 200
+
+def test_trip_summary(client):
+    # Trips, archive cutoff, trucks, drivers, and one revenue aggregate per REVENUE_BATCH_SIZE trips
+    with assert_max_queries(5):
+        response = client.get('/api/reports/trip_summary')
+    assert response.status_code == 200
+
+def test_trip_detail(client, trip_ids):
+    # The trip, its truck, its driver and its subtrips
+    with assert_max_queries(4):
+        response = client.get(f'/api/trips/{trip_ids[0]}')
+    assert response.status_code == 200